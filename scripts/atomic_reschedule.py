@@ -0,0 +1,163 @@
+import time
+from supabase import Client
+from typing import Dict, List, Optional
+from clinic_time import parse_local
+from slot_engine import ProviderSnapshot
+from schedule_cache import has_schedule_exceptions, has_schedule_exceptions_async
+
+# Postgres function installed by sql/atomic_reschedule.sql
+RESCHEDULE_RPC = "reschedule_appointment_atomic"
+
+# How long to trust a "function does not exist" answer before asking again
+RPC_RECHECK_SECONDS = 300
+
+# PostgREST: function not in the schema cache / Postgres: undefined_function
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+# Process-level detection state, shared by warm Windmill invocations
+_rpc_missing_since: Optional[float] = None
+
+def reschedule_atomically(
+    supabase: Client,
+    current_appointment: Dict,
+    new_datetime: str,
+    notes: str
+) -> Dict:
+    """
+    Move an appointment only if the new slot is still free and nobody else has
+    moved the appointment since it was read.
+
+    Uses the reschedule_appointment_atomic function when it is installed (one
+    transaction, safe under concurrent callers) and no schedule exception falls
+    on the new date (the function knows only the weekly hours; it also declines
+    providers with recurring hours). Otherwise the slot is
+    re-validated with the slot engine and the update is conditional on the
+    appointment_time that was read, which catches a concurrent move of the same
+    appointment but leaves a short window for two appointments to take one slot.
+
+    Args:
+        supabase: Supabase client
+        current_appointment: Appointment row as read by the caller
+        new_datetime: New appointment time (ISO format)
+        notes: Notes to store with the moved appointment
+
+    Returns:
+        Dict with "success", "conflict" (True when the slot or the appointment was
+        taken by another request), "conflict_reason", "atomic" (False when the
+        fallback was used, which cannot rule out a concurrent booking of the slot)
+        and, on success, "appointment" (the updated row)
+    """
+
+    new_day = parse_local(new_datetime).date()
+    if not has_schedule_exceptions(supabase, current_appointment["provider_id"], new_day, new_day):
+        outcome = _reschedule_rpc(supabase, current_appointment, new_datetime, notes)
+        if outcome is not None:
+            return outcome
+    return _reschedule_conditionally(supabase, current_appointment, new_datetime, notes)
+
+async def reschedule_atomically_async(
+    supabase,
+    current_appointment: Dict,
+    new_datetime: str,
+    notes: str
+) -> Dict:
+    """`reschedule_atomically` for the async Supabase client (same detection state)."""
+
+    global _rpc_missing_since
+
+    new_day = parse_local(new_datetime).date()
+    exceptions_active = await has_schedule_exceptions_async(supabase, current_appointment["provider_id"], new_day, new_day)
+    if not _rpc_is_missing() and not exceptions_active:
+        try:
+            response = await supabase.rpc(RESCHEDULE_RPC, _rpc_params(current_appointment, new_datetime, notes)).execute()
+            _rpc_missing_since = None
+            if not response.data.get("engine_only"):
+                return dict(response.data, atomic=True)
+        except Exception as e:
+            if getattr(e, "code", None) not in _MISSING_FUNCTION_CODES:
+                raise
+            _rpc_missing_since = time.monotonic()
+
+    new_dt = parse_local(new_datetime)
+    snapshot = await ProviderSnapshot.load_async(
+        supabase,
+        current_appointment["provider_id"],
+        current_appointment["type"],
+        current_appointment["id"]
+    )
+    is_available, reason = snapshot.check(new_dt, current_appointment["duration_minutes"])
+    if not is_available:
+        return {"success": False, "conflict": True, "conflict_reason": reason, "atomic": False}
+
+    update_response = await _conditional_update(supabase, current_appointment, new_datetime, notes).execute()
+    return _update_outcome(update_response.data)
+
+def _reschedule_rpc(supabase: Client, current_appointment: Dict, new_datetime: str, notes: str) -> Optional[Dict]:
+    """Result of the RPC, or None when it is not installed or leaves the provider to the engine."""
+
+    global _rpc_missing_since
+
+    if _rpc_is_missing():
+        return None
+
+    try:
+        response = supabase.rpc(RESCHEDULE_RPC, _rpc_params(current_appointment, new_datetime, notes)).execute()
+    except Exception as e:
+        if getattr(e, "code", None) in _MISSING_FUNCTION_CODES:
+            _rpc_missing_since = time.monotonic()
+            return None
+        raise
+
+    _rpc_missing_since = None
+    if response.data.get("engine_only"):
+        return None
+    return dict(response.data, atomic=True)
+
+def _reschedule_conditionally(supabase: Client, current_appointment: Dict, new_datetime: str, notes: str) -> Dict:
+    """Client-side fallback: re-check the slot, then update only if the row is unchanged."""
+
+    new_dt = parse_local(new_datetime)
+    snapshot = ProviderSnapshot.load(
+        supabase,
+        current_appointment["provider_id"],
+        current_appointment["type"],
+        current_appointment["id"]
+    )
+    is_available, reason = snapshot.check(new_dt, current_appointment["duration_minutes"])
+    if not is_available:
+        return {"success": False, "conflict": True, "conflict_reason": reason, "atomic": False}
+
+    update_response = _conditional_update(supabase, current_appointment, new_datetime, notes).execute()
+    return _update_outcome(update_response.data)
+
+def _rpc_is_missing() -> bool:
+    return _rpc_missing_since is not None and time.monotonic() - _rpc_missing_since < RPC_RECHECK_SECONDS
+
+def _rpc_params(current_appointment: Dict, new_datetime: str, notes: str) -> Dict:
+    return {
+        "p_appointment_id": current_appointment["id"],
+        "p_new_time": new_datetime,
+        "p_expected_time": current_appointment["appointment_time"],
+        "p_notes": notes
+    }
+
+def _conditional_update(supabase, current_appointment: Dict, new_datetime: str, notes: str):
+    """Update that only matches the row while it still has the time that was read."""
+
+    return supabase.table("appointments") \
+        .update({"appointment_time": new_datetime, "notes": notes}) \
+        .eq("id", current_appointment["id"]) \
+        .eq("status", "scheduled") \
+        .eq("appointment_time", current_appointment["appointment_time"])
+
+def _update_outcome(rows: List[Dict]) -> Dict:
+    if not rows:
+        return {"success": False, "conflict": True, "conflict_reason": "Appointment was changed by another request", "atomic": False}
+
+    return {"success": True, "conflict": False, "conflict_reason": "", "atomic": False, "appointment": rows[0]}
+
+def reset_reschedule_rpc_detection() -> None:
+    """Forget whether the function exists (e.g. right after installing it)."""
+
+    global _rpc_missing_since
+    _rpc_missing_since = None
@@ -0,0 +1,130 @@
+import time
+from supabase import Client
+from datetime import datetime
+from typing import Dict, Optional
+from clinic_time import local_now, parse_local
+from slot_engine import format_slot
+
+# Postgres function installed by sql/availability_rpc.sql
+AVAILABILITY_RPC = "check_slot_availability"
+
+# How long to trust a "function does not exist" answer before asking again
+RPC_RECHECK_SECONDS = 300
+
+# PostgREST: function not in the schema cache / Postgres: undefined_function
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+# Process-level detection state, shared by warm Windmill invocations
+_rpc_missing_since: Optional[float] = None
+
+def check_availability_rpc(
+    supabase: Client,
+    provider_id: str,
+    appointment_type: str,
+    requested_dt: datetime,
+    duration_minutes: int,
+    exclude_appointment_id: str = None,
+    max_alternatives: int = 1,
+    max_days_ahead: int = 30
+) -> Optional[Dict]:
+    """
+    Check a slot and collect alternatives inside the database in one round-trip.
+
+    Returns:
+        Dict with "available", "conflict_reason" and "alternatives" (formatted slots),
+        or None when the function is not installed or the provider has recurring
+        hours it cannot expand, and the caller should fall back to the client-side
+        slot engine
+    """
+
+    global _rpc_missing_since
+
+    if _rpc_is_missing():
+        return None
+
+    params = _rpc_params(
+        provider_id, appointment_type, requested_dt, duration_minutes,
+        exclude_appointment_id, max_alternatives, max_days_ahead
+    )
+
+    try:
+        response = supabase.rpc(AVAILABILITY_RPC, params).execute()
+    except Exception as e:
+        if getattr(e, "code", None) in _MISSING_FUNCTION_CODES:
+            _rpc_missing_since = time.monotonic()
+            return None
+        raise
+
+    _rpc_missing_since = None
+    return _parse_result(response.data)
+
+async def check_availability_rpc_async(
+    supabase,
+    provider_id: str,
+    appointment_type: str,
+    requested_dt: datetime,
+    duration_minutes: int,
+    exclude_appointment_id: str = None,
+    max_alternatives: int = 1,
+    max_days_ahead: int = 30
+) -> Optional[Dict]:
+    """`check_availability_rpc` for the async Supabase client (same detection state)."""
+
+    global _rpc_missing_since
+
+    if _rpc_is_missing():
+        return None
+
+    params = _rpc_params(
+        provider_id, appointment_type, requested_dt, duration_minutes,
+        exclude_appointment_id, max_alternatives, max_days_ahead
+    )
+
+    try:
+        response = await supabase.rpc(AVAILABILITY_RPC, params).execute()
+    except Exception as e:
+        if getattr(e, "code", None) in _MISSING_FUNCTION_CODES:
+            _rpc_missing_since = time.monotonic()
+            return None
+        raise
+
+    _rpc_missing_since = None
+    return _parse_result(response.data)
+
+def _rpc_is_missing() -> bool:
+    return _rpc_missing_since is not None and time.monotonic() - _rpc_missing_since < RPC_RECHECK_SECONDS
+
+def _rpc_params(
+    provider_id: str,
+    appointment_type: str,
+    requested_dt: datetime,
+    duration_minutes: int,
+    exclude_appointment_id: Optional[str],
+    max_alternatives: int,
+    max_days_ahead: int
+) -> Dict:
+    return {
+        "p_provider_id": provider_id,
+        "p_appointment_type": appointment_type,
+        "p_requested": requested_dt.isoformat(),
+        "p_duration_minutes": duration_minutes,
+        "p_exclude_appointment_id": exclude_appointment_id,
+        "p_max_alternatives": max_alternatives,
+        "p_max_days_ahead": max_days_ahead,
+        "p_now": local_now().isoformat()
+    }
+
+def _parse_result(result: Dict) -> Optional[Dict]:
+    if result.get("engine_only"):
+        return None
+    return {
+        "available": result["available"],
+        "conflict_reason": result["conflict_reason"],
+        "alternatives": [format_slot(parse_local(slot)) for slot in result["alternatives"]]
+    }
+
+def reset_rpc_detection() -> None:
+    """Forget whether the function exists (e.g. right after installing it)."""
+
+    global _rpc_missing_since
+    _rpc_missing_since = None
@@ -1,189 +1,343 @@
-import wmill
 from supabase import create_client, Client
+from supabase_client import get_supabase_client
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
+from clinic_time import local_now, parse_local
+from slot_engine import ProviderSnapshot, find_earliest_slots_across_providers, search_window
+from availability_rpc import check_availability_rpc
+from free_slots import lookup_free_slots
+from reference_data import get_provider, get_providers
+from deadline import Deadline, NO_DEADLINE
+from prefetch import PREFETCH_WAIT_SECONDS, peek_prefetched_calendar
+from schedule_cache import has_schedule_exceptions
+from slot_holds import HOLD_TTL_SECONDS, get_hold_store, held_appointments, hold_slot
 
-def main(appointment_id: str, preferred_datetime: str) -> Dict:
+def main(
+    appointment_id: str,
+    preferred_datetime: str,
+    max_alternatives: int = 1,
+    any_provider: bool = False,
+    use_free_slots: bool = False,
+    hold_slots: bool = False,
+    deadline_ms: int = None
+) -> Dict:
     """
     Check appointment availability for rescheduling.
     
     Args:
         appointment_id: ID of the appointment to reschedule
         preferred_datetime: Preferred new datetime in ISO format (e.g., "2025-06-10T14:00:00")
+        max_alternatives: How many alternative slots to suggest when the preferred time is taken
+        any_provider: Also search every provider with the same specialty when the preferred time is taken
+        use_free_slots: Answer from the materialized free_slots table when it can answer exactly
+        hold_slots: Hold every slot offered for HOLD_TTL_SECONDS so no other caller is offered it;
+            pass the returned hold_token to reschedule_appointment to book it
+        deadline_ms: Time budget for the whole call; once it is spent the search stops and the
+            slots found so far are returned with "partial": True
     
     Returns:
         Dict with availability status and alternative suggestions
     """
     
-    # Step 1: Setup Supabase
-    config = wmill.get_resource("u/gregory/supabase")
-    supabase: Client = create_client(config["url"], config["key"])
+    deadline = Deadline(deadline_ms)
+    
+    # Step 1: Setup Supabase (the worker's shared client, reused while warm)
+    supabase: Client = get_supabase_client(create_client)
     
     try:
-        # Step 2: Get the existing appointment details
-        appointment_response = supabase.table("appointments").select("*").eq("id", appointment_id).execute()
-        
-        if not appointment_response.data:
-            return {
-                "success": False,
-                "error": "Appointment not found",
-                "available": False
-            }
-        
-        appointment = appointment_response.data[0]
-        provider_id = appointment["provider_id"]
-        appointment_type = appointment["type"]
-        duration_minutes = appointment["duration_minutes"]
-        
-        # Step 3: Parse preferred datetime
-        try:
-            preferred_dt = datetime.fromisoformat(preferred_datetime.replace('Z', '+00:00'))
-        except ValueError:
-            return {
-                "success": False,
-                "error": "Invalid datetime format. Use ISO format like '2025-06-10T14:00:00'",
-                "available": False
-            }
-        
-        # Step 3.5: Check if preferred datetime is in the past
-        current_time = datetime.now()
-        if preferred_dt <= current_time:
-            return {
-                "success": False,
-                "error": f"Cannot schedule appointments in the past. Requested time: {preferred_datetime}, Current time: {current_time.isoformat()}",
-                "available": False
-            }
+        # Step 2: Get the existing appointment details (already in memory when n5 prefetched them)
+        prefetched = peek_prefetched_calendar(appointment_id, wait_seconds=prefetch_wait_seconds(deadline))
+        if prefetched is not None:
+            appointment = prefetched.appointment
+        else:
+            appointment_response = supabase.table("appointments").select("*").eq("id", appointment_id).execute()
+            
+            if not appointment_response.data:
+                return appointment_not_found()
+            
+            appointment = appointment_response.data[0]
         
-        # Step 4: Check if preferred time is available
-        is_available, conflict_reason = check_time_availability(
-            supabase, provider_id, preferred_dt, duration_minutes, appointment_type, appointment_id
+        # Steps 3-7: Check the preferred time and collect alternatives
+        return check_availability_for_appointment(
+            supabase, appointment, preferred_datetime, max_alternatives, any_provider, use_free_slots, hold_slots, deadline
         )
         
-        if is_available:
-            return {
-                "success": True,
-                "available": True,
-                "preferred_datetime": preferred_datetime,
-                "message": "Preferred time is available"
-            }
-        
-        # Step 5: Find next available slot after preferred time
-        next_available = find_next_available_slot(
-            supabase, provider_id, preferred_dt, duration_minutes, appointment_type, appointment_id
+    except Exception as e:
+        return availability_error(e)
+
+def check_availability_for_appointment(
+    supabase: Client,
+    appointment: Dict,
+    preferred_datetime: str,
+    max_alternatives: int = 1,
+    any_provider: bool = False,
+    use_free_slots: bool = False,
+    hold_slots: bool = False,
+    deadline: Deadline = NO_DEADLINE
+) -> Dict:
+    """
+    Check a preferred time for an appointment row the caller already read
+    (the part of `main` after the appointment lookup).
+    
+    Returns:
+        Dict with availability status and alternative suggestions
+    """
+    
+    appointment_id = appointment["id"]
+    provider_id = appointment["provider_id"]
+    appointment_type = appointment["type"]
+    duration_minutes = appointment["duration_minutes"]
+    
+    # Steps 3-3.5: Parse preferred datetime and refuse one in the past
+    preferred_dt, error = parse_preferred_datetime(preferred_datetime)
+    if error:
+        return error
+    
+    # Step 4: Answer from the calendar n5 prefetched if it is fresh; otherwise look the slot
+    # up in the free_slots table, or let the database check it and collect alternatives in
+    # one round-trip (neither sees slots held by other callers or schedule exceptions, so
+    # such calendars are checked by the engine)
+    window = search_window(preferred_dt)
+    prefetched = peek_prefetched_calendar(appointment_id, window, prefetch_wait_seconds(deadline))
+    outcome = None
+    engine_only = prefetched is not None or bool(held_appointments(provider_id, appointment_id)) \
+        or has_schedule_exceptions(supabase, provider_id, window[0].date(), window[1].date())
+    if use_free_slots and not engine_only:
+        outcome = lookup_free_slots(supabase, appointment, preferred_dt, max(max_alternatives, 1))
+    
+    if outcome is None and not engine_only:
+        outcome = check_availability_rpc(
+            supabase, provider_id, appointment_type, preferred_dt, duration_minutes, appointment_id, max(max_alternatives, 1)
         )
-        
-        return {
-            "success": True,
-            "available": False,
-            "preferred_datetime": preferred_datetime,
-            "conflict_reason": conflict_reason,
-            "next_available": next_available,
-            "message": f"Preferred time not available. {conflict_reason}"
+    
+    if outcome is None:
+        # Step 4b: Neither installed - load the provider's data in the search window once
+        # (unless it was prefetched)
+        if prefetched is not None:
+            snapshot = prefetched.snapshot()
+        else:
+            snapshot = ProviderSnapshot.load(supabase, provider_id, appointment_type, appointment_id, window)
+        outcome = check_snapshot(snapshot, preferred_dt, duration_minutes, max_alternatives, deadline)
+    
+    # Steps 4.5-6: Hold what is about to be offered, then report the preferred time
+    # or the alternatives after it
+    result = availability_result(appointment, preferred_datetime, preferred_dt, outcome, hold_slots, deadline)
+    if result["available"] or not any_provider:
+        return result
+    
+    # Step 7: Optionally search every provider of the same specialty concurrently
+    # (skipped once the deadline has passed)
+    if deadline.expired():
+        return add_provider_options(result, None, deadline)
+    
+    providers = get_providers_with_same_specialty(supabase, provider_id)
+    cross_provider = find_earliest_slots_across_providers(
+        supabase, providers, preferred_dt, duration_minutes, appointment_type, appointment_id, deadline=deadline
+    )
+    return add_provider_options(result, cross_provider, deadline)
+
+def appointment_not_found() -> Dict:
+    """Response when the appointment to move does not exist."""
+    
+    return {
+        "success": False,
+        "error": "Appointment not found",
+        "available": False
+    }
+
+def availability_error(error: Exception) -> Dict:
+    """Response for an unexpected failure."""
+    
+    return {
+        "success": False,
+        "error": f"An error occurred: {str(error)}",
+        "available": False
+    }
+
+def parse_preferred_datetime(preferred_datetime: str) -> Tuple[Optional[datetime], Optional[Dict]]:
+    """
+    Parse the preferred time and refuse one in the past.
+    
+    Returns:
+        Tuple of (preferred_dt, error_response), exactly one of them set
+    """
+    
+    try:
+        preferred_dt = parse_local(preferred_datetime)
+    except ValueError:
+        return None, {
+            "success": False,
+            "error": "Invalid datetime format. Use ISO format like '2025-06-10T14:00:00'",
+            "available": False
         }
-        
-    except Exception as e:
-        return {
+    
+    current_time = local_now()
+    if preferred_dt <= current_time:
+        return None, {
             "success": False,
-            "error": f"An error occurred: {str(e)}",
+            "error": f"Cannot schedule appointments in the past. Requested time: {preferred_datetime}, Current time: {current_time.isoformat()}",
             "available": False
         }
+    
+    return preferred_dt, None
 
-def check_time_availability(
-    supabase: Client, 
-    provider_id: str, 
-    requested_dt: datetime, 
+def check_snapshot(
+    snapshot: ProviderSnapshot,
+    preferred_dt: datetime,
     duration_minutes: int,
-    appointment_type: str,
-    exclude_appointment_id: str = None
-) -> Tuple[bool, str]:
+    max_alternatives: int,
+    deadline: Deadline = NO_DEADLINE
+) -> Dict:
     """
-    Check if a specific time slot is available for a provider.
+    Check the preferred time against a loaded snapshot; when it is taken, the
+    alternatives come from one in-memory scan, no further queries (cut short by
+    the deadline).
     
     Returns:
-        Tuple of (is_available, reason_if_not_available)
+        Dict shaped like a lookup result ("available", "conflict_reason",
+        "alternatives") plus "partial" when the scan was cut short
     """
     
-    # Check provider availability for the day of week
-    weekday = requested_dt.weekday() + 1  # Convert to 1-7 format (Monday=1)
-    requested_time = requested_dt.time()
+    is_available, conflict_reason = snapshot.check(preferred_dt, duration_minutes)
+    alternatives, complete = [], True
+    if not is_available:
+        alternatives, complete = snapshot.search_slots(
+            preferred_dt, duration_minutes, max(max_alternatives, 1), deadline=deadline
+        )
     
-    # Get provider's availability for this weekday
-    availability_response = supabase.table("availability").select("*").eq("provider_id", provider_id).eq("weekday", weekday).execute()
+    return {"available": is_available, "conflict_reason": conflict_reason, "alternatives": alternatives, "partial": not complete}
+
+def availability_result(
+    appointment: Dict,
+    preferred_datetime: str,
+    preferred_dt: datetime,
+    outcome: Dict,
+    hold_slots: bool,
+    deadline: Deadline = NO_DEADLINE
+) -> Dict:
+    """`format_availability_result` for a lookup or snapshot outcome, with "partial" when the call has a deadline."""
     
-    if not availability_response.data:
-        return False, f"Provider not available on {requested_dt.strftime('%A')}"
+    result = format_availability_result(
+        appointment, preferred_datetime, preferred_dt,
+        outcome["available"], outcome["conflict_reason"], outcome["alternatives"], hold_slots
+    )
+    if deadline.bounded:
+        result["partial"] = outcome.get("partial", False)
+    return result
+
+def add_provider_options(result: Dict, cross_provider: Optional[Dict], deadline: Deadline = NO_DEADLINE) -> Dict:
+    """
+    Add the earliest slots of the other providers of the specialty to a response;
+    `cross_provider` is None when the deadline left no time to search them.
+    """
     
-    # Check if requested time falls within provider's working hours
-    provider_available = False
-    for availability in availability_response.data:
-        start_time = datetime.strptime(availability["start_time"], "%H:%M:%S").time()
-        end_time = datetime.strptime(availability["end_time"], "%H:%M:%S").time()
-        
-        # Calculate end time of the appointment
-        appointment_end = (requested_dt + timedelta(minutes=duration_minutes)).time()
-        
-        if start_time <= requested_time and appointment_end <= end_time:
-            provider_available = True
-            break
+    if cross_provider is None:
+        result["provider_options"] = []
+        result["earliest_any_provider"] = None
+        result["partial"] = True
+        return result
     
-    if not provider_available:
-        return False, "Requested time is outside provider's working hours"
+    result["provider_options"] = cross_provider["provider_options"]
+    result["earliest_any_provider"] = cross_provider["earliest"]
+    if deadline.bounded:
+        result["partial"] = result["partial"] or cross_provider["partial"]
+    return result
+
+def format_availability_result(
+    appointment: Dict,
+    preferred_datetime: str,
+    preferred_dt: datetime,
+    is_available: bool,
+    conflict_reason: str,
+    alternatives: List[Dict],
+    hold_slots: bool
+) -> Dict:
+    """
+    Build the response for a checked slot, holding every slot it offers when
+    `hold_slots` is set (replacing the appointment's earlier holds).
+    
+    Returns:
+        Dict with availability status and alternative suggestions
+    """
     
-    # Get visit type information to check max patients per slot
-    visit_types_response = supabase.table("visit_types").select("*").eq("name", appointment_type).execute()
+    if hold_slots:
+        get_hold_store().release_for_appointment(appointment["id"])
+        if not is_available:
+            for alternative in alternatives:
+                alternative["hold_token"] = hold_slot(appointment, parse_local(alternative["datetime"]))
     
-    if not visit_types_response.data:
-        return False, f"Invalid appointment type: {appointment_type}"
+    # Report the preferred time if it is available
+    if is_available:
+        result = {
+            "success": True,
+            "available": True,
+            "preferred_datetime": preferred_datetime,
+            "message": "Preferred time is available"
+        }
+        if hold_slots:
+            result["hold_token"] = hold_slot(appointment, preferred_dt)
+            result["hold_expires_in_seconds"] = HOLD_TTL_SECONDS
+        return result
     
-    visit_type = visit_types_response.data[0]
-    max_patients_per_slot = visit_type["max_patients_per_slot"]
+    # Otherwise suggest the alternatives after the preferred time
+    next_available = alternatives[0] if alternatives else None
     
-    # Check for conflicting appointments and count patients in the same time slot
-    appointment_start = requested_dt.isoformat()
-    appointment_end = (requested_dt + timedelta(minutes=duration_minutes)).isoformat()
+    result = {
+        "success": True,
+        "available": False,
+        "preferred_datetime": preferred_datetime,
+        "conflict_reason": conflict_reason,
+        "next_available": next_available,
+        "alternatives": alternatives,
+        "message": f"Preferred time not available. {conflict_reason}"
+    }
+    if hold_slots:
+        result["hold_expires_in_seconds"] = HOLD_TTL_SECONDS
+    return result
+
+def prefetch_wait_seconds(deadline: Deadline) -> float:
+    """How long to wait for a prefetch still in flight (never past the deadline)."""
     
-    # Build query to find overlapping appointments
-    query = supabase.table("appointments").select("*").eq("provider_id", provider_id).eq("status", "scheduled")
+    remaining = deadline.remaining_seconds()
+    return PREFETCH_WAIT_SECONDS if remaining is None else min(PREFETCH_WAIT_SECONDS, remaining)
+
+def get_providers_with_same_specialty(supabase: Client, provider_id: str) -> List[Dict]:
+    """
+    Get every provider sharing the given provider's specialty (including the provider itself).
     
-    if exclude_appointment_id:
-        query = query.neq("id", exclude_appointment_id)
+    Returns:
+        List of provider rows, empty if the provider does not exist
+    """
     
-    existing_appointments = query.execute()
+    provider = get_provider(supabase, provider_id)
+    return providers_sharing_specialty(get_providers(supabase), provider)
+
+def providers_sharing_specialty(providers: List[Dict], provider: Optional[Dict]) -> List[Dict]:
+    """Providers with the same specialty as `provider` (itself included), none when it does not exist."""
     
-    overlapping_appointments = []
-    exact_time_appointments = []
+    if not provider:
+        return []
     
-    for existing in existing_appointments.data:
-        existing_start = datetime.fromisoformat(existing["appointment_time"].replace('Z', '+00:00'))
-        existing_end = existing_start + timedelta(minutes=existing["duration_minutes"])
-        
-        # Check for overlap
-        if (requested_dt < existing_end and 
-            datetime.fromisoformat(appointment_end.replace('Z', '+00:00')) > existing_start):
-            overlapping_appointments.append(existing)
-            
-            # Check if it's the exact same time slot
-            if existing_start == requested_dt:
-                exact_time_appointments.append(existing)
-    
-    # For appointments at the exact same time, check if we can accommodate more patients
-    if exact_time_appointments:
-        # Count patients already scheduled at this exact time
-        patients_at_same_time = len(exact_time_appointments)
-        
-        # Check if we can add one more patient
-        if patients_at_same_time >= max_patients_per_slot:
-            return False, f"Time slot full: {patients_at_same_time}/{max_patients_per_slot} patients already scheduled at {requested_dt.strftime('%Y-%m-%d %H:%M')}"
-        
-        # If there's room, it's available (same time slot, different patients)
-        return True, ""
+    return [other for other in providers if other.get("specialty") == provider["specialty"]]
+
+def check_time_availability(
+    supabase: Client, 
+    provider_id: str, 
+    requested_dt: datetime, 
+    duration_minutes: int,
+    appointment_type: str,
+    exclude_appointment_id: str = None
+) -> Tuple[bool, str]:
+    """
+    Check if a specific time slot is available for a provider.
     
-    # For overlapping but not exact same time, it's a conflict
-    if overlapping_appointments:
-        conflict_time = datetime.fromisoformat(overlapping_appointments[0]["appointment_time"].replace('Z', '+00:00'))
-        return False, f"Conflicts with existing appointment at {conflict_time.strftime('%Y-%m-%d %H:%M')}"
+    Returns:
+        Tuple of (is_available, reason_if_not_available)
+    """
     
-    return True, ""
+    window = (requested_dt, requested_dt + timedelta(minutes=duration_minutes))
+    snapshot = ProviderSnapshot.load(supabase, provider_id, appointment_type, exclude_appointment_id, window)
+    return snapshot.check(requested_dt, duration_minutes)
 
 def find_next_available_slot(
     supabase: Client, 
@@ -197,77 +351,14 @@ def find_next_available_slot(
     """
     Find the next available appointment slot after the given datetime.
     
+    The provider's data is loaded once and every 15-minute candidate is
+    evaluated in memory, so the search costs three queries regardless of
+    how many slots are booked.
+    
     Returns:
         Dict with next available slot info or None if no slot found
     """
     
-    # Get provider's availability schedule
-    availability_response = supabase.table("availability").select("*").eq("provider_id", provider_id).execute()
-    
-    if not availability_response.data:
-        return None
-    
-    # Create a schedule map
-    schedule = {}
-    for avail in availability_response.data:
-        weekday = avail["weekday"]
-        schedule[weekday] = {
-            "start_time": datetime.strptime(avail["start_time"], "%H:%M:%S").time(),
-            "end_time": datetime.strptime(avail["end_time"], "%H:%M:%S").time()
-        }
-    
-    # Search for next available slot
-    # Ensure we don't search in the past
-    now = datetime.now()
-    search_start = max(start_from, now)
-    current_date = search_start.date()
-    end_date = current_date + timedelta(days=max_days_ahead)
-    
-    while current_date <= end_date:
-        weekday = current_date.weekday() + 1  # Convert to 1-7 format
-        
-        if weekday in schedule:
-            # Check slots throughout the day in 15-minute intervals
-            day_schedule = schedule[weekday]
-            
-            # Start from the requested time if it's the same day, otherwise from start of working hours
-            # Also ensure we don't start in the past
-            if current_date == search_start.date():
-                start_time = max(search_start.time(), day_schedule["start_time"])
-            else:
-                start_time = day_schedule["start_time"]
-            
-            # Create datetime objects for the current day
-            current_slot = datetime.combine(current_date, start_time)
-            end_of_day = datetime.combine(current_date, day_schedule["end_time"])
-            
-            # Round up to next 15-minute interval
-            minutes = current_slot.minute
-            if minutes % 15 != 0:
-                next_quarter = ((minutes // 15) + 1) * 15
-                if next_quarter >= 60:
-                    current_slot = current_slot.replace(hour=current_slot.hour + 1, minute=0, second=0, microsecond=0)
-                else:
-                    current_slot = current_slot.replace(minute=next_quarter, second=0, microsecond=0)
-            
-            while current_slot + timedelta(minutes=duration_minutes) <= end_of_day:
-                is_available, _ = check_time_availability(
-                    supabase, provider_id, current_slot, duration_minutes, appointment_type, exclude_appointment_id
-                )
-                
-                if is_available:
-                    return {
-                        "datetime": current_slot.isoformat(),
-                        "formatted_datetime": current_slot.strftime("%Y-%m-%d at %I:%M %p"),
-                        "date": current_slot.strftime("%Y-%m-%d"),
-                        "time": current_slot.strftime("%H:%M"),
-                        "weekday": current_slot.strftime("%A")
-                    }
-                
-                # Move to next 15-minute slot
-                current_slot += timedelta(minutes=15)
-        
-        # Move to next day
-        current_date += timedelta(days=1)
-    
-    return None
\ No newline at end of file
+    window = search_window(start_from, max_days_ahead)
+    snapshot = ProviderSnapshot.load(supabase, provider_id, appointment_type, exclude_appointment_id, window)
+    return snapshot.find_next(start_from, duration_minutes, max_days_ahead)
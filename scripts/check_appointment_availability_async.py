@@ -0,0 +1,127 @@
+from supabase import acreate_client, AsyncClient
+from supabase_client import get_async_supabase_client
+from typing import List, Dict
+from slot_engine import ProviderSnapshot, find_earliest_slots_across_providers_async, search_window
+from availability_rpc import check_availability_rpc_async
+from free_slots import lookup_free_slots_async
+from reference_data import get_providers_async
+from schedule_cache import has_schedule_exceptions_async
+from slot_holds import held_appointments
+from check_appointment_availability import (
+    add_provider_options, appointment_not_found, availability_error, availability_result,
+    check_snapshot, parse_preferred_datetime, providers_sharing_specialty
+)
+from deadline import Deadline
+from prefetch import peek_prefetched_calendar
+
+async def main(
+    appointment_id: str,
+    preferred_datetime: str,
+    max_alternatives: int = 1,
+    any_provider: bool = False,
+    use_free_slots: bool = False,
+    hold_slots: bool = False,
+    deadline_ms: int = None
+) -> Dict:
+    """
+    Check appointment availability for rescheduling.
+    Async variant of check_appointment_availability: same arguments and response,
+    with independent reads run concurrently on the worker's event loop.
+    
+    Args:
+        appointment_id: ID of the appointment to reschedule
+        preferred_datetime: Preferred new datetime in ISO format (e.g., "2025-06-10T14:00:00")
+        max_alternatives: How many alternative slots to suggest when the preferred time is taken
+        any_provider: Also search every provider with the same specialty when the preferred time is taken
+        use_free_slots: Answer from the materialized free_slots table when it can answer exactly
+        hold_slots: Hold every slot offered for HOLD_TTL_SECONDS so no other caller is offered it
+        deadline_ms: Time budget for the whole call (see check_appointment_availability)
+    
+    Returns:
+        Dict with availability status and alternative suggestions
+    """
+    
+    deadline = Deadline(deadline_ms)
+    
+    # Step 1: Setup Supabase (the event loop's shared async client)
+    supabase: AsyncClient = await get_async_supabase_client(acreate_client)
+    
+    try:
+        # Step 2: Get the existing appointment details (already in memory when n5 prefetched them;
+        # a prefetch still in flight is not waited for, so the event loop never blocks)
+        prefetched = peek_prefetched_calendar(appointment_id, wait_seconds=0)
+        if prefetched is not None:
+            appointment = prefetched.appointment
+        else:
+            appointment_response = await supabase.table("appointments").select("*").eq("id", appointment_id).execute()
+            
+            if not appointment_response.data:
+                return appointment_not_found()
+            
+            appointment = appointment_response.data[0]
+        provider_id = appointment["provider_id"]
+        appointment_type = appointment["type"]
+        duration_minutes = appointment["duration_minutes"]
+        
+        # Steps 3-3.5: Parse preferred datetime and refuse one in the past
+        preferred_dt, error = parse_preferred_datetime(preferred_datetime)
+        if error:
+            return error
+        
+        # Step 4: Answer from the calendar n5 prefetched if it is fresh; otherwise look the slot up
+        # in the free_slots table, or let the database check it in one round-trip
+        window = search_window(preferred_dt)
+        prefetched = peek_prefetched_calendar(appointment_id, window, wait_seconds=0)
+        outcome = None
+        engine_only = prefetched is not None or bool(held_appointments(provider_id, appointment_id)) \
+            or await has_schedule_exceptions_async(supabase, provider_id, window[0].date(), window[1].date())
+        if use_free_slots and not engine_only:
+            outcome = await lookup_free_slots_async(supabase, appointment, preferred_dt, max(max_alternatives, 1))
+        
+        if outcome is None and not engine_only:
+            outcome = await check_availability_rpc_async(
+                supabase, provider_id, appointment_type, preferred_dt, duration_minutes, appointment_id, max(max_alternatives, 1)
+            )
+        
+        if outcome is None:
+            # Step 4b: Neither installed - load the provider's schedule, visit type and
+            # appointments concurrently (unless they were prefetched), then check in memory
+            if prefetched is not None:
+                snapshot = prefetched.snapshot()
+            else:
+                snapshot = await ProviderSnapshot.load_async(
+                    supabase, provider_id, appointment_type, appointment_id, window
+                )
+            outcome = check_snapshot(snapshot, preferred_dt, duration_minutes, max_alternatives, deadline)
+        
+        # Steps 4.5-6: Hold what is about to be offered, then report the preferred time
+        # or the alternatives after it
+        result = availability_result(appointment, preferred_datetime, preferred_dt, outcome, hold_slots, deadline)
+        if result["available"] or not any_provider:
+            return result
+        
+        # Step 7: Optionally search every provider of the same specialty concurrently
+        # (skipped once the deadline has passed)
+        if deadline.expired():
+            return add_provider_options(result, None, deadline)
+        
+        providers = await get_providers_with_same_specialty_async(supabase, provider_id)
+        cross_provider = await find_earliest_slots_across_providers_async(
+            supabase, providers, preferred_dt, duration_minutes, appointment_type, appointment_id, deadline=deadline
+        )
+        return add_provider_options(result, cross_provider, deadline)
+        
+    except Exception as e:
+        return availability_error(e)
+
+async def get_providers_with_same_specialty_async(supabase: AsyncClient, provider_id: str) -> List[Dict]:
+    """
+    Get every provider sharing the given provider's specialty (including the provider itself).
+    
+    Returns:
+        List of provider rows, empty if the provider does not exist
+    """
+    
+    providers = await get_providers_async(supabase)
+    provider = next((row for row in providers if row["id"] == provider_id), None)
+    return providers_sharing_specialty(providers, provider)
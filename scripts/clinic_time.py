@@ -0,0 +1,115 @@
+import os
+from datetime import date, datetime, time, timedelta, timezone, tzinfo
+from functools import lru_cache
+from threading import Lock
+from typing import Dict, Tuple, Union
+from zoneinfo import ZoneInfo
+
+# Wall-clock zone of the clinic: naive timestamps (the `timestamp` columns) are in it,
+# and every time shown to callers is converted to it
+CLINIC_TIMEZONE = os.environ.get("CLINIC_TIMEZONE", "UTC")
+
+# Instants are integer microseconds since the Unix epoch (UTC)
+MICROSECONDS_PER_SECOND = 1_000_000
+MICROSECONDS_PER_MINUTE = 60 * MICROSECONDS_PER_SECOND
+
+# Local days whose midnight and UTC offset are kept per clock
+LOCAL_DAY_CACHE_SIZE = 4096
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+class ClinicClock:
+    """
+    Conversions between one clinic's wall-clock times and integer instants.
+
+    Values are normalized once where they enter (database rows, caller input):
+    naive values are the clinic's wall-clock time, aware values are converted
+    from their own offset. Overlap and ordering are then decided on integer
+    instants, which stay correct across DST changes, and only times shown to the
+    caller are turned back into (naive, wall-clock) datetimes.
+
+    Each local day's midnight instant and UTC offset are computed once, so on
+    days without a DST change converting a wall-clock time is integer arithmetic.
+    """
+
+    def __init__(self, zone_name: str):
+        self.zone_name = zone_name
+        self.zone: tzinfo = timezone.utc if zone_name == "UTC" else ZoneInfo(zone_name)
+        self._days: Dict[date, Tuple[int, bool]] = {}
+        self._lock = Lock()
+
+    def local_day(self, day: date) -> Tuple[int, bool]:
+        """
+        Instant of the day's local midnight, and whether the UTC offset stays the
+        same until the next midnight (False on DST change days).
+        """
+
+        cached = self._days.get(day)
+        if cached is not None:
+            return cached
+
+        midnight = datetime(day.year, day.month, day.day, tzinfo=self.zone)
+        next_midnight = datetime.combine(day + timedelta(days=1), time(), tzinfo=self.zone)
+        cached = ((midnight - _EPOCH) // _MICROSECOND, midnight.utcoffset() == next_midnight.utcoffset())
+
+        with self._lock:
+            if len(self._days) >= LOCAL_DAY_CACHE_SIZE:
+                self._days.clear()
+            self._days[day] = cached
+        return cached
+
+    def to_instant(self, value: Union[str, datetime]) -> int:
+        """Instant of an ISO string or datetime (naive values are clinic wall-clock time)."""
+
+        if isinstance(value, str):
+            return _instant_from_text(value, self.zone_name)
+        if value.tzinfo is not None:
+            return (value - _EPOCH) // _MICROSECOND
+
+        midnight, uniform = self.local_day(value.date())
+        if not uniform:
+            return (value.replace(tzinfo=self.zone) - _EPOCH) // _MICROSECOND
+        seconds = (value.hour * 60 + value.minute) * 60 + value.second
+        return midnight + seconds * MICROSECONDS_PER_SECOND + value.microsecond
+
+    def to_local(self, instant: int) -> datetime:
+        """Clinic wall-clock time (naive, with `fold` set in a repeated hour) of an instant."""
+
+        moment = _EPOCH + timedelta(microseconds=instant)
+        return moment.astimezone(self.zone).replace(tzinfo=None)
+
+    def local_datetime(self, value: Union[str, datetime]) -> datetime:
+        """Normalize an ISO string or datetime to naive clinic wall-clock time."""
+
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if value.tzinfo is None:
+            return value
+        return value.astimezone(self.zone).replace(tzinfo=None)
+
+    def now(self) -> datetime:
+        """Current clinic wall-clock time (naive)."""
+
+        return datetime.now(self.zone).replace(tzinfo=None)
+
+@lru_cache(maxsize=None)
+def clinic_clock(zone_name: str = None) -> ClinicClock:
+    """Clock of a clinic time zone (CLINIC_TIMEZONE by default), built once per process."""
+
+    return ClinicClock(zone_name or CLINIC_TIMEZONE)
+
+def parse_local(value: Union[str, datetime]) -> datetime:
+    """`ClinicClock.local_datetime` with the default clinic clock."""
+
+    return clinic_clock().local_datetime(value)
+
+def local_now() -> datetime:
+    """Current wall-clock time of the default clinic."""
+
+    return clinic_clock().now()
+
+@lru_cache(maxsize=65536)
+def _instant_from_text(text: str, zone_name: str) -> int:
+    # The same appointment_time strings are read by every snapshot of a provider
+    return clinic_clock(zone_name).to_instant(datetime.fromisoformat(text.replace('Z', '+00:00')))
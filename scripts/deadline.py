@@ -0,0 +1,32 @@
+import time as monotonic_clock
+from typing import Optional
+
+class Deadline:
+    """
+    Time budget of one call, shared by every stage of it.
+
+    Stages check it between units of work (a day of slot search, a provider, an
+    optional lookup) and return what they have so far once it has passed. A
+    deadline without a budget never expires.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        self.budget_ms = budget_ms
+        self.expires_at = None if budget_ms is None else monotonic_clock.monotonic() + budget_ms / 1000
+
+    def remaining_seconds(self) -> Optional[float]:
+        """Seconds left (never negative), or None without a budget."""
+
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - monotonic_clock.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.expires_at is not None and monotonic_clock.monotonic() >= self.expires_at
+
+    @property
+    def bounded(self) -> bool:
+        return self.expires_at is not None
+
+# Shared default for callers without a budget
+NO_DEADLINE = Deadline()
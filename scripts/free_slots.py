@@ -0,0 +1,527 @@
+import time as monotonic_clock
+from supabase import Client
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from clinic_time import local_now, parse_local
+from slot_engine import MAX_APPOINTMENT_MINUTES, SLOT_INTERVAL_MINUTES, ProviderSnapshot, format_slot
+from reference_data import visit_types
+
+# Table, day manifest and replace function created by sql/free_slots.sql
+FREE_SLOTS_TABLE = "free_slots"
+FREE_SLOT_DAYS_TABLE = "free_slot_days"
+REPLACE_FUNCTION = "replace_free_slots"
+
+# Rows per page when reading the table back (PostgREST's default cap)
+PAGE_SIZE = 1000
+
+# How long to trust a "table does not exist" answer before trying again
+TABLE_RECHECK_SECONDS = 300
+
+# PostgREST: relation not in the schema cache / Postgres: undefined_table
+_MISSING_TABLE_CODES = ("PGRST205", "42P01")
+
+# PostgREST: function not in the schema cache / Postgres: undefined_function
+_MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
+# Process-level detection state, shared by warm Windmill invocations
+_table_missing_since: Optional[float] = None
+
+def compute_free_slot_rows(
+    provider_id: str,
+    availability_rows: List[Dict],
+    visit_types: List[Dict],
+    appointment_rows: List[Dict],
+    dates: Iterable[date]
+) -> List[Dict]:
+    """
+    Compute the free_slots rows of one provider for the given dates.
+
+    One row is produced per visit type and per 15-minute slot the slot search
+    would consider with the visit type's default duration. remaining_capacity is
+    how many more patients of that visit type can start at the slot; it is 0 when
+    the slot is taken, and conflict_reason then holds the reason n7 reports.
+
+    Args:
+        provider_id: Provider the rows belong to
+        availability_rows: The provider's availability rows
+        visit_types: All visit type rows
+        appointment_rows: The provider's scheduled appointments around the dates
+        dates: Days to compute
+
+    Returns:
+        List of free_slots rows (without refreshed_at)
+    """
+
+    step = timedelta(minutes=SLOT_INTERVAL_MINUTES)
+    rows = []
+
+    for visit_type in visit_types:
+        snapshot = ProviderSnapshot(provider_id, visit_type["name"], availability_rows, visit_type, appointment_rows)
+        duration = visit_type["default_duration_minutes"]
+        max_patients = visit_type["max_patients_per_slot"]
+
+        for slot_date in dates:
+            midnight = datetime.combine(slot_date, time())
+            slots = set()
+            for window_start, window_end in snapshot.schedule.windows_on(slot_date):
+                end_of_window = midnight + timedelta(seconds=window_end)
+                # First 15-minute boundary at or after the start of the working window
+                slot = midnight + step * -(-timedelta(seconds=window_start) // step)
+                while slot + timedelta(minutes=duration) <= end_of_window:
+                    slots.add(slot)
+                    slot += step
+
+            for slot in sorted(slots):
+                is_available, reason = snapshot.check(slot, duration)
+                same_start = len(snapshot.appointments.starting_at(slot)) if is_available else 0
+                rows.append({
+                    "provider_id": provider_id,
+                    "slot_date": slot_date.isoformat(),
+                    "slot_start": slot.isoformat(),
+                    "visit_type": visit_type["name"],
+                    "duration_minutes": duration,
+                    "remaining_capacity": max_patients - same_start if is_available else 0,
+                    "conflict_reason": reason
+                })
+
+    return rows
+
+def refresh_free_slots(supabase: Client, provider_id: str, dates: Iterable[date]) -> Optional[List[date]]:
+    """
+    Recompute the free_slots rows of one provider for the given dates.
+
+    The version of each day is read before the schedule, and the rows are
+    written by replace_free_slots in one transaction: readers never see a day
+    half replaced, and a day an appointment write touched meanwhile keeps its
+    old rows and stays stale for the next refresh.
+
+    Returns:
+        The days replaced, or None when the free_slots table (or its function)
+        is not installed
+    """
+
+    global _table_missing_since
+
+    dates = sorted(set(dates))
+    if not dates:
+        return []
+    if _table_known_missing():
+        return None
+
+    try:
+        versions = _day_versions(supabase, provider_id, dates)
+        availability_rows, appointment_rows = _load_schedule(supabase, provider_id, dates[0], dates[-1])
+        rows = compute_free_slot_rows(provider_id, availability_rows, visit_types.all(supabase), appointment_rows, dates)
+        replaced = _replace_days(supabase, provider_id, versions, rows)
+    except Exception as e:
+        if getattr(e, "code", None) in _MISSING_TABLE_CODES + _MISSING_FUNCTION_CODES:
+            _table_missing_since = monotonic_clock.monotonic()
+            return None
+        raise
+
+    _table_missing_since = None
+    return replaced
+
+def refresh_stale_free_slots(supabase: Client, days_ahead: int = 30) -> Dict:
+    """
+    Recompute the days appointment writes marked stale.
+
+    The trigger in sql/free_slots.sql marks every day an appointment write
+    touches stale in free_slot_days; this refreshes those from today through
+    days_ahead days later, provider by provider. Scheduled every minute or so,
+    it keeps the table close to the live schedule without any work on the
+    scripts' response path (n7 computes stale days live meanwhile).
+
+    Returns:
+        Dict with the number of stale days found and replaced, and whether the
+        table is installed
+    """
+
+    first_date = local_now().date()
+    last_date = first_date + timedelta(days=days_ahead)
+    report = {
+        "first_date": first_date.isoformat(),
+        "last_date": last_date.isoformat(),
+        "installed": True,
+        "stale_days": 0,
+        "refreshed_days": 0,
+        "providers": 0
+    }
+
+    stale_rows = _detect_missing_table(lambda: supabase.table(FREE_SLOT_DAYS_TABLE).select("provider_id, slot_date") \
+        .eq("stale", True) \
+        .gte("slot_date", first_date.isoformat()) \
+        .lte("slot_date", last_date.isoformat()) \
+        .execute())
+    if stale_rows is None:
+        report["installed"] = False
+        return report
+
+    stale_days: Dict[str, set] = {}
+    for row in stale_rows:
+        stale_days.setdefault(row["provider_id"], set()).add(date.fromisoformat(row["slot_date"]))
+
+    for provider_id, days in stale_days.items():
+        replaced = refresh_free_slots(supabase, provider_id, days)
+        if replaced is None:
+            report["installed"] = False
+            return report
+        report["stale_days"] += len(days)
+        report["refreshed_days"] += len(replaced)
+        report["providers"] += 1
+
+    return report
+
+def rebuild_free_slots(
+    supabase: Client,
+    days_ahead: int = 30,
+    dry_run: bool = False,
+    start_date: date = None
+) -> Dict:
+    """
+    Regenerate the free_slots table from scratch and report drift.
+
+    The rows of every provider from start_date (default today) through
+    days_ahead days later are recomputed from the live availability, visit types
+    and appointments and compared with what the table holds. Days an appointment
+    write touched while a provider was recomputed are left stale (counted in
+    skipped_days) for the next stale-only refresh.
+
+    Args:
+        supabase: Supabase client
+        days_ahead: How many days after start_date to materialize
+        dry_run: Only report drift, do not write
+        start_date: First day to materialize
+
+    Returns:
+        Dict with overall and per-provider counts of missing, stale and mismatched rows
+    """
+
+    first_date = start_date or local_now().date()
+    last_date = first_date + timedelta(days=days_ahead)
+    dates = [first_date + timedelta(days=offset) for offset in range(days_ahead + 1)]
+
+    providers_response = supabase.table("providers").select("id, full_name").execute()
+    visit_types_response = supabase.table("visit_types").select("*").execute()
+
+    report = {
+        "first_date": first_date.isoformat(),
+        "last_date": last_date.isoformat(),
+        "dry_run": dry_run,
+        "rows": 0,
+        "missing": 0,
+        "stale": 0,
+        "mismatched": 0,
+        "skipped_days": 0,
+        "providers": []
+    }
+
+    for provider in providers_response.data or []:
+        provider_id = provider["id"]
+        versions = None if dry_run else _day_versions(supabase, provider_id, dates)
+        availability_rows, appointment_rows = _load_schedule(supabase, provider_id, first_date, last_date)
+        live_rows = compute_free_slot_rows(provider_id, availability_rows, visit_types_response.data or [], appointment_rows, dates)
+        stored_rows = _fetch_stored_rows(supabase, provider_id, first_date, last_date)
+
+        drift = _compare_rows(live_rows, stored_rows)
+        report["providers"].append({
+            "provider_id": provider_id,
+            "provider_name": provider.get("full_name", "Unknown Provider"),
+            "rows": len(live_rows),
+            **drift
+        })
+        report["rows"] += len(live_rows)
+        for key in ("missing", "stale", "mismatched"):
+            report[key] += drift[key]
+
+        if not dry_run:
+            report["skipped_days"] += len(dates) - len(_replace_days(supabase, provider_id, versions, live_rows))
+
+    report["drift_detected"] = bool(report["missing"] or report["stale"] or report["mismatched"])
+    return report
+
+def lookup_free_slots(
+    supabase: Client,
+    appointment: Dict,
+    requested_dt: datetime,
+    max_alternatives: int = 1,
+    max_days_ahead: int = 30
+) -> Optional[Dict]:
+    """
+    Answer n7 from the free_slots table with indexed lookups.
+
+    The requested slot is one primary-key lookup and the days the answer rests
+    on one more read of free_slot_days; when the slot is taken the next free
+    slots are one more range scan over the partial index of free rows. Only days
+    materialized and not marked stale by an appointment write since are trusted.
+
+    Returns:
+        Dict with "available", "conflict_reason" and "alternatives" (formatted slots),
+        or None when the table cannot answer exactly and the caller should compute
+        the result live: the slot is not materialized (off the 15-minute grid,
+        outside the scanned working window, a non-default duration, past the
+        materialized horizon), its day is stale, the answer depends on the appointment being moved,
+        or the table is not installed
+    """
+
+    moved = _moved_window(appointment, requested_dt)
+    if moved is None:
+        return None
+    moved_from, moved_until = moved
+
+    requested_rows = _detect_missing_table(
+        lambda: _slots_query(supabase, appointment).eq("slot_start", requested_dt.isoformat()).execute()
+    )
+    if not requested_rows:
+        return None
+
+    last_date = requested_dt.date() + timedelta(days=max_days_ahead)
+    fresh_until = _fresh_until(supabase, appointment["provider_id"], requested_dt.date(), last_date)
+    if fresh_until is None:
+        return None
+
+    requested_row = requested_rows[0]
+    if requested_row["remaining_capacity"] > 0:
+        return {"available": True, "conflict_reason": "", "alternatives": []}
+
+    free_response = _free_slots_query(supabase, appointment, requested_dt, fresh_until, max_alternatives).execute()
+    return _taken_slot_result(requested_row, free_response.data, requested_dt, max_alternatives, moved_from, moved_until)
+
+async def lookup_free_slots_async(
+    supabase,
+    appointment: Dict,
+    requested_dt: datetime,
+    max_alternatives: int = 1,
+    max_days_ahead: int = 30
+) -> Optional[Dict]:
+    """`lookup_free_slots` for the async Supabase client (same detection state)."""
+
+    moved = _moved_window(appointment, requested_dt)
+    if moved is None:
+        return None
+    moved_from, moved_until = moved
+
+    requested_rows = await _detect_missing_table_async(
+        lambda: _slots_query(supabase, appointment).eq("slot_start", requested_dt.isoformat()).execute()
+    )
+    if not requested_rows:
+        return None
+
+    last_date = requested_dt.date() + timedelta(days=max_days_ahead)
+    fresh_rows = await _detect_missing_table_async(
+        lambda: _fresh_days_query(supabase, appointment["provider_id"], requested_dt.date(), last_date).execute()
+    )
+    fresh_until = _last_fresh_day(fresh_rows, requested_dt.date(), last_date)
+    if fresh_until is None:
+        return None
+
+    requested_row = requested_rows[0]
+    if requested_row["remaining_capacity"] > 0:
+        return {"available": True, "conflict_reason": "", "alternatives": []}
+
+    free_response = await _free_slots_query(supabase, appointment, requested_dt, fresh_until, max_alternatives).execute()
+    return _taken_slot_result(requested_row, free_response.data, requested_dt, max_alternatives, moved_from, moved_until)
+
+def _moved_window(appointment: Dict, requested_dt: datetime) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Where slots may free up once the moved appointment is excluded, or None
+    when the table cannot answer for `requested_dt` at all.
+    """
+
+    if _table_known_missing() or requested_dt < local_now():
+        return None
+
+    duration = appointment["duration_minutes"]
+    # The table still counts the appointment being moved; slots overlapping it
+    # may be free once it is excluded
+    current_start = parse_local(appointment["appointment_time"])
+    moved_from = current_start - timedelta(minutes=duration)
+    moved_until = current_start + timedelta(minutes=duration)
+
+    if moved_from < requested_dt < moved_until:
+        return None
+    return moved_from, moved_until
+
+def _slots_query(supabase, appointment: Dict):
+    return supabase.table(FREE_SLOTS_TABLE).select("slot_start, remaining_capacity, conflict_reason") \
+        .eq("provider_id", appointment["provider_id"]) \
+        .eq("visit_type", appointment["type"]) \
+        .eq("duration_minutes", appointment["duration_minutes"])
+
+def _free_slots_query(supabase, appointment: Dict, requested_dt: datetime, fresh_until: date, max_alternatives: int):
+    return _slots_query(supabase, appointment) \
+        .gt("remaining_capacity", 0) \
+        .gte("slot_start", requested_dt.isoformat()) \
+        .lte("slot_date", fresh_until.isoformat()) \
+        .order("slot_start") \
+        .limit(max_alternatives)
+
+def _taken_slot_result(
+    requested_row: Dict,
+    free_rows: Optional[List[Dict]],
+    requested_dt: datetime,
+    max_alternatives: int,
+    moved_from: datetime,
+    moved_until: datetime
+) -> Optional[Dict]:
+    slots = [parse_local(row["slot_start"]) for row in free_rows or []]
+
+    # Too few rows may just mean the horizon is not materialized (or a stale day
+    # cut the scan short), and the moved
+    # appointment may free a slot earlier than the last one found
+    if len(slots) < max_alternatives or (moved_from < slots[-1] and requested_dt < moved_until):
+        return None
+
+    return {
+        "available": False,
+        "conflict_reason": requested_row["conflict_reason"],
+        "alternatives": [format_slot(slot) for slot in slots]
+    }
+
+def reset_free_slots_detection() -> None:
+    """Forget whether the table exists (e.g. right after creating it)."""
+
+    global _table_missing_since
+    _table_missing_since = None
+
+def _table_known_missing() -> bool:
+    return _table_missing_since is not None and monotonic_clock.monotonic() - _table_missing_since < TABLE_RECHECK_SECONDS
+
+def _detect_missing_table(execute) -> Optional[List[Dict]]:
+    """Run a free_slots read, returning None (and remembering why) when the table is missing."""
+
+    try:
+        response = execute()
+    except Exception as e:
+        if _note_missing_table(e):
+            return None
+        raise
+
+    return _note_table_found(response)
+
+async def _detect_missing_table_async(execute) -> Optional[List[Dict]]:
+    """`_detect_missing_table` for a read on the async client."""
+
+    try:
+        response = await execute()
+    except Exception as e:
+        if _note_missing_table(e):
+            return None
+        raise
+
+    return _note_table_found(response)
+
+def _note_missing_table(error: Exception) -> bool:
+    global _table_missing_since
+
+    if getattr(error, "code", None) in _MISSING_TABLE_CODES:
+        _table_missing_since = monotonic_clock.monotonic()
+        return True
+    return False
+
+def _note_table_found(response) -> List[Dict]:
+    global _table_missing_since
+
+    _table_missing_since = None
+    return response.data or []
+
+def _load_schedule(
+    supabase: Client,
+    provider_id: str,
+    first_date: date,
+    last_date: date
+) -> Tuple[List[Dict], List[Dict]]:
+    """Availability rows and the scheduled appointments that can overlap slots on the given days."""
+
+    availability_response = supabase.table("availability").select("*").eq("provider_id", provider_id).execute()
+
+    window_start = datetime.combine(first_date, time()) - timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+    window_end = datetime.combine(last_date + timedelta(days=1), time())
+    appointments_response = supabase.table("appointments").select("*") \
+        .eq("provider_id", provider_id) \
+        .eq("status", "scheduled") \
+        .gte("appointment_time", window_start.isoformat()) \
+        .lt("appointment_time", window_end.isoformat()) \
+        .execute()
+
+    return availability_response.data or [], appointments_response.data or []
+
+def _day_versions(supabase: Client, provider_id: str, dates: List[date]) -> Dict[date, int]:
+    """Version of each day in free_slot_days (0 for a day never written), read before computing its rows."""
+
+    response = supabase.table(FREE_SLOT_DAYS_TABLE).select("slot_date, version") \
+        .eq("provider_id", provider_id) \
+        .gte("slot_date", dates[0].isoformat()) \
+        .lte("slot_date", dates[-1].isoformat()) \
+        .execute()
+    stored = {row["slot_date"]: row["version"] for row in response.data or []}
+    return {slot_date: stored.get(slot_date.isoformat(), 0) for slot_date in dates}
+
+def _replace_days(supabase: Client, provider_id: str, versions: Dict[date, int], rows: List[Dict]) -> List[date]:
+    """Replace the rows of the days in one transaction; the days whose version still matched."""
+
+    response = supabase.rpc(REPLACE_FUNCTION, {
+        "p_provider_id": provider_id,
+        "p_days": [{"slot_date": slot_date.isoformat(), "version": version} for slot_date, version in versions.items()],
+        "p_rows": rows
+    }).execute()
+    return [date.fromisoformat(slot_date) for slot_date in response.data or []]
+
+def _fresh_until(supabase: Client, provider_id: str, first_date: date, last_date: date) -> Optional[date]:
+    """Last day of the run of fresh days from first_date, None when first_date itself is not fresh."""
+
+    fresh_rows = _detect_missing_table(lambda: _fresh_days_query(supabase, provider_id, first_date, last_date).execute())
+    return _last_fresh_day(fresh_rows, first_date, last_date)
+
+def _fresh_days_query(supabase, provider_id: str, first_date: date, last_date: date):
+    return supabase.table(FREE_SLOT_DAYS_TABLE).select("slot_date") \
+        .eq("provider_id", provider_id) \
+        .eq("stale", False) \
+        .gte("slot_date", first_date.isoformat()) \
+        .lte("slot_date", last_date.isoformat())
+
+def _last_fresh_day(fresh_rows: Optional[List[Dict]], first_date: date, last_date: date) -> Optional[date]:
+    fresh = {row["slot_date"] for row in fresh_rows or []}
+
+    if first_date.isoformat() not in fresh:
+        return None
+    slot_date = first_date
+    while slot_date < last_date and (slot_date + timedelta(days=1)).isoformat() in fresh:
+        slot_date += timedelta(days=1)
+    return slot_date
+
+def _fetch_stored_rows(supabase: Client, provider_id: str, first_date: date, last_date: date) -> List[Dict]:
+    """Read one provider's stored rows page by page."""
+
+    rows = []
+    while True:
+        response = supabase.table(FREE_SLOTS_TABLE).select("*") \
+            .eq("provider_id", provider_id) \
+            .gte("slot_date", first_date.isoformat()) \
+            .lte("slot_date", last_date.isoformat()) \
+            .order("slot_start") \
+            .order("visit_type") \
+            .range(len(rows), len(rows) + PAGE_SIZE - 1) \
+            .execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < PAGE_SIZE:
+            return rows
+
+def _compare_rows(live_rows: List[Dict], stored_rows: List[Dict]) -> Dict:
+    """Count rows missing from the table, left over in it, or holding a different answer."""
+
+    def key(row: Dict) -> Tuple[str, datetime]:
+        return row["visit_type"], parse_local(row["slot_start"])
+
+    def answer(row: Dict) -> Tuple[int, int, str]:
+        return row["duration_minutes"], row["remaining_capacity"], row["conflict_reason"] or ""
+
+    live = {key(row): row for row in live_rows}
+    stored = {key(row): row for row in stored_rows}
+
+    return {
+        "missing": len(live.keys() - stored.keys()),
+        "stale": len(stored.keys() - live.keys()),
+        "mismatched": sum(1 for slot in live.keys() & stored.keys() if answer(live[slot]) != answer(stored[slot]))
+    }
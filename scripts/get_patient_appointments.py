@@ -1,9 +1,23 @@
-import wmill
 from supabase import create_client, Client
+from supabase_client import get_supabase_client
 from datetime import datetime, timedelta
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Callable, List, Optional, Tuple
+from clinic_time import local_now, parse_local
+from reference_data import get_provider
+from patient_lookup import find_patient, find_patient_candidates, name_confirmations
+from deadline import Deadline, NO_DEADLINE
+from prefetch import prefetch_calendar
 
-def main(patient_name: str, date_of_birth: str) -> Dict[str, Any]:
+def main(
+    patient_name: str,
+    date_of_birth: str,
+    use_patient_index: bool = True,
+    fuzzy_match: bool = False,
+    deadline_ms: int = None,
+    prefetch: bool = False,
+    confirmation_token: str = None,
+    phone_last4: str = None
+) -> Dict[str, Any]:
     """
     Retrieve upcoming appointments for a patient by name and date of birth.
     Returns data in AI-agent readable format with minimum necessary details.
@@ -11,113 +25,297 @@ def main(patient_name: str, date_of_birth: str) -> Dict[str, Any]:
     Args:
         patient_name (str): Full name of the patient (case-insensitive)
         date_of_birth (str): Date of birth in YYYY-MM-DD format
+        use_patient_index (bool): Serve repeat lookups from the worker's in-process patient index
+        fuzzy_match (bool): When no name matches exactly, look for names with that date of birth that
+            sound alike or are spelled within two edits (e.g. "Jon Doe" for "John Doe") and, if there
+            are any, return a "confirmation_token" instead of a record; the caller confirms with the
+            last 4 digits of their phone number
+        deadline_ms (int): Time budget for the whole call; optional stages (the similar-name search,
+            provider lookups the server did not embed) are skipped once it is spent and the
+            response carries "partial": True
+        prefetch (bool): Start loading the next appointment's calendar in the background, so a
+            check_appointment_availability call for it in the next few seconds is answered from memory
+        confirmation_token (str): Token from a "confirmation_required" response; with phone_last4,
+            resolves the similar name it was issued for instead of looking the name up again
+        phone_last4 (str): Last 4 digits of the phone number on the caller's record
     
     Returns:
         Dict containing patient info and upcoming appointments in AI-readable format
     """
     
+    deadline = Deadline(deadline_ms)
+    
     try:
-        # Step 1: Setup Supabase
-        config = wmill.get_resource("u/gregory/supabase")
-        supabase: Client = create_client(config["url"], config["key"])
+        # Step 1: Setup Supabase (the worker's shared client, reused while warm)
+        supabase: Client = get_supabase_client(create_client)
         
-        # Step 2: Validate date of birth format
-        try:
-            dob_date = datetime.strptime(date_of_birth, "%Y-%m-%d").date()
-        except ValueError:
-            return {
-                "success": False,
-                "error": f"Invalid date of birth format: {date_of_birth}. Expected YYYY-MM-DD format."
-            }
+        # Steps 2-3.5: Validate the date of birth and find the patient (exact name, or a name that
+        # sounds alike or is spelled close once the caller confirms it with their phone number)
+        matching_patient, name_match, error = identify_patient(
+            supabase, patient_name, date_of_birth, use_patient_index, fuzzy_match, deadline,
+            confirmation_token, phone_last4
+        )
+        if error:
+            return error
         
-        # Step 3: Find patient by name and DOB
-        patient_response = supabase.table("patients").select("*").execute()
+        # Step 4: Get upcoming appointments (scheduled status, future dates only - filtered by the server),
+        # with each one's provider embedded so the call costs one round-trip however many there are
+        current_time = local_now()
+        appointments_response = upcoming_appointments_query(supabase, matching_patient["id"], current_time).execute()
         
-        if not patient_response.data:
-            return {
-                "success": False,
-                "error": "No patients found in database"
-            }
+        # Step 5: Format response (provider embedded by the query; from the process-level
+        # reference cache if the server did not embed it and the deadline allows)
+        skipped_providers = []
+        result = format_patient_appointments(
+            matching_patient,
+            name_match,
+            appointments_response.data or [],
+            current_time,
+            cached_provider_info(supabase, deadline, skipped_providers)
+        )
+        if deadline.bounded:
+            result["partial"] = bool(skipped_providers)
         
-        # Find matching patient (case-insensitive name matching)
-        matching_patient = None
-        patient_name_lower = patient_name.lower().strip()
+        # Step 6: Warm what n7 needs to move the next appointment ("can I move it earlier?")
+        if prefetch and result.get("next_appointment"):
+            next_id = result["next_appointment"]["appointment_id"]
+            prefetch_calendar(supabase, next(row for row in appointments_response.data if row["id"] == next_id))
         
-        for patient in patient_response.data:
-            if (patient.get("full_name", "").lower().strip() == patient_name_lower and 
-                patient.get("date_of_birth") == date_of_birth):
-                matching_patient = patient
-                break
-        
-        if not matching_patient:
-            return {
-                "success": False,
-                "error": f"No patient found with name '{patient_name}' and date of birth '{date_of_birth}'"
-            }
+        return result
         
-        # Step 4: Get upcoming appointments (scheduled status, future dates only)
-        current_time = datetime.now()
-        appointments_response = supabase.table("appointments").select("*").eq("patient_id", matching_patient["id"]).eq("status", "scheduled").execute()
-        
-        if not appointments_response.data:
-            return {
-                "success": True,
-                "patient_found": True,
-                "patient_name": matching_patient["full_name"],
-                "upcoming_appointments": []
-            }
+    except Exception as e:
+        return patient_appointments_error(e)
+
+def patient_appointments_error(error: Exception) -> Dict[str, Any]:
+    """Response for an unexpected failure."""
+    
+    return {
+        "success": False,
+        "error": f"An error occurred while retrieving patient appointments: {str(error)}"
+    }
+
+def identify_patient(
+    supabase: Client,
+    patient_name: str,
+    date_of_birth: str,
+    use_patient_index: bool = True,
+    fuzzy_match: bool = False,
+    deadline: Deadline = NO_DEADLINE,
+    confirmation_token: str = None,
+    phone_last4: str = None
+) -> Tuple[Optional[Dict], str, Optional[Dict]]:
+    """
+    Find the patient a caller identified by name and date of birth.
+    
+    Returns:
+        Tuple of (patient, name_match, error_response): name_match is "exact", or
+        "confirmed" when a similar name was confirmed with a confirmation token and
+        the phone digits; error_response is set (and patient None) when the date of
+        birth is invalid, no patient matches exactly (with "partial" when the deadline
+        left no time to search similar names), a similar name must be confirmed, or
+        the confirmation failed
+    """
+    
+    # Validate date of birth format
+    error = invalid_date_of_birth(date_of_birth)
+    if error:
+        return None, "exact", error
+    
+    # A caller confirming a similar name answers with their phone digits instead
+    if confirmation_token:
+        return confirmation(confirmation_token, date_of_birth, phone_last4)
+    
+    # Find patient by name and DOB (filtered by the server, case-insensitive name matching)
+    matching_patient = find_patient(supabase, patient_name, date_of_birth, use_patient_index)
+    if matching_patient or not fuzzy_match:
+        return identification(patient_name, date_of_birth, matching_patient)
+    
+    # Look for names that sound alike or are spelled close (speech-to-text errors),
+    # unless the deadline has passed
+    if deadline.expired():
+        return identification(patient_name, date_of_birth, None, similar_names_skipped=True)
+    
+    candidates = find_patient_candidates(supabase, patient_name, date_of_birth)
+    return identification(patient_name, date_of_birth, None, candidates)
+
+def invalid_date_of_birth(date_of_birth: str) -> Optional[Dict]:
+    """Error response for a date of birth not in YYYY-MM-DD format, None when it is valid."""
+    
+    try:
+        datetime.strptime(date_of_birth, "%Y-%m-%d").date()
+    except ValueError:
+        return {
+            "success": False,
+            "error": f"Invalid date of birth format: {date_of_birth}. Expected YYYY-MM-DD format."
+        }
+    return None
+
+def confirmation(
+    confirmation_token: str,
+    date_of_birth: str,
+    phone_last4: Optional[str]
+) -> Tuple[Optional[Dict], str, Optional[Dict]]:
+    """The result of `identify_patient` for a caller answering a confirmation request."""
+    
+    patient = name_confirmations.confirm(confirmation_token, date_of_birth, phone_last4)
+    if patient:
+        return patient, "confirmed", None
+    
+    return None, "approximate", {
+        "success": False,
+        "confirmation_failed": True,
+        "error": "The phone number digits did not confirm the patient, or the confirmation expired. Ask the caller to check their details and look them up again."
+    }
+
+def identification(
+    patient_name: str,
+    date_of_birth: str,
+    patient: Optional[Dict],
+    candidates: List[Dict] = None,
+    similar_names_skipped: bool = False
+) -> Tuple[Optional[Dict], str, Optional[Dict]]:
+    """
+    The result of `identify_patient` once its lookups are done: the patient whose
+    name matched exactly, a confirmation request when only similar names did, or
+    an error response.
+    """
+    
+    if patient:
+        return patient, "exact", None
+    
+    confirmation = confirm_name_response(patient_name, date_of_birth, candidates or [])
+    if confirmation:
+        return None, "approximate", confirmation
+    
+    if similar_names_skipped:
+        return None, "exact", {
+            "success": False,
+            "error": f"No patient found with name '{patient_name}' and date of birth '{date_of_birth}' (similar names were not searched: the time budget was spent)",
+            "partial": True
+        }
+    
+    return None, "exact", {
+        "success": False,
+        "error": f"No patient found with name '{patient_name}' and date of birth '{date_of_birth}'"
+    }
+
+def upcoming_appointments_query(supabase: Client, patient_id: str, current_time: datetime):
+    """Query for a patient's scheduled future appointments, each with its provider embedded."""
+    
+    return supabase.table("appointments").select("*, providers(full_name, specialty)").eq("patient_id", patient_id).eq("status", "scheduled").gt("appointment_time", current_time.isoformat())
+
+def confirm_name_response(
+    patient_name: str,
+    date_of_birth: str,
+    candidates: List[Dict]
+) -> Optional[Dict]:
+    """
+    Response for a name that only approximately matches a patient with this date of birth.
+    
+    Nothing about the patients is returned, not even their names: a caller giving a
+    wrong name and a known date of birth would otherwise get another patient's record,
+    or the names of everyone born that day. The candidates stay in the worker behind
+    a confirmation token; the agent asks the caller for the last 4 digits of their
+    phone number and calls again with both, which returns the patient whose number
+    ends in them.
+    
+    Returns:
+        The confirmation-required error response, or None when no similar name was found
+        (or none of them has a phone number to confirm with)
+    """
+    
+    token = name_confirmations.issue(date_of_birth, [candidate["patient"] for candidate in candidates])
+    if token is None:
+        return None
+    
+    return {
+        "success": False,
+        "confirmation_required": True,
+        "name_match": "approximate",
+        "confirmation_token": token,
+        "error": f"No patient found with name '{patient_name}' and date of birth '{date_of_birth}'. A similar name is on file: ask the caller for the last 4 digits of the phone number on their record and call again with confirmation_token and phone_last4."
+    }
+
+def cached_provider_info(supabase: Client, deadline: Deadline, skipped_providers: List[str]) -> Callable[[Dict], Dict]:
+    """
+    `provider_info_for` of format_patient_appointments: the provider from the
+    process-level reference cache while the deadline allows; past it, the
+    provider id is appended to `skipped_providers` and no details are given.
+    """
+    
+    def provider_info_for(appointment: Dict) -> Dict:
+        if deadline.expired():
+            skipped_providers.append(appointment["provider_id"])
+            return {}
+        return get_provider(supabase, appointment["provider_id"]) or {}
+    
+    return provider_info_for
+
+def format_patient_appointments(
+    patient: Dict,
+    name_match: str,
+    appointment_rows: List[Dict],
+    current_time: datetime,
+    provider_info_for: Callable[[Dict], Dict]
+) -> Dict[str, Any]:
+    """
+    Build the AI-readable response from the patient and their appointment rows.
+    
+    Args:
+        patient: Matched patient row
+        name_match: "exact", or "confirmed" for a similar name confirmed by phone digits
+        appointment_rows: Scheduled appointments, with "providers" embedded when the server supports it
+        current_time: Appointments at or before this time are left out
+        provider_info_for: Provider details for a row the server did not embed them in
+    """
+    
+    # Filter for future appointments and get provider details
+    upcoming_appointments = []
+    for appointment in appointment_rows:
+        appointment_time = parse_local(appointment["appointment_time"])
         
-        # Filter for future appointments and get provider details
-        upcoming_appointments = []
-        for appointment in appointments_response.data:
-            appointment_time = datetime.fromisoformat(appointment["appointment_time"].replace('Z', '+00:00'))
+        if appointment_time > current_time:
+            if "providers" in appointment:
+                provider_info = appointment["providers"] or {}
+            else:
+                provider_info = provider_info_for(appointment)
             
-            if appointment_time > current_time:
-                # Get provider information
-                provider_response = supabase.table("providers").select("full_name, specialty").eq("id", appointment["provider_id"]).execute()
-                provider_info = provider_response.data[0] if provider_response.data else {}
-                
-                # Format appointment for AI agent
-                formatted_appointment = {
-                    "appointment_id": appointment["id"],
-                    "date": appointment_time.strftime("%A, %B %d, %Y"),
-                    "time": appointment_time.strftime("%I:%M %p"),
-                    "datetime_iso": appointment["appointment_time"],
-                    "provider_name": provider_info.get("full_name", "Unknown Provider"),
-                    "provider_specialty": provider_info.get("specialty", ""),
-                    "appointment_type": appointment["type"],
-                    "duration_minutes": appointment["duration_minutes"],
-                    "notes": appointment.get("notes", "")
-                }
-                upcoming_appointments.append(formatted_appointment)
-        
-        # Sort appointments by date
-        upcoming_appointments.sort(key=lambda x: x["datetime_iso"])
-        
-        if not upcoming_appointments:
-            return {
-                "success": True,
-                "patient_found": True,
-                "patient_name": matching_patient["full_name"],
-                "upcoming_appointments": []
+            # Format appointment for AI agent
+            formatted_appointment = {
+                "appointment_id": appointment["id"],
+                "date": appointment_time.strftime("%A, %B %d, %Y"),
+                "time": appointment_time.strftime("%I:%M %p"),
+                "datetime_iso": appointment["appointment_time"],
+                "provider_name": provider_info.get("full_name", "Unknown Provider"),
+                "provider_specialty": provider_info.get("specialty", ""),
+                "appointment_type": appointment["type"],
+                "duration_minutes": appointment["duration_minutes"],
+                "notes": appointment.get("notes", "")
             }
-        
-        # Step 5: Format response
-        next_appointment = upcoming_appointments[0]
-        
+            upcoming_appointments.append(formatted_appointment)
+    
+    # Sort appointments by date
+    upcoming_appointments.sort(key=lambda x: x["datetime_iso"])
+    
+    if not upcoming_appointments:
         return {
             "success": True,
             "patient_found": True,
-            "patient_name": matching_patient["full_name"],
-            "patient_phone": matching_patient.get("phone", ""),
-            "patient_email": matching_patient.get("email", ""),
-            "upcoming_appointments": upcoming_appointments,
-            "next_appointment": next_appointment,
-            "total_appointments": len(upcoming_appointments)
+            "patient_name": patient["full_name"],
+            "name_match": name_match,
+            "upcoming_appointments": []
         }
-        
-    except Exception as e:
-        return {
-            "success": False,
-            "error": f"An error occurred while retrieving patient appointments: {str(e)}"
-        }
\ No newline at end of file
+    
+    next_appointment = upcoming_appointments[0]
+    
+    return {
+        "success": True,
+        "patient_found": True,
+        "patient_name": patient["full_name"],
+        "name_match": name_match,
+        "patient_phone": patient.get("phone", ""),
+        "patient_email": patient.get("email", ""),
+        "upcoming_appointments": upcoming_appointments,
+        "next_appointment": next_appointment,
+        "total_appointments": len(upcoming_appointments)
+    }
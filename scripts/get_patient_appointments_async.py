@@ -0,0 +1,124 @@
+import asyncio
+from supabase import acreate_client, create_client, AsyncClient
+from supabase_client import get_async_supabase_client, get_supabase_client
+from typing import Dict, Any, Optional, Tuple
+from clinic_time import local_now
+from reference_data import get_providers_async
+from patient_lookup import find_patient_async, find_patient_candidates_async
+from deadline import Deadline, NO_DEADLINE
+from prefetch import prefetch_calendar
+from get_patient_appointments import (
+    confirmation, format_patient_appointments, identification, invalid_date_of_birth, patient_appointments_error, upcoming_appointments_query
+)
+
+async def main(
+    patient_name: str,
+    date_of_birth: str,
+    use_patient_index: bool = True,
+    fuzzy_match: bool = False,
+    deadline_ms: int = None,
+    prefetch: bool = False,
+    confirmation_token: str = None,
+    phone_last4: str = None
+) -> Dict[str, Any]:
+    """
+    Retrieve upcoming appointments for a patient by name and date of birth.
+    Async variant of get_patient_appointments: same arguments and response, but
+    one worker serves many concurrent calls on its event loop.
+    
+    Args:
+        patient_name (str): Full name of the patient (case-insensitive)
+        date_of_birth (str): Date of birth in YYYY-MM-DD format
+        use_patient_index (bool): Serve repeat lookups from the worker's in-process patient index
+        fuzzy_match (bool): When no name matches exactly, return a confirmation token if a name with
+            that date of birth sounds alike or is spelled within two edits (see get_patient_appointments)
+        deadline_ms (int): Time budget for the whole call (see get_patient_appointments)
+        prefetch (bool): Start loading the next appointment's calendar in the background
+            (on the prefetch threads, with the worker's sync client)
+        confirmation_token (str): Token from a "confirmation_required" response (see get_patient_appointments)
+        phone_last4 (str): Last 4 digits of the phone number on the caller's record
+    
+    Returns:
+        Dict containing patient info and upcoming appointments in AI-readable format
+    """
+    
+    deadline = Deadline(deadline_ms)
+    
+    try:
+        # Step 1: Setup Supabase (the event loop's shared async client)
+        supabase: AsyncClient = await get_async_supabase_client(acreate_client)
+        
+        # Steps 2-3.5: Validate the date of birth and find the patient (exact name, or a name that
+        # sounds alike or is spelled close once the caller confirms it with their phone number)
+        matching_patient, name_match, error = await identify_patient_async(
+            supabase, patient_name, date_of_birth, use_patient_index, fuzzy_match, deadline,
+            confirmation_token, phone_last4
+        )
+        if error:
+            return error
+        
+        # Step 4: Get upcoming appointments with each one's provider embedded
+        current_time = local_now()
+        appointments_response = await upcoming_appointments_query(supabase, matching_patient["id"], current_time).execute()
+        appointment_rows = appointments_response.data or []
+        
+        # Step 4.5: Servers that do not embed: providers come from the reference cache
+        # (one bulk read when it is cold, none when warm), when the deadline allows
+        providers_by_id = {}
+        needs_providers = any("providers" not in row for row in appointment_rows)
+        skip_providers = needs_providers and deadline.expired()
+        if needs_providers and not skip_providers:
+            providers_by_id = {provider["id"]: provider for provider in await get_providers_async(supabase)}
+        
+        # Step 5: Format response
+        result = format_patient_appointments(
+            matching_patient,
+            name_match,
+            appointment_rows,
+            current_time,
+            lambda appointment: providers_by_id.get(appointment["provider_id"]) or {}
+        )
+        if deadline.bounded:
+            result["partial"] = skip_providers
+        
+        # Step 6: Warm what n7 needs to move the next appointment (the load runs on a
+        # thread with the worker's sync client, fetched off the event loop as its first
+        # use reads the Supabase resource)
+        if prefetch and result.get("next_appointment"):
+            next_id = result["next_appointment"]["appointment_id"]
+            sync_supabase = await asyncio.to_thread(get_supabase_client, create_client)
+            prefetch_calendar(sync_supabase, next(row for row in appointment_rows if row["id"] == next_id))
+        
+        return result
+        
+    except Exception as e:
+        return patient_appointments_error(e)
+
+async def identify_patient_async(
+    supabase: AsyncClient,
+    patient_name: str,
+    date_of_birth: str,
+    use_patient_index: bool = True,
+    fuzzy_match: bool = False,
+    deadline: Deadline = NO_DEADLINE,
+    confirmation_token: str = None,
+    phone_last4: str = None
+) -> Tuple[Optional[Dict], str, Optional[Dict]]:
+    """`identify_patient` for the async Supabase client."""
+    
+    error = invalid_date_of_birth(date_of_birth)
+    if error:
+        return None, "exact", error
+    
+    if confirmation_token:
+        return confirmation(confirmation_token, date_of_birth, phone_last4)
+    
+    matching_patient = await find_patient_async(supabase, patient_name, date_of_birth, use_patient_index)
+    if matching_patient or not fuzzy_match:
+        return identification(patient_name, date_of_birth, matching_patient)
+    
+    if deadline.expired():
+        return identification(patient_name, date_of_birth, None, similar_names_skipped=True)
+    
+    candidates = await find_patient_candidates_async(supabase, patient_name, date_of_birth)
+    return identification(patient_name, date_of_birth, None, candidates)
@@ -0,0 +1,116 @@
+from supabase import create_client, Client
+from supabase_client import get_supabase_client
+from typing import Dict, Any
+from clinic_time import local_now
+from get_patient_appointments import (
+    cached_provider_info, format_patient_appointments, identify_patient, upcoming_appointments_query
+)
+from check_appointment_availability import check_availability_for_appointment
+from deadline import Deadline
+
+def main(
+    patient_name: str,
+    date_of_birth: str,
+    preferred_datetime: str = None,
+    appointment_id: str = None,
+    max_alternatives: int = 1,
+    any_provider: bool = False,
+    use_free_slots: bool = False,
+    hold_slots: bool = False,
+    use_patient_index: bool = True,
+    fuzzy_match: bool = False,
+    deadline_ms: int = None,
+    confirmation_token: str = None,
+    phone_last4: str = None
+) -> Dict[str, Any]:
+    """
+    Identify the patient, pick the appointment to move and check the preferred time
+    in one call (n5 followed by n7 as one job).
+
+    Saves the second Windmill job, its client setup and the agent's extra tool
+    round-trip, and n7's appointment read: the row comes from n5's query.
+
+    Args:
+        patient_name (str): Full name of the patient (case-insensitive)
+        date_of_birth (str): Date of birth in YYYY-MM-DD format
+        preferred_datetime (str): Preferred new datetime in ISO format; without it only the
+            patient and the target appointment are returned
+        appointment_id (str): Appointment to move, when the patient has several (default: the next one)
+        max_alternatives (int): How many alternative slots to suggest when the preferred time is taken
+        any_provider (bool): Also search every provider with the same specialty when the preferred time is taken
+        use_free_slots (bool): Answer from the materialized free_slots table when it can answer exactly
+        hold_slots (bool): Hold every slot offered so no other caller is offered it
+        use_patient_index (bool): Serve repeat lookups from the worker's in-process patient index
+        fuzzy_match (bool): When no name matches exactly, ask for a similar name to be confirmed (see n5)
+        deadline_ms (int): Time budget shared by the patient lookup and the availability check
+            (see n5 and n7)
+        confirmation_token (str): Token from a "confirmation_required" response (see n5)
+        phone_last4 (str): Last 4 digits of the phone number on the caller's record
+
+    Returns:
+        n5's response plus "target_appointment" and, with a preferred time,
+        "availability" (n7's response for the target appointment)
+    """
+
+    deadline = Deadline(deadline_ms)
+
+    try:
+        # Step 1: Setup Supabase (the worker's shared client, reused while warm)
+        supabase: Client = get_supabase_client(create_client)
+
+        # Steps 2-3.5: Validate the date of birth and find the patient
+        matching_patient, name_match, error = identify_patient(
+            supabase, patient_name, date_of_birth, use_patient_index, fuzzy_match, deadline,
+            confirmation_token, phone_last4
+        )
+        if error:
+            return error
+
+        # Step 4: Get upcoming appointments with their providers embedded and format them (as n5 does)
+        current_time = local_now()
+        appointments_response = upcoming_appointments_query(supabase, matching_patient["id"], current_time).execute()
+        appointment_rows = appointments_response.data or []
+
+        skipped_providers = []
+        result = format_patient_appointments(
+            matching_patient, name_match, appointment_rows, current_time,
+            cached_provider_info(supabase, deadline, skipped_providers)
+        )
+        if deadline.bounded:
+            result["partial"] = bool(skipped_providers)
+
+        # Step 5: Pick the appointment to move (the requested one, otherwise the next one)
+        if appointment_id:
+            target = next(
+                (appointment for appointment in result["upcoming_appointments"] if appointment["appointment_id"] == appointment_id),
+                None
+            )
+            if target is None:
+                return {
+                    "success": False,
+                    "error": f"Appointment {appointment_id} is not one of {result['patient_name']}'s upcoming appointments",
+                    "patient_found": True,
+                    "patient_name": result["patient_name"],
+                    "upcoming_appointments": result["upcoming_appointments"]
+                }
+        else:
+            target = result.get("next_appointment")
+
+        result["target_appointment"] = target
+
+        if target is None or not preferred_datetime:
+            return result
+
+        # Step 6: Check the preferred time for it (n7 without re-reading the appointment)
+        appointment = next(row for row in appointment_rows if row["id"] == target["appointment_id"])
+        result["availability"] = check_availability_for_appointment(
+            supabase, appointment, preferred_datetime, max_alternatives, any_provider, use_free_slots, hold_slots, deadline
+        )
+
+        return result
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"An error occurred while checking the patient's availability: {str(e)}"
+        }
@@ -0,0 +1,268 @@
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Largest edit distance at which a spoken name still counts as a candidate
+MAX_EDIT_DISTANCE = 2
+
+_VOWELS = set("AEIOU")
+_FRONT_VOWELS = set("EIY")
+_NON_LETTERS = re.compile(r"[^A-Z]")
+
+def metaphone(word: str) -> str:
+    """
+    Metaphone key of one word (Lawrence Philips' original rules).
+
+    Words that sound alike get the same key: "Jon" and "John" are both "JN",
+    "Rivera" and "Riviera" are both "RFR".
+    """
+
+    word = _NON_LETTERS.sub("", word.upper())
+    if not word:
+        return ""
+
+    # Silent or transformed first letters
+    if word[:2] in ("AE", "GN", "KN", "PN", "WR"):
+        word = word[1:]
+    elif word[0] == "X":
+        word = "S" + word[1:]
+    elif word[:2] == "WH":
+        word = "W" + word[2:]
+
+    key = []
+    length = len(word)
+
+    def at(index: int) -> str:
+        return word[index] if 0 <= index < length else ""
+
+    for i, char in enumerate(word):
+        # Doubled letters sound once (except C, as in "McCoy")
+        if char == at(i - 1) and char != "C":
+            continue
+
+        following = at(i + 1)
+
+        if char in _VOWELS:
+            if i == 0:
+                key.append(char)
+        elif char == "B":
+            if not (at(i - 1) == "M" and i == length - 1):
+                key.append("B")
+        elif char == "C":
+            if following == "I" and at(i + 2) == "A":
+                key.append("X")
+            elif following == "H":
+                key.append("K" if at(i - 1) == "S" else "X")
+            elif following in _FRONT_VOWELS:
+                if at(i - 1) != "S":
+                    key.append("S")
+            else:
+                key.append("K")
+        elif char == "D":
+            key.append("J" if following == "G" and at(i + 2) in _FRONT_VOWELS else "T")
+        elif char == "G":
+            if following == "H" and not (i + 2 >= length or at(i + 2) in _VOWELS):
+                continue
+            if following == "N" and (i + 2 == length or word[i + 1:] == "NED"):
+                continue
+            if at(i - 1) == "D" and following in _FRONT_VOWELS:
+                continue
+            key.append("J" if following in _FRONT_VOWELS and at(i - 1) != "G" else "K")
+        elif char == "H":
+            if at(i - 1) in set("CGPST"):
+                continue
+            if at(i - 1) in _VOWELS and following not in _VOWELS:
+                continue
+            key.append("H")
+        elif char == "K":
+            if at(i - 1) != "C":
+                key.append("K")
+        elif char == "P":
+            key.append("F" if following == "H" else "P")
+        elif char == "Q":
+            key.append("K")
+        elif char == "S":
+            if following == "H" or (following == "I" and at(i + 2) in ("O", "A")):
+                key.append("X")
+            else:
+                key.append("S")
+        elif char == "T":
+            if following == "I" and at(i + 2) in ("O", "A"):
+                key.append("X")
+            elif following == "H":
+                key.append("0")
+            elif not (following == "C" and at(i + 2) == "H"):
+                key.append("T")
+        elif char == "V":
+            key.append("F")
+        elif char in ("W", "Y"):
+            if following in _VOWELS:
+                key.append(char)
+        elif char == "X":
+            key.append("KS")
+        elif char == "Z":
+            key.append("S")
+        else:
+            key.append(char)
+
+    return "".join(key)
+
+def phonetic_key(name: str) -> Tuple[str, ...]:
+    """Metaphone keys of every word of a name, order-insensitive ("Doe John" == "John Doe")."""
+
+    return tuple(sorted(key for key in (metaphone(word) for word in name.split()) if key))
+
+def edit_distance(a: str, b: str, limit: int = None) -> int:
+    """
+    Levenshtein distance between two strings.
+
+    With `limit`, the computation stops early and returns limit + 1 as soon as
+    the distance is known to exceed it.
+    """
+
+    if len(a) < len(b):
+        a, b = b, a
+    if limit is not None and len(a) - len(b) > limit:
+        return limit + 1
+
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if limit is not None and min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+def normalize_spoken_name(name: str) -> str:
+    """Lower-case, trimmed name with runs of whitespace collapsed."""
+
+    return " ".join(name.lower().split())
+
+class BKTree:
+    """Burkhard-Keller tree over strings for bounded edit-distance search."""
+
+    def __init__(self, words: Iterable[str] = ()):
+        # Node: (word, {distance: child node})
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+        for word in words:
+            self.add(word)
+
+    def add(self, word: str) -> None:
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        """Every stored word within `max_distance` edits, as (distance, word)."""
+
+        if self._root is None:
+            return []
+        matches = []
+        pending = [self._root]
+        while pending:
+            node_word, children = pending.pop()
+            distance = edit_distance(word, node_word)
+            if distance <= max_distance:
+                matches.append((distance, node_word))
+            # Triangle inequality: only children at these distances can match
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    pending.append(child)
+        return matches
+
+class _Partition:
+    """Patients sharing one date of birth."""
+
+    def __init__(self):
+        self.by_name: Dict[str, List[Dict]] = {}
+        self.by_phonetic_key: Dict[Tuple[str, ...], List[str]] = {}
+        self.tree = BKTree()
+
+    def add(self, patient: Dict) -> None:
+        name = normalize_spoken_name(patient.get("full_name", ""))
+        if name not in self.by_name:
+            self.by_name[name] = []
+            self.by_phonetic_key.setdefault(phonetic_key(name), []).append(name)
+            self.tree.add(name)
+        self.by_name[name].append(patient)
+
+class PatientNameIndex:
+    """
+    Precomputed index for matching transcribed patient names, partitioned by DOB.
+
+    The date of birth has to match exactly, so each lookup only searches the
+    few patients born that day. Within a partition a name is a candidate when
+    its Metaphone keys equal those of the spoken name ("Jon Doe" ~ "John Doe")
+    or when it is within a bounded edit distance, found through a BK-tree
+    ("Carlos Riviera" ~ "Carlos Rivera").
+    """
+
+    def __init__(self, patients: Iterable[Dict] = ()):
+        self._partitions: Dict[str, _Partition] = {}
+        for patient in patients:
+            self.add(patient)
+
+    def add(self, patient: Dict) -> None:
+        self._partitions.setdefault(patient.get("date_of_birth"), _Partition()).add(patient)
+
+    def replace_partition(self, date_of_birth: str, patients: Iterable[Dict]) -> None:
+        """Rebuild one date of birth's partition from fresh rows."""
+
+        partition = _Partition()
+        for patient in patients:
+            partition.add(patient)
+        self._partitions[date_of_birth] = partition
+
+    def drop_partition(self, date_of_birth: str) -> None:
+        self._partitions.pop(date_of_birth, None)
+
+    def __contains__(self, date_of_birth: str) -> bool:
+        return date_of_birth in self._partitions
+
+    def candidates(
+        self,
+        spoken_name: str,
+        date_of_birth: str,
+        max_distance: int = MAX_EDIT_DISTANCE,
+        limit: int = 5
+    ) -> List[Dict]:
+        """
+        Patients born on `date_of_birth` whose name may be `spoken_name`, best first.
+
+        Returns:
+            List of {"patient", "distance", "phonetic_match", "score"} dicts ranked by
+            score (edit distance, with a bonus for a phonetic match; 0 is exact)
+        """
+
+        partition = self._partitions.get(date_of_birth)
+        if partition is None:
+            return []
+
+        name = normalize_spoken_name(spoken_name)
+        key = phonetic_key(name)
+        phonetic_names = set(partition.by_phonetic_key.get(key, [])) if key else set()
+
+        distances = {found: distance for distance, found in partition.tree.search(name, max_distance)}
+        for found in phonetic_names - distances.keys():
+            distances[found] = edit_distance(name, found)
+
+        ranked = []
+        for found, distance in distances.items():
+            phonetic_match = found in phonetic_names
+            score = 0.0 if distance == 0 else distance - (0.5 if phonetic_match else 0.0)
+            for patient in partition.by_name[found]:
+                ranked.append({"patient": patient, "distance": distance, "phonetic_match": phonetic_match, "score": score})
+
+        ranked.sort(key=lambda candidate: (candidate["score"], candidate["patient"].get("full_name", "")))
+        return ranked[:limit]
@@ -0,0 +1,127 @@
+import numpy as np
+from datetime import date, datetime, time, timedelta
+from typing import Dict, List, Tuple
+from clinic_time import ClinicClock, clinic_clock
+
+QUANTUM_MINUTES = 15
+QUANTA_PER_DAY = 24 * 60 // QUANTUM_MINUTES
+
+_QUANTUM = timedelta(minutes=QUANTUM_MINUTES)
+_MICROSECOND = timedelta(microseconds=1)
+_QUANTUM_US = _QUANTUM // _MICROSECOND
+
+class OccupancyGrid:
+    """
+    Per-provider occupancy over a search horizon in 15-minute quanta.
+
+    Two counters are kept per quantum:
+        occupancy: patients whose appointment touches the quantum
+        starts: appointments starting exactly on the quantum boundary
+
+    For a candidate that starts on a quantum boundary and lasts a whole number of
+    quanta this is enough to reproduce `check_time_availability` exactly: the slot
+    is free when nothing touches its quanta, or when appointments start at the very
+    same time and the visit type still has room. Whole days of candidates are
+    evaluated with a handful of array operations.
+    """
+
+    def __init__(self, horizon_start: date, days: int, appointment_rows: List[Dict] = None, clock: ClinicClock = None):
+        self.horizon_start = datetime.combine(horizon_start, time())
+        self.days = days
+        self.size = days * QUANTA_PER_DAY
+        self.occupancy = np.zeros(self.size, dtype=np.int32)
+        self.starts = np.zeros(self.size, dtype=np.int32)
+        # A zero-length appointment conflicts only with slots strictly around it,
+        # which quanta cannot express; such rows make the grid decline to answer
+        self.exact = True
+
+        # Quanta are wall-clock time: rows are placed by their clinic-local start
+        clock = clock or clinic_clock()
+        for existing in appointment_rows or []:
+            existing_start = clock.local_datetime(existing["appointment_time"])
+            self.add_appointment(existing_start, existing["duration_minutes"])
+
+    def covers(self, day: date, days: int = 1) -> bool:
+        """Whether `days` days starting at `day` lie inside the horizon."""
+
+        offset = (day - self.horizon_start.date()).days
+        return offset >= 0 and offset + days <= self.days
+
+    def add_appointment(self, start: datetime, duration_minutes: int) -> None:
+        """Record a booking."""
+
+        if duration_minutes <= 0:
+            self.exact = False
+            return
+
+        offset_us = (start - self.horizon_start) // _MICROSECOND
+        end_us = offset_us + duration_minutes * 60 * 1_000_000
+
+        first = max(offset_us // _QUANTUM_US, 0)
+        last = min(-(-end_us // _QUANTUM_US), self.size)
+        if first < last:
+            self.occupancy[first:last] += 1
+
+        if offset_us % _QUANTUM_US == 0 and 0 <= offset_us // _QUANTUM_US < self.size:
+            self.starts[offset_us // _QUANTUM_US] += 1
+
+    def supports(self, slot: datetime, duration_minutes: int) -> bool:
+        """Whether candidates starting at `slot` can be answered exactly by the grid."""
+
+        return (
+            self.exact
+            and duration_minutes > 0
+            and duration_minutes % QUANTUM_MINUTES == 0
+            and (slot - self.horizon_start) % _QUANTUM == timedelta(0)
+            and self.covers(slot.date())
+        )
+
+    def day_availability(
+        self,
+        day: date,
+        first_quantum: int,
+        last_quantum: int,
+        duration_minutes: int,
+        max_patients_per_slot: int,
+        windows: List[Tuple[int, int]]
+    ) -> np.ndarray:
+        """
+        Availability of every candidate quantum of one day at once.
+
+        Args:
+            day: Day to evaluate (must lie inside the horizon)
+            first_quantum: First candidate, in quanta since midnight
+            last_quantum: Last candidate (inclusive)
+            duration_minutes: Slot length, a whole number of quanta
+            max_patients_per_slot: Capacity of the visit type
+            windows: Provider's working windows for the weekday, in seconds since midnight
+
+        Returns:
+            Boolean array, one entry per candidate from first_quantum to last_quantum
+        """
+
+        if last_quantum < first_quantum:
+            return np.zeros(0, dtype=bool)
+
+        span = duration_minutes // QUANTUM_MINUTES
+        base = (day - self.horizon_start.date()).days * QUANTA_PER_DAY
+        candidates = np.arange(first_quantum, last_quantum + 1)
+
+        # Working hours: the start and the (wall-clock) end must fit one window
+        start_seconds = candidates * QUANTUM_MINUTES * 60
+        end_seconds = (start_seconds + duration_minutes * 60) % 86400
+        fits = np.zeros(candidates.size, dtype=bool)
+        for window_start, window_end in windows:
+            fits |= (window_start <= start_seconds) & (end_seconds <= window_end)
+
+        # Overlap: any touched quantum inside [candidate, candidate + span)
+        day_end = min(base + QUANTA_PER_DAY + span, self.size)
+        busy = np.concatenate(([0], np.cumsum(self.occupancy[base:day_end] > 0)))
+        window_end_index = np.minimum(candidates + span, day_end - base)
+        overlapping = busy[window_end_index] - busy[candidates] > 0
+
+        # Same start time: allowed while the visit type has room
+        exact = self.starts[base + candidates]
+        verdict = np.where(exact > 0, exact < max_patients_per_slot, ~overlapping)
+
+        return fits & verdict
@@ -0,0 +1,302 @@
+import secrets
+import time as monotonic_clock
+from collections import OrderedDict
+from supabase import Client
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from name_matching import PatientNameIndex
+
+# How long a warm worker trusts a patient it has already found
+PATIENT_INDEX_TTL_SECONDS = 300
+
+# Patients kept per process; the least recently used one is dropped first
+PATIENT_INDEX_SIZE = 10000
+
+# How long a date-of-birth partition of the spoken-name index is trusted
+NAME_PARTITION_TTL_SECONDS = 300
+
+# Date-of-birth partitions kept per process; the least recently used one is dropped first
+NAME_PARTITIONS_KEPT = 5000
+
+# How long a caller has to confirm a similar name with the end of their phone number
+NAME_CONFIRMATION_TTL_SECONDS = 120
+
+# Wrong answers allowed per confirmation token before it is dropped
+NAME_CONFIRMATION_ATTEMPTS = 3
+
+# Trailing digits of the phone number on file the caller gives to confirm a similar name
+PHONE_DIGITS_TO_CONFIRM = 4
+
+def normalize_name(name: str) -> str:
+    """Name as compared by the lookup: case-insensitive, surrounding whitespace ignored."""
+
+    return name.lower().strip()
+
+def like_pattern(name: str) -> str:
+    """ILIKE pattern matching `name` anywhere in the column, with wildcards in it escaped."""
+
+    escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+class PatientIndex:
+    """
+    Process-level index of patients already found, keyed by (normalized name, DOB).
+
+    Only successful lookups are kept, so a newly registered patient is always
+    looked up in the database. Entries expire after the TTL so edits to a
+    patient's details show up without a restart; call `invalidate` after
+    editing a patient to see them immediately.
+    """
+
+    def __init__(self, ttl_seconds: float = PATIENT_INDEX_TTL_SECONDS, max_entries: int = PATIENT_INDEX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Dict]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, patient_name: str, date_of_birth: str) -> Optional[Dict]:
+        key = (normalize_name(patient_name), date_of_birth)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            loaded_at, patient = entry
+            if monotonic_clock.monotonic() - loaded_at >= self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return patient
+
+    def put(self, patient: Dict) -> None:
+        key = (normalize_name(patient.get("full_name", "")), patient.get("date_of_birth"))
+        with self._lock:
+            self._entries[key] = (monotonic_clock.monotonic(), patient)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, patient_id: str = None) -> None:
+        """Drop one patient (by id), or every patient when no id is given."""
+
+        with self._lock:
+            if patient_id is None:
+                self._entries.clear()
+                return
+            for key in [key for key, (_, patient) in self._entries.items() if patient.get("id") == patient_id]:
+                del self._entries[key]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Shared by every script loaded in this worker process
+patient_index = PatientIndex()
+
+def find_patient(
+    supabase: Client,
+    patient_name: str,
+    date_of_birth: str,
+    use_index: bool = True
+) -> Optional[Dict]:
+    """
+    Find a patient by name and date of birth.
+
+    The database narrows the search with the (indexed) date of birth and a
+    case-insensitive name filter, so only a handful of rows come back however
+    many patients the clinic has. The exact comparison then runs on those rows.
+
+    Args:
+        supabase: Supabase client
+        patient_name: Full name as given by the caller (case-insensitive)
+        date_of_birth: Date of birth in YYYY-MM-DD format
+        use_index: Serve repeat lookups from the in-process index
+
+    Returns:
+        The patient row, or None when no patient matches
+    """
+
+    if use_index:
+        patient = patient_index.get(patient_name, date_of_birth)
+        if patient is not None:
+            return patient
+
+    patient_response = _patient_query(supabase, patient_name, date_of_birth).execute()
+    return _exact_match(patient_response.data or [], patient_name, date_of_birth, use_index)
+
+async def find_patient_async(
+    supabase,
+    patient_name: str,
+    date_of_birth: str,
+    use_index: bool = True
+) -> Optional[Dict]:
+    """`find_patient` for the async Supabase client (same index)."""
+
+    if use_index:
+        patient = patient_index.get(patient_name, date_of_birth)
+        if patient is not None:
+            return patient
+
+    patient_response = await _patient_query(supabase, patient_name, date_of_birth).execute()
+    return _exact_match(patient_response.data or [], patient_name, date_of_birth, use_index)
+
+def _patient_query(supabase, patient_name: str, date_of_birth: str):
+    return supabase.table("patients").select("*") \
+        .eq("date_of_birth", date_of_birth) \
+        .ilike("full_name", like_pattern(normalize_name(patient_name)))
+
+def _exact_match(rows: List[Dict], patient_name: str, date_of_birth: str, use_index: bool) -> Optional[Dict]:
+    wanted = normalize_name(patient_name)
+    for patient in rows:
+        if normalize_name(patient.get("full_name", "")) == wanted and patient.get("date_of_birth") == date_of_birth:
+            if use_index:
+                patient_index.put(patient)
+            return patient
+
+    return None
+
+# Spoken-name index shared by the worker process, filled one date of birth at a time
+name_index = PatientNameIndex()
+_name_partitions_loaded: "OrderedDict[str, float]" = OrderedDict()
+_name_index_lock = Lock()
+
+def find_patient_candidates(
+    supabase: Client,
+    patient_name: str,
+    date_of_birth: str,
+    limit: int = 5
+) -> List[Dict]:
+    """
+    Patients born on `date_of_birth` whose name sounds like or is spelled close to
+    `patient_name`, for transcripts the exact lookup misses ("Jon Doe").
+
+    The date of birth's partition of the spoken-name index is read with one query
+    the first time it is needed and reused until it expires.
+
+    Returns:
+        Ranked candidates as returned by `PatientNameIndex.candidates`
+    """
+
+    now = monotonic_clock.monotonic()
+    if not _partition_is_fresh(date_of_birth, now):
+        patient_response = supabase.table("patients").select("*").eq("date_of_birth", date_of_birth).execute()
+        _store_partition(date_of_birth, patient_response.data or [], now)
+
+    return name_index.candidates(patient_name, date_of_birth, limit=limit)
+
+async def find_patient_candidates_async(
+    supabase,
+    patient_name: str,
+    date_of_birth: str,
+    limit: int = 5
+) -> List[Dict]:
+    """`find_patient_candidates` for the async Supabase client (same index)."""
+
+    now = monotonic_clock.monotonic()
+    if not _partition_is_fresh(date_of_birth, now):
+        patient_response = await supabase.table("patients").select("*").eq("date_of_birth", date_of_birth).execute()
+        _store_partition(date_of_birth, patient_response.data or [], now)
+
+    return name_index.candidates(patient_name, date_of_birth, limit=limit)
+
+class NameConfirmations:
+    """
+    Patients a similar spoken name may refer to, kept in the worker behind an
+    opaque token until the caller confirms one with the last digits of the
+    phone number on file.
+
+    Nothing about the candidates leaves the worker: the caller learns neither
+    their names nor how many there are. A token is bound to the date of birth it
+    was issued for, expires after the TTL, and is dropped when it confirms a
+    patient or after NAME_CONFIRMATION_ATTEMPTS wrong answers.
+    """
+
+    def __init__(self, ttl_seconds: float = NAME_CONFIRMATION_TTL_SECONDS, max_attempts: int = NAME_CONFIRMATION_ATTEMPTS):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self._pending: Dict[str, Dict] = {}
+        self._lock = Lock()
+
+    def issue(self, date_of_birth: str, patients: List[Dict]) -> Optional[str]:
+        """Token confirming one of `patients`, None when none has a phone number to confirm with."""
+
+        confirmable = [patient for patient in patients if len(_phone_digits(patient)) >= PHONE_DIGITS_TO_CONFIRM]
+        if not confirmable:
+            return None
+
+        token = secrets.token_urlsafe(16)
+        now = monotonic_clock.monotonic()
+        with self._lock:
+            self._expire(now)
+            self._pending[token] = {
+                "date_of_birth": date_of_birth,
+                "patients": confirmable,
+                "expires_at": now + self.ttl_seconds,
+                "attempts_left": self.max_attempts
+            }
+        return token
+
+    def confirm(self, token: str, date_of_birth: str, phone_last_digits: Optional[str]) -> Optional[Dict]:
+        """The one candidate whose phone number ends in `phone_last_digits`, or None."""
+
+        digits = "".join(character for character in phone_last_digits or "" if character.isdigit())
+        with self._lock:
+            self._expire(monotonic_clock.monotonic())
+            pending = self._pending.get(token)
+            if pending is None:
+                return None
+
+            matches = [
+                patient for patient in pending["patients"]
+                if len(digits) == PHONE_DIGITS_TO_CONFIRM and _phone_digits(patient).endswith(digits)
+            ]
+            if pending["date_of_birth"] == date_of_birth and len(matches) == 1:
+                del self._pending[token]
+                return matches[0]
+
+            pending["attempts_left"] -= 1
+            if pending["attempts_left"] <= 0:
+                del self._pending[token]
+            return None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._pending.clear()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def _expire(self, now: float) -> None:
+        for token in [token for token, pending in self._pending.items() if pending["expires_at"] <= now]:
+            del self._pending[token]
+
+# Shared by every script loaded in this worker process
+name_confirmations = NameConfirmations()
+
+def _phone_digits(patient: Dict) -> str:
+    return "".join(character for character in patient.get("phone") or "" if character.isdigit())
+
+def _partition_is_fresh(date_of_birth: str, now: float) -> bool:
+    with _name_index_lock:
+        loaded_at = _name_partitions_loaded.get(date_of_birth)
+        if loaded_at is None or now - loaded_at >= NAME_PARTITION_TTL_SECONDS:
+            return False
+        _name_partitions_loaded.move_to_end(date_of_birth)
+        return True
+
+def _store_partition(date_of_birth: str, rows: List[Dict], now: float) -> None:
+    with _name_index_lock:
+        name_index.replace_partition(date_of_birth, rows)
+        _name_partitions_loaded[date_of_birth] = now
+        _name_partitions_loaded.move_to_end(date_of_birth)
+        while len(_name_partitions_loaded) > NAME_PARTITIONS_KEPT:
+            oldest, _ = _name_partitions_loaded.popitem(last=False)
+            name_index.drop_partition(oldest)
+
+def invalidate_patient_lookups() -> None:
+    """Forget every cached patient (call after editing patients)."""
+
+    patient_index.invalidate()
+    name_confirmations.invalidate()
+    with _name_index_lock:
+        for date_of_birth in _name_partitions_loaded:
+            name_index.drop_partition(date_of_birth)
+        _name_partitions_loaded.clear()
@@ -0,0 +1,176 @@
+import time as monotonic_clock
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from datetime import datetime, timedelta, time
+from supabase import Client
+from threading import BoundedSemaphore, Lock, Thread
+from typing import Dict, List, Optional, Tuple
+from clinic_time import local_now
+from schedule_cache import ProviderSchedule, get_provider_schedule
+from reference_data import get_visit_type
+from slot_engine import ProviderSnapshot, provider_appointments_query
+
+# How long a prefetched calendar may answer n7 (bookings made meanwhile by other
+# workers are not in it; n8's atomic mode and slot holds catch those)
+PREFETCH_TTL_SECONDS = 20
+
+# Horizon loaded ahead: covers n7's 30-day search from any preferred time in the next 30 days
+PREFETCH_DAYS_AHEAD = 61
+
+# Longest n7 waits for a prefetch still in flight before loading the calendar itself
+PREFETCH_WAIT_SECONDS = 2.0
+
+class PrefetchedCalendar:
+    """What n7 needs to move one appointment, read before n7 was called."""
+
+    def __init__(
+        self,
+        appointment: Dict,
+        schedule: ProviderSchedule,
+        visit_type: Optional[Dict],
+        appointment_rows: List[Dict],
+        window: Tuple[datetime, datetime]
+    ):
+        self.appointment = appointment
+        self.schedule = schedule
+        self.visit_type = visit_type
+        self.appointment_rows = appointment_rows
+        self.window = window
+        self.loaded_at = monotonic_clock.monotonic()
+
+    def covers(self, window: Tuple[datetime, datetime]) -> bool:
+        return self.window[0] <= window[0] and window[1] <= self.window[1]
+
+    def snapshot(self) -> ProviderSnapshot:
+        return ProviderSnapshot.from_rows(
+            self.appointment["provider_id"],
+            self.appointment["type"],
+            self.schedule,
+            self.visit_type,
+            list(self.appointment_rows),
+            self.appointment["id"],
+            self.window
+        )
+
+class CalendarPrefetcher:
+    """
+    Loads the calendar around an appointment in the background, keyed by
+    appointment id, so the n7 call that usually follows n5 is answered from memory.
+
+    Entries expire after PREFETCH_TTL_SECONDS and are dropped for a provider
+    whenever one of its appointments is written through `invalidate`. Reading
+    an entry does not consume it, so n7 can look it up more than once.
+
+    Loads run on daemon threads, at most `max_workers` at a time, so a load
+    still in flight never holds up the worker's exit. (ThreadPoolExecutor
+    joins its threads before atexit handlers run, so it cannot offer that.)
+    """
+
+    def __init__(self, ttl_seconds: float = PREFETCH_TTL_SECONDS, max_workers: int = 4):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[str, Future] = {}
+        self._slots = BoundedSemaphore(max_workers)
+        self._lock = Lock()
+
+    def start(self, supabase: Client, appointment: Dict) -> None:
+        """Begin loading the calendar for `appointment` unless a fresh load is already there."""
+
+        appointment = {key: value for key, value in appointment.items() if key not in ("providers", "patients")}
+        with self._lock:
+            existing = self._entries.get(appointment["id"])
+            if existing is not None and not self._expired(existing):
+                return
+            self._entries[appointment["id"]] = self._submit(supabase, appointment)
+
+    def peek(
+        self,
+        appointment_id: str,
+        window: Tuple[datetime, datetime] = None,
+        wait_seconds: float = PREFETCH_WAIT_SECONDS
+    ) -> Optional[PrefetchedCalendar]:
+        """
+        The prefetched calendar for an appointment if it is fresh and covers
+        `window`, waiting up to `wait_seconds` for a load still in flight.
+        The entry stays in place for later calls.
+        """
+
+        with self._lock:
+            future = self._entries.get(appointment_id)
+        if future is None:
+            return None
+
+        try:
+            calendar = future.result(timeout=wait_seconds)
+        except FutureTimeout:
+            return None
+        except Exception:
+            # A failed prefetch is forgotten; the caller loads the calendar itself
+            with self._lock:
+                if self._entries.get(appointment_id) is future:
+                    del self._entries[appointment_id]
+            return None
+
+        if self._expired(future) or (window is not None and not calendar.covers(window)):
+            return None
+        return calendar
+
+    def invalidate(self, provider_id: str = None) -> None:
+        """Drop prefetched calendars (of one provider, or all)."""
+
+        with self._lock:
+            for appointment_id, future in list(self._entries.items()):
+                if provider_id is None or not future.done() or future.exception() is not None \
+                        or future.result().appointment["provider_id"] == provider_id:
+                    del self._entries[appointment_id]
+
+    def _expired(self, future: Future) -> bool:
+        if not future.done() or future.exception() is not None:
+            return False
+        return monotonic_clock.monotonic() - future.result().loaded_at >= self.ttl_seconds
+
+    def _submit(self, supabase: Client, appointment: Dict) -> Future:
+        future = Future()
+
+        def run() -> None:
+            with self._slots:
+                if not future.set_running_or_notify_cancel():
+                    return
+                try:
+                    future.set_result(self._load(supabase, appointment))
+                except BaseException as error:
+                    future.set_exception(error)
+
+        Thread(target=run, name="prefetch", daemon=True).start()
+        return future
+
+    def _load(self, supabase: Client, appointment: Dict) -> PrefetchedCalendar:
+        # The schedule and visit type land in their process caches as well
+        schedule = get_provider_schedule(supabase, appointment["provider_id"])
+        visit_type = get_visit_type(supabase, appointment["type"])
+
+        now = local_now()
+        window = (now, datetime.combine(now.date() + timedelta(days=PREFETCH_DAYS_AHEAD), time()))
+        appointments_response = provider_appointments_query(
+            supabase, appointment["provider_id"], appointment["id"], window
+        ).execute()
+
+        return PrefetchedCalendar(appointment, schedule, visit_type, appointments_response.data or [], window)
+
+# Shared by every script loaded in this worker process
+calendar_prefetcher = CalendarPrefetcher()
+
+def prefetch_calendar(supabase: Client, appointment: Dict) -> None:
+    """Warm the calendar n7 will need to move `appointment` (returns immediately)."""
+
+    calendar_prefetcher.start(supabase, appointment)
+
+def peek_prefetched_calendar(
+    appointment_id: str,
+    window: Tuple[datetime, datetime] = None,
+    wait_seconds: float = PREFETCH_WAIT_SECONDS
+) -> Optional[PrefetchedCalendar]:
+    return calendar_prefetcher.peek(appointment_id, window, wait_seconds)
+
+def invalidate_prefetched(provider_id: str = None) -> None:
+    """Invalidation hook for appointment writes (all providers when no provider is given)."""
+
+    calendar_prefetcher.invalidate(provider_id)
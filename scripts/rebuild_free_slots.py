@@ -0,0 +1,70 @@
+from supabase import create_client, Client
+from supabase_client import get_supabase_client
+from datetime import datetime
+from typing import Dict, Any
+from free_slots import rebuild_free_slots, refresh_stale_free_slots
+
+def main(days_ahead: int = 30, dry_run: bool = False, start_date: str = None, stale_only: bool = False) -> Dict[str, Any]:
+    """
+    Regenerate the free_slots table from the live schedule and report drift.
+
+    Run it after installing sql/free_slots.sql, on a schedule (e.g. nightly, to
+    extend the horizon), and whenever availability or visit types change. With
+    stale_only=True it only recomputes the days appointment writes marked stale;
+    schedule that every minute or so.
+
+    Args:
+        days_ahead (int): Number of days after start_date to materialize
+        dry_run (bool): Only compare the table with the live computation, do not write
+        start_date (str): First day in YYYY-MM-DD format (defaults to today)
+        stale_only (bool): Only refresh stale days from today through days_ahead days later
+
+    Returns:
+        Dict containing success status and the drift report
+    """
+
+    try:
+        # Step 1: Setup Supabase (the worker's shared client, reused while warm)
+        supabase: Client = get_supabase_client(create_client)
+
+        # Step 2: Refresh only what appointment writes marked stale
+        if stale_only:
+            report = refresh_stale_free_slots(supabase, days_ahead)
+            if not report["installed"]:
+                return {
+                    "success": False,
+                    "error": "The free_slots table is not installed (run sql/free_slots.sql)"
+                }
+            return {
+                "success": True,
+                "message": f"Refreshed {report['refreshed_days']} of {report['stale_days']} stale days "
+                           f"for {report['providers']} providers",
+                **report
+            }
+
+        # Step 3: Validate the first day
+        first_date = None
+        if start_date:
+            try:
+                first_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+            except ValueError:
+                return {
+                    "success": False,
+                    "error": f"Invalid start date format: {start_date}. Expected YYYY-MM-DD format."
+                }
+
+        # Step 4: Recompute every provider and compare with the stored rows
+        report = rebuild_free_slots(supabase, days_ahead, dry_run, first_date)
+
+        return {
+            "success": True,
+            "message": f"{'Checked' if dry_run else 'Rebuilt'} {report['rows']} slot rows, "
+                       f"{report['missing']} missing, {report['stale']} stale, {report['mismatched']} mismatched",
+            **report
+        }
+
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"An error occurred while rebuilding free slots: {str(e)}"
+        }
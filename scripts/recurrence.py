@@ -0,0 +1,185 @@
+import calendar
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+# Recurrences are expanded over fixed blocks of days; each block is expanded once per schedule
+RECURRENCE_BLOCK_DAYS = 56
+
+# DTSTART of a rule without `recurrence_start` (a Monday, so INTERVAL=2 weeks has a fixed phase)
+DEFAULT_RECURRENCE_START = date(2024, 1, 1)
+
+_WEEKDAYS = {"MO": 0, "TU": 1, "WE": 2, "TH": 3, "FR": 4, "SA": 5, "SU": 6}
+_FREQUENCIES = ("DAILY", "WEEKLY", "MONTHLY")
+
+class RecurrenceRule:
+    """
+    The dates of an RFC 5545 RRULE, for the subset availability rows need:
+    FREQ=DAILY, WEEKLY or MONTHLY with INTERVAL, BYDAY (with ordinals such as
+    1FR or -1MO under MONTHLY), BYMONTHDAY, UNTIL and COUNT. Weeks start on
+    Monday. Anything else raises ValueError rather than being silently ignored.
+
+    Examples:
+        FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE   every other Monday and Wednesday
+        FREQ=MONTHLY;BYDAY=1FR,3FR           first and third Friday of the month
+    """
+
+    def __init__(self, text: str, start: date = None):
+        self.text = text
+        self.start = start or DEFAULT_RECURRENCE_START
+
+        parts = {}
+        for part in text.strip().removeprefix("RRULE:").split(";"):
+            name, _, value = part.partition("=")
+            parts[name.strip().upper()] = value.strip().upper()
+
+        unsupported = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "BYMONTHDAY", "UNTIL", "COUNT", "WKST"}
+        if unsupported or parts.get("FREQ") not in _FREQUENCIES or parts.get("WKST", "MO") != "MO":
+            raise ValueError(f"Unsupported recurrence rule: {text}")
+
+        self.frequency = parts["FREQ"]
+        self.interval = int(parts.get("INTERVAL", 1))
+        self.count = int(parts["COUNT"]) if "COUNT" in parts else None
+        self.until = _parse_until(parts["UNTIL"]) if "UNTIL" in parts else None
+        self.by_month_day = [int(value) for value in parts["BYMONTHDAY"].split(",")] if "BYMONTHDAY" in parts else []
+        # (ordinal or None, weekday 0-6)
+        self.by_day: List[Tuple[Optional[int], int]] = []
+        for value in parts["BYDAY"].split(",") if "BYDAY" in parts else []:
+            if value[-2:] not in _WEEKDAYS or (value[:-2] and self.frequency != "MONTHLY"):
+                raise ValueError(f"Unsupported recurrence rule: {text}")
+            self.by_day.append((int(value[:-2]) if value[:-2] else None, _WEEKDAYS[value[-2:]]))
+        if self.interval < 1:
+            raise ValueError(f"Unsupported recurrence rule: {text}")
+
+    def occurrences(self, first_day: date, last_day: date) -> List[date]:
+        """Dates of the rule from `first_day` through `last_day`, in order."""
+
+        last_day = min(last_day, self.until) if self.until else last_day
+        # COUNT is counted from the first occurrence, so only then must every period be walked
+        period = 0 if self.count is not None else self._period_at(first_day)
+        seen = 0
+        found = []
+        while True:
+            candidates = [day for day in self._period_dates(period) if day >= self.start]
+            if not candidates and self._period_start(period) > last_day:
+                return found
+            for day in candidates:
+                seen += 1
+                if self.count is not None and seen > self.count or day > last_day:
+                    return found
+                if day >= first_day:
+                    found.append(day)
+            period += 1
+
+    def _period_at(self, day: date) -> int:
+        """Index of the last period starting on or before `day` (0 before the rule starts)."""
+
+        if day <= self.start:
+            return 0
+        if self.frequency == "MONTHLY":
+            months = (day.year - self.start.year) * 12 + day.month - self.start.month
+            return months // self.interval
+        step = 7 if self.frequency == "WEEKLY" else 1
+        return (day - self._period_start(0)).days // (step * self.interval)
+
+    def _period_start(self, period: int) -> date:
+        if self.frequency == "MONTHLY":
+            month = self.start.month - 1 + period * self.interval
+            return date(self.start.year + month // 12, month % 12 + 1, 1)
+        if self.frequency == "WEEKLY":
+            return self.start - timedelta(days=self.start.weekday()) + timedelta(weeks=period * self.interval)
+        return self.start + timedelta(days=period * self.interval)
+
+    def _period_dates(self, period: int) -> List[date]:
+        first = self._period_start(period)
+        weekdays = {weekday for _, weekday in self.by_day}
+
+        if self.frequency == "DAILY":
+            days = [first] if not weekdays or first.weekday() in weekdays else []
+        elif self.frequency == "WEEKLY":
+            days = [first + timedelta(days=weekday) for weekday in sorted(weekdays or {self.start.weekday()})]
+        else:
+            month_length = calendar.monthrange(first.year, first.month)[1]
+            if self.by_day:
+                days = [
+                    first.replace(day=number)
+                    for ordinal, weekday in self.by_day
+                    for number in _month_days_on_weekday(first, month_length, weekday, ordinal)
+                ]
+            else:
+                numbers = [_month_day(number, month_length) for number in self.by_month_day or [self.start.day]]
+                return sorted({first.replace(day=number) for number in numbers if number})
+
+        if self.by_month_day:
+            days = [day for day in days if _matches_month_day(day, self.by_month_day)]
+        return sorted(set(days))
+
+class WeekParity:
+    """Every week of one ISO week-number parity ("even" or "odd") on the row's weekday (1-7, Monday=1)."""
+
+    def __init__(self, parity: str, weekday: int):
+        if parity not in ("even", "odd"):
+            raise ValueError(f"Unsupported week parity: {parity}")
+        self.parity = parity
+        self.weekday = weekday
+
+    def occurrences(self, first_day: date, last_day: date) -> List[date]:
+        """Dates of the rule from `first_day` through `last_day`, in order."""
+
+        remainder = 0 if self.parity == "even" else 1
+        day = first_day + timedelta(days=(self.weekday - first_day.isoweekday()) % 7)
+        found = []
+        while day <= last_day:
+            if day.isocalendar()[1] % 2 == remainder:
+                found.append(day)
+            day += timedelta(weeks=1)
+        return found
+
+def recurrence_for(availability: Dict):
+    """The recurrence of an availability row, or None for a plain every-week row."""
+
+    if availability.get("recurrence"):
+        start = availability.get("recurrence_start")
+        return RecurrenceRule(availability["recurrence"], date.fromisoformat(start) if start else None)
+    if availability.get("week_parity"):
+        return WeekParity(availability["week_parity"], availability["weekday"])
+    return None
+
+def expand_block(recurrences: List[Tuple[object, Tuple[int, int]]], block: int) -> Dict[date, List[Tuple[int, int]]]:
+    """Windows per date that the recurring rows add within one RECURRENCE_BLOCK_DAYS block."""
+
+    first_day = date.fromordinal(block * RECURRENCE_BLOCK_DAYS + 1)
+    last_day = first_day + timedelta(days=RECURRENCE_BLOCK_DAYS - 1)
+    windows_by_date: Dict[date, List[Tuple[int, int]]] = {}
+    for recurrence, window in recurrences:
+        for day in recurrence.occurrences(first_day, last_day):
+            windows_by_date.setdefault(day, []).append(window)
+    return windows_by_date
+
+def block_of(day: date) -> int:
+    """Index of the expansion block holding `day`."""
+
+    return (day.toordinal() - 1) // RECURRENCE_BLOCK_DAYS
+
+def _parse_until(value: str) -> date:
+    # UNTIL=20261231 or UNTIL=20261231T235959Z; availability rows only need the date
+    return date(int(value[:4]), int(value[4:6]), int(value[6:8]))
+
+def _month_day(number: int, month_length: int) -> Optional[int]:
+    """Day of the month for a BYMONTHDAY value (negative counts from the end), None if the month is too short."""
+
+    day = number if number > 0 else month_length + number + 1
+    return day if 1 <= day <= month_length else None
+
+def _matches_month_day(day: date, by_month_day: List[int]) -> bool:
+    month_length = calendar.monthrange(day.year, day.month)[1]
+    return any(_month_day(number, month_length) == day.day for number in by_month_day)
+
+def _month_days_on_weekday(first: date, month_length: int, weekday: int, ordinal: Optional[int]) -> List[int]:
+    """Days of the month falling on `weekday`; only the ordinal-th one (negative from the end) when given."""
+
+    first_match = 1 + (weekday - first.weekday()) % 7
+    days = list(range(first_match, month_length + 1, 7))
+    if ordinal is None:
+        return days
+    index = ordinal - 1 if ordinal > 0 else ordinal
+    return [days[index]] if -len(days) <= index < len(days) else []
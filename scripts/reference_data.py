@@ -0,0 +1,178 @@
+import time as monotonic_clock
+from supabase import Client
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+# How long a bulk-loaded reference table is trusted before it is read again
+REFERENCE_TTL_SECONDS = 600
+
+# A lookup that misses reads the table again at most this often (unknown keys would otherwise
+# reread it on every call, once per thread in the cross-provider search)
+MISS_RELOAD_SECONDS = 30
+
+class ReferenceTable:
+    """
+    A small, rarely edited table held in memory and keyed by one column.
+
+    The whole table is read in one query and lookups are served from a dict.
+    It is read again after the TTL, after `invalidate`, and when a key is
+    missing (so a row added since the last load is found without waiting for
+    the TTL). Reads for missing keys are limited to one per `miss_reload_seconds`;
+    until then, other missing keys are answered None from memory.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        key_column: str,
+        ttl_seconds: float = REFERENCE_TTL_SECONDS,
+        miss_reload_seconds: float = MISS_RELOAD_SECONDS
+    ):
+        self.table_name = table_name
+        self.key_column = key_column
+        self.ttl_seconds = ttl_seconds
+        self.miss_reload_seconds = miss_reload_seconds
+        self._rows: Optional[List[Dict]] = None
+        self._by_key: Dict[str, Dict] = {}
+        self._loaded_at = 0.0
+        self._miss_reloaded_at = float("-inf")
+        self._generation = 0
+        # Slot searches for several providers run on worker threads
+        self._lock = Lock()
+
+    def get(self, supabase: Client, key: str) -> Optional[Dict]:
+        """Row whose key column equals `key`, or None."""
+
+        _, by_key, reloaded = self._current(supabase)
+        row = by_key.get(key)
+        if row is None and not reloaded and self._claim_miss_reload():
+            _, by_key = self._load(supabase)
+            row = by_key.get(key)
+        return row
+
+    def all(self, supabase: Client) -> List[Dict]:
+        """Every row, in table order."""
+
+        rows, _, _ = self._current(supabase)
+        return list(rows)
+
+    async def get_async(self, supabase, key: str) -> Optional[Dict]:
+        """`get` for the async Supabase client (same cache)."""
+
+        cached = self._fresh()
+        if cached is None:
+            _, by_key = await self._load_async(supabase)
+            return by_key.get(key)
+        row = cached[1].get(key)
+        if row is None and self._claim_miss_reload():
+            _, by_key = await self._load_async(supabase)
+            row = by_key.get(key)
+        return row
+
+    async def all_async(self, supabase) -> List[Dict]:
+        """`all` for the async Supabase client (same cache)."""
+
+        cached = self._fresh()
+        if cached is None:
+            cached = await self._load_async(supabase)
+        return list(cached[0])
+
+    def invalidate(self) -> None:
+        """Forget the table so the next lookup reads it again (call after editing it)."""
+
+        with self._lock:
+            self._generation += 1
+            self._rows = None
+            self._by_key = {}
+            self._miss_reloaded_at = float("-inf")
+
+    def _fresh(self) -> Optional[Tuple[List[Dict], Dict[str, Dict]]]:
+        """Cached rows and index, or None when missing or expired."""
+
+        with self._lock:
+            if self._rows is not None and monotonic_clock.monotonic() - self._loaded_at < self.ttl_seconds:
+                return self._rows, self._by_key
+        return None
+
+    def _claim_miss_reload(self) -> bool:
+        """Whether a missing key may read the table now (one caller per interval, across threads)."""
+
+        with self._lock:
+            now = monotonic_clock.monotonic()
+            if now - self._miss_reloaded_at < self.miss_reload_seconds:
+                return False
+            self._miss_reloaded_at = now
+            return True
+
+    def _current(self, supabase: Client) -> Tuple[List[Dict], Dict[str, Dict], bool]:
+        """Cached rows and index, loading them first when missing or expired."""
+
+        cached = self._fresh()
+        if cached is not None:
+            return cached[0], cached[1], False
+        rows, by_key = self._load(supabase)
+        return rows, by_key, True
+
+    def _load(self, supabase: Client) -> Tuple[List[Dict], Dict[str, Dict]]:
+        generation = self._generation
+        response = supabase.table(self.table_name).select("*").execute()
+        return self._store(response.data or [], generation)
+
+    async def _load_async(self, supabase) -> Tuple[List[Dict], Dict[str, Dict]]:
+        generation = self._generation
+        response = await supabase.table(self.table_name).select("*").execute()
+        return self._store(response.data or [], generation)
+
+    def _store(self, rows: List[Dict], generation: int) -> Tuple[List[Dict], Dict[str, Dict]]:
+        by_key = {}
+        for row in rows:
+            # Keep the first row per key, like `.eq(...).execute().data[0]` did
+            by_key.setdefault(row.get(self.key_column), row)
+
+        with self._lock:
+            # A load that raced with an invalidation is used once but not cached
+            if generation == self._generation:
+                self._rows = rows
+                self._by_key = by_key
+                self._loaded_at = monotonic_clock.monotonic()
+        return rows, by_key
+
+# Shared by every script loaded in this worker process
+visit_types = ReferenceTable("visit_types", "name")
+providers = ReferenceTable("providers", "id")
+
+def get_visit_type(supabase: Client, name: str) -> Optional[Dict]:
+    """Visit type row by name from the process-level cache."""
+
+    return visit_types.get(supabase, name)
+
+def get_provider(supabase: Client, provider_id: str) -> Optional[Dict]:
+    """Provider row by id from the process-level cache."""
+
+    return providers.get(supabase, provider_id)
+
+def get_providers(supabase: Client) -> List[Dict]:
+    """Every provider row from the process-level cache."""
+
+    return providers.all(supabase)
+
+async def get_visit_type_async(supabase, name: str) -> Optional[Dict]:
+    """`get_visit_type` for the async Supabase client."""
+
+    return await visit_types.get_async(supabase, name)
+
+async def get_provider_async(supabase, provider_id: str) -> Optional[Dict]:
+    """`get_provider` for the async Supabase client."""
+
+    return await providers.get_async(supabase, provider_id)
+
+async def get_providers_async(supabase) -> List[Dict]:
+    """`get_providers` for the async Supabase client."""
+
+    return await providers.all_async(supabase)
+
+def invalidate_reference_data() -> None:
+    """Invalidation hook for edits to visit_types or providers."""
+
+    visit_types.invalidate()
+    providers.invalidate()
@@ -1,9 +1,21 @@
-import wmill
 from supabase import create_client, Client
+from supabase_client import get_supabase_client
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+from clinic_time import local_now, parse_local
+from reference_data import get_provider
+from atomic_reschedule import reschedule_atomically
+from slot_holds import get_hold_store
+from deadline import Deadline
+from prefetch import invalidate_prefetched
 
-def main(appointment_id: str, new_datetime: str) -> Dict[str, Any]:
+def main(
+    appointment_id: str,
+    new_datetime: str,
+    atomic: bool = False,
+    hold_token: str = None,
+    deadline_ms: int = None
+) -> Dict[str, Any]:
     """
     Reschedule an appointment to a new datetime.
     
@@ -13,28 +25,46 @@ def main(appointment_id: str, new_datetime: str) -> Dict[str, Any]:
     Args:
         appointment_id (str): UUID of the appointment to reschedule
         new_datetime (str): New datetime in ISO format (e.g., "2025-06-10T10:00:00")
+        atomic (bool): Re-check the slot and write in one step, failing with a conflict
+            if another caller took the slot or moved the appointment first; "atomic" in the
+            response is False when sql/atomic_reschedule.sql is not installed and the
+            client-side re-check could not rule out a concurrent booking
+        hold_token (str): Token of the hold check_appointment_availability placed on this slot;
+            redeemed (and reported in "hold_redeemed") once the appointment is written, if it is
+            live and for this appointment and slot; a failed or conflicting reschedule leaves it
+            in place. Holds live in one worker, so atomic=True still re-checks the slot
+        deadline_ms (int): Time budget for the whole call. If it is spent before the write, nothing
+            is changed and "deadline_exceeded" is returned; after the write, detail lookups the
+            server did not embed are skipped and the response carries "partial": True
     
     Returns:
         Dict containing success status, updated appointment details, or error information
     """
     
+    deadline = Deadline(deadline_ms)
+    
     try:
-        # Step 1: Setup Supabase
-        config = wmill.get_resource("u/gregory/supabase")
-        supabase: Client = create_client(config["url"], config["key"])
+        # Step 1: Setup Supabase (the worker's shared client, reused while warm)
+        supabase: Client = get_supabase_client(create_client)
         
-        # Step 2: Validate datetime format
+        # Step 2: Validate datetime format (a time with an offset is stored as clinic wall-clock time,
+        # appointment_time being a `timestamp` column)
         try:
-            new_dt = datetime.fromisoformat(new_datetime.replace('Z', '+00:00'))
+            new_dt = parse_local(new_datetime)
         except ValueError:
             return {
                 "success": False,
                 "error": f"Invalid datetime format: {new_datetime}. Expected ISO format like '2025-06-10T10:00:00'",
                 "appointment_id": appointment_id
             }
+        new_datetime = new_dt.isoformat()
         
-        # Step 3: Check if appointment exists and get current details
-        appointment_response = supabase.table("appointments").select("*").eq("id", appointment_id).execute()
+        # Step 3: Check if appointment exists and get current details, with the patient and provider
+        # embedded (a reschedule does not change them) so the response needs no further reads
+        appointment_response = supabase.table("appointments") \
+            .select("*, patients(full_name, email, phone), providers(full_name, specialty)") \
+            .eq("id", appointment_id) \
+            .execute()
         
         if not appointment_response.data:
             return {
@@ -55,7 +85,7 @@ def main(appointment_id: str, new_datetime: str) -> Dict[str, Any]:
             }
         
         # Step 5: Prevent scheduling in the past
-        current_time = datetime.now()
+        current_time = local_now()
         if new_dt <= current_time:
             return {
                 "success": False,
@@ -63,68 +93,161 @@ def main(appointment_id: str, new_datetime: str) -> Dict[str, Any]:
                 "appointment_id": appointment_id
             }
         
-        # Step 6: Update the appointment
+        # Step 5.2: Change nothing once the time budget is spent (the caller can safely retry)
+        if deadline.expired():
+            return {
+                "success": False,
+                "error": "Time budget spent before the appointment was changed; nothing was rescheduled",
+                "appointment_id": appointment_id,
+                "deadline_exceeded": True
+            }
+        
+        # Step 5.5: Check the hold placed when the slot was offered (spent only once the appointment
+        # is written, so a conflict or a failed write leaves the slot reserved for a retry)
+        hold_matches = holds_slot(hold_token, appointment_id, new_dt)
+        
+        # Step 6: Update the appointment (with atomic=True, re-validated in the same write: a hold
+        # lives in one worker, so another worker may have booked the slot regardless)
         update_data = {
             "appointment_time": new_datetime,
             "notes": f"{current_appointment.get('notes', '')} - Rescheduled on {current_time.strftime('%Y-%m-%d %H:%M:%S')}"
         }
         
-        update_response = supabase.table("appointments").update(update_data).eq("id", appointment_id).execute()
-        
-        if not update_response.data:
-            return {
-                "success": False,
-                "error": "Failed to update appointment",
-                "appointment_id": appointment_id
-            }
+        if atomic:
+            outcome = reschedule_atomically(supabase, current_appointment, new_datetime, update_data["notes"])
+            
+            if not outcome["success"]:
+                return conflict_result(outcome, appointment_id)
+            
+            updated_appointment = outcome["appointment"]
+        else:
+            update_response = supabase.table("appointments").update(update_data).eq("id", appointment_id).execute()
+            
+            if not update_response.data:
+                return {
+                    "success": False,
+                    "error": "Failed to update appointment",
+                    "appointment_id": appointment_id
+                }
+            
+            updated_appointment = update_response.data[0]
         
-        updated_appointment = update_response.data[0]
+        # The slot is booked: its hold is spent, the other slots offered for this appointment are
+        # free again, and calendars prefetched for this provider no longer match the database
+        hold_redeemed = hold_matches and get_hold_store().redeem(hold_token) is not None
+        get_hold_store().release_for_appointment(appointment_id)
+        invalidate_prefetched(updated_appointment["provider_id"])
         
-        # Step 7: Get additional details for response (patient and provider info)
-        patient_response = supabase.table("patients").select("full_name, email, phone").eq("id", updated_appointment["patient_id"]).execute()
-        provider_response = supabase.table("providers").select("full_name, specialty").eq("id", updated_appointment["provider_id"]).execute()
-        
-        patient_info = patient_response.data[0] if patient_response.data else {}
-        provider_info = provider_response.data[0] if provider_response.data else {}
+        # Step 7: Get additional details for response (embedded in Step 3; looked up only if the
+        # server did not embed them and the deadline allows)
+        partial = False
+        if "patients" in current_appointment:
+            patient_info = current_appointment["patients"] or {}
+        elif deadline.expired():
+            patient_info, partial = {}, True
+        else:
+            patient_response = supabase.table("patients").select("full_name, email, phone").eq("id", updated_appointment["patient_id"]).execute()
+            patient_info = patient_response.data[0] if patient_response.data else {}
+        if "providers" in current_appointment:
+            provider_info = current_appointment["providers"] or {}
+        elif deadline.expired():
+            provider_info, partial = {}, True
+        else:
+            provider_info = get_provider(supabase, updated_appointment["provider_id"]) or {}
         
         # Step 8: Format the response
-        old_datetime = datetime.fromisoformat(current_appointment["appointment_time"].replace('Z', '+00:00'))
-        new_datetime_obj = datetime.fromisoformat(updated_appointment["appointment_time"].replace('Z', '+00:00'))
+        result = format_reschedule_result(
+            current_appointment, updated_appointment, patient_info, provider_info,
+            current_time, hold_token, hold_redeemed
+        )
+        if atomic:
+            result["atomic"] = outcome["atomic"]
+        if deadline.bounded:
+            result["partial"] = partial
         
-        return {
-            "success": True,
-            "message": "Appointment successfully rescheduled",
-            "appointment_id": appointment_id,
-            "patient": {
-                "name": patient_info.get("full_name", "Unknown"),
-                "email": patient_info.get("email", ""),
-                "phone": patient_info.get("phone", "")
-            },
-            "provider": {
-                "name": provider_info.get("full_name", "Unknown"),
-                "specialty": provider_info.get("specialty", "")
-            },
-            "appointment_details": {
-                "type": updated_appointment["type"],
-                "duration_minutes": updated_appointment["duration_minutes"],
-                "status": updated_appointment["status"],
-                "notes": updated_appointment["notes"]
-            },
-            "schedule_change": {
-                "old_datetime": old_datetime.isoformat(),
-                "old_formatted": old_datetime.strftime("%Y-%m-%d at %I:%M %p"),
-                "new_datetime": new_datetime_obj.isoformat(),
-                "new_formatted": new_datetime_obj.strftime("%Y-%m-%d at %I:%M %p"),
-                "new_date": new_datetime_obj.strftime("%Y-%m-%d"),
-                "new_time": new_datetime_obj.strftime("%H:%M"),
-                "new_weekday": new_datetime_obj.strftime("%A")
-            },
-            "rescheduled_at": current_time.isoformat()
-        }
+        return result
         
     except Exception as e:
         return {
             "success": False,
             "error": f"An error occurred while rescheduling appointment: {str(e)}",
             "appointment_id": appointment_id
-        }
\ No newline at end of file
+        }
+
+def holds_slot(hold_token: Optional[str], appointment_id: str, new_dt: datetime) -> bool:
+    """
+    Whether a hold is live and reserves this slot for this appointment. Only
+    looks at the hold; n8 redeems it after the appointment is written.
+    """
+    
+    if not hold_token:
+        return False
+    
+    hold = get_hold_store().peek(hold_token)
+    return hold is not None and hold["appointment_id"] == appointment_id and parse_local(hold["slot_start"]) == new_dt
+
+def conflict_result(outcome: Dict, appointment_id: str) -> Dict[str, Any]:
+    """Response for an atomic reschedule that lost the slot or the appointment."""
+    
+    return {
+        "success": False,
+        "conflict": outcome["conflict"],
+        "error": f"Requested time is no longer available: {outcome['conflict_reason']}" if outcome["conflict"] else outcome["conflict_reason"],
+        "conflict_reason": outcome["conflict_reason"],
+        "atomic": outcome["atomic"],
+        "appointment_id": appointment_id
+    }
+
+def format_reschedule_result(
+    current_appointment: Dict,
+    updated_appointment: Dict,
+    patient_info: Dict,
+    provider_info: Dict,
+    current_time: datetime,
+    hold_token: Optional[str],
+    hold_redeemed: bool
+) -> Dict[str, Any]:
+    """
+    Build the response for a rescheduled appointment.
+    
+    Returns:
+        Dict with the patient, provider, appointment details and the old and new times
+    """
+    
+    old_datetime = parse_local(current_appointment["appointment_time"])
+    new_datetime_obj = parse_local(updated_appointment["appointment_time"])
+    
+    result = {
+        "success": True,
+        "message": "Appointment successfully rescheduled",
+        "appointment_id": current_appointment["id"],
+        "patient": {
+            "name": patient_info.get("full_name", "Unknown"),
+            "email": patient_info.get("email", ""),
+            "phone": patient_info.get("phone", "")
+        },
+        "provider": {
+            "name": provider_info.get("full_name", "Unknown"),
+            "specialty": provider_info.get("specialty", "")
+        },
+        "appointment_details": {
+            "type": updated_appointment["type"],
+            "duration_minutes": updated_appointment["duration_minutes"],
+            "status": updated_appointment["status"],
+            "notes": updated_appointment["notes"]
+        },
+        "schedule_change": {
+            "old_datetime": old_datetime.isoformat(),
+            "old_formatted": old_datetime.strftime("%Y-%m-%d at %I:%M %p"),
+            "new_datetime": new_datetime_obj.isoformat(),
+            "new_formatted": new_datetime_obj.strftime("%Y-%m-%d at %I:%M %p"),
+            "new_date": new_datetime_obj.strftime("%Y-%m-%d"),
+            "new_time": new_datetime_obj.strftime("%H:%M"),
+            "new_weekday": new_datetime_obj.strftime("%A")
+        },
+        "rescheduled_at": current_time.isoformat()
+    }
+    if hold_token:
+        result["hold_redeemed"] = hold_redeemed
+    
+    return result
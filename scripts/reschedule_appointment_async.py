@@ -0,0 +1,172 @@
+import asyncio
+from supabase import acreate_client, AsyncClient
+from supabase_client import get_async_supabase_client
+from typing import Dict, Any
+from clinic_time import local_now, parse_local
+from reference_data import get_provider_async
+from atomic_reschedule import reschedule_atomically_async
+from slot_holds import get_hold_store
+from deadline import Deadline
+from prefetch import invalidate_prefetched
+from reschedule_appointment import conflict_result, format_reschedule_result, holds_slot
+
+async def main(
+    appointment_id: str,
+    new_datetime: str,
+    atomic: bool = False,
+    hold_token: str = None,
+    deadline_ms: int = None
+) -> Dict[str, Any]:
+    """
+    Reschedule an appointment to a new datetime.
+    Async variant of reschedule_appointment: same arguments and response, with the
+    reads that follow the update run concurrently on the worker's event loop.
+    
+    Args:
+        appointment_id (str): UUID of the appointment to reschedule
+        new_datetime (str): New datetime in ISO format (e.g., "2025-06-10T10:00:00")
+        atomic (bool): Re-check the slot and write in one step, failing with a conflict
+            if another caller took the slot or moved the appointment first
+        hold_token (str): Token of the hold check_appointment_availability placed on this slot
+        deadline_ms (int): Time budget for the whole call (see reschedule_appointment)
+    
+    Returns:
+        Dict containing success status, updated appointment details, or error information
+    """
+    
+    deadline = Deadline(deadline_ms)
+    
+    try:
+        # Step 1: Setup Supabase (the event loop's shared async client)
+        supabase: AsyncClient = await get_async_supabase_client(acreate_client)
+        
+        # Step 2: Validate datetime format (a time with an offset is stored as clinic wall-clock time,
+        # appointment_time being a `timestamp` column)
+        try:
+            new_dt = parse_local(new_datetime)
+        except ValueError:
+            return {
+                "success": False,
+                "error": f"Invalid datetime format: {new_datetime}. Expected ISO format like '2025-06-10T10:00:00'",
+                "appointment_id": appointment_id
+            }
+        new_datetime = new_dt.isoformat()
+        
+        # Step 3: Check if appointment exists and get current details, with the patient and provider embedded
+        appointment_response = await supabase.table("appointments") \
+            .select("*, patients(full_name, email, phone), providers(full_name, specialty)") \
+            .eq("id", appointment_id) \
+            .execute()
+        
+        if not appointment_response.data:
+            return {
+                "success": False,
+                "error": "Appointment not found",
+                "appointment_id": appointment_id
+            }
+        
+        current_appointment = appointment_response.data[0]
+        
+        # Step 4: Validate appointment status (only reschedule scheduled appointments)
+        if current_appointment.get("status", "").lower() != "scheduled":
+            return {
+                "success": False,
+                "error": f"Cannot reschedule appointment with status: {current_appointment.get('status')}. Only 'scheduled' appointments can be rescheduled.",
+                "appointment_id": appointment_id,
+                "current_status": current_appointment.get("status")
+            }
+        
+        # Step 5: Prevent scheduling in the past
+        current_time = local_now()
+        if new_dt <= current_time:
+            return {
+                "success": False,
+                "error": f"Cannot schedule appointments in the past. Requested time: {new_datetime}, Current time: {current_time.isoformat()}",
+                "appointment_id": appointment_id
+            }
+        
+        # Step 5.2: Change nothing once the time budget is spent (the caller can safely retry)
+        if deadline.expired():
+            return {
+                "success": False,
+                "error": "Time budget spent before the appointment was changed; nothing was rescheduled",
+                "appointment_id": appointment_id,
+                "deadline_exceeded": True
+            }
+        
+        # Step 5.5: Check the hold placed when the slot was offered (spent only once the appointment
+        # is written, so a conflict or a failed write leaves the slot reserved for a retry)
+        hold_matches = holds_slot(hold_token, appointment_id, new_dt)
+        
+        # Step 6: Update the appointment (with atomic=True, re-validated in the same write even
+        # when the caller holds the slot)
+        update_data = {
+            "appointment_time": new_datetime,
+            "notes": f"{current_appointment.get('notes', '')} - Rescheduled on {current_time.strftime('%Y-%m-%d %H:%M:%S')}"
+        }
+        
+        if atomic:
+            outcome = await reschedule_atomically_async(supabase, current_appointment, new_datetime, update_data["notes"])
+            
+            if not outcome["success"]:
+                return conflict_result(outcome, appointment_id)
+            
+            updated_appointment = outcome["appointment"]
+        else:
+            update_response = await supabase.table("appointments").update(update_data).eq("id", appointment_id).execute()
+            
+            if not update_response.data:
+                return {
+                    "success": False,
+                    "error": "Failed to update appointment",
+                    "appointment_id": appointment_id
+                }
+            
+            updated_appointment = update_response.data[0]
+        
+        # The slot is booked: its hold is spent, the other slots offered for this appointment are
+        # free again, and calendars prefetched for this provider no longer match the database
+        hold_redeemed = hold_matches and get_hold_store().redeem(hold_token) is not None
+        get_hold_store().release_for_appointment(appointment_id)
+        invalidate_prefetched(updated_appointment["provider_id"])
+        
+        # Step 7: Look up the details the server did not embed, concurrently (if the deadline allows)
+        skip_details = deadline.expired()
+        patient_info, provider_info = await asyncio.gather(
+            _patient_info(supabase, current_appointment, updated_appointment, skip_details),
+            _provider_info(supabase, current_appointment, updated_appointment, skip_details)
+        )
+        
+        # Step 8: Format the response
+        result = format_reschedule_result(
+            current_appointment, updated_appointment, patient_info, provider_info,
+            current_time, hold_token, hold_redeemed
+        )
+        if atomic:
+            result["atomic"] = outcome["atomic"]
+        if deadline.bounded:
+            result["partial"] = skip_details and not ("patients" in current_appointment and "providers" in current_appointment)
+        
+        return result
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": f"An error occurred while rescheduling appointment: {str(e)}",
+            "appointment_id": appointment_id
+        }
+
+async def _patient_info(supabase: AsyncClient, current_appointment: Dict, updated_appointment: Dict, skip: bool) -> Dict:
+    if "patients" in current_appointment:
+        return current_appointment["patients"] or {}
+    if skip:
+        return {}
+    patient_response = await supabase.table("patients").select("full_name, email, phone").eq("id", updated_appointment["patient_id"]).execute()
+    return patient_response.data[0] if patient_response.data else {}
+
+async def _provider_info(supabase: AsyncClient, current_appointment: Dict, updated_appointment: Dict, skip: bool) -> Dict:
+    if "providers" in current_appointment:
+        return current_appointment["providers"] or {}
+    if skip:
+        return {}
+    return await get_provider_async(supabase, updated_appointment["provider_id"]) or {}
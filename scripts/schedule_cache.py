@@ -0,0 +1,421 @@
+import asyncio
+import os
+import time as monotonic_clock
+from collections import OrderedDict
+from datetime import date, datetime
+from supabase import Client
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+from clinic_time import local_now
+from recurrence import block_of, expand_block, recurrence_for
+
+# How long a compiled schedule is trusted before the availability rows are read again
+SCHEDULE_TTL_SECONDS = 300
+
+# Providers kept per process; the least recently used one is dropped first
+SCHEDULE_CACHE_SIZE = 256
+
+# Table created by sql/schedule_exceptions.sql; read only once it is installed and
+# SCHEDULE_EXCEPTIONS=1 is set (otherwise schedules are the weekly hours alone)
+SCHEDULE_EXCEPTIONS_TABLE = "schedule_exceptions"
+SCHEDULE_EXCEPTIONS_ENABLED = os.environ.get("SCHEDULE_EXCEPTIONS") == "1"
+
+# How long to trust a "table does not exist" answer before trying again
+TABLE_RECHECK_SECONDS = 300
+
+# PostgREST: relation not in the schema cache / Postgres: undefined_table
+_MISSING_TABLE_CODES = ("PGRST205", "42P01")
+
+class ProviderSchedule:
+    """
+    A provider's working hours, compiled into working windows per concrete date.
+
+    Weekly hours come from `availability`: every row of a weekday is a window, so
+    several rows make a split shift. A row with a `recurrence` (RRULE) or a
+    `week_parity` applies only on the dates its rule selects (see recurrence.py).
+    Rows of `schedule_exceptions` change single dates: a closure without times
+    takes the day off, a closure with times is a break, and an opening adds
+    hours (see sql/schedule_exceptions.sql).
+
+    Windows are held as integer seconds since midnight so slot checks compare
+    plain integers. Each date is compiled once, when first asked for, and kept
+    for the life of the schedule; recurrences are expanded once per block of
+    RECURRENCE_BLOCK_DAYS days. `with_availability_change` and
+    `with_exception_change` recompile only the dates a row touches.
+    """
+
+    def __init__(self, provider_id: str, availability_rows: List[Dict], exception_rows: List[Dict] = ()):
+        self.provider_id = provider_id
+        self.availability_rows = list(availability_rows)
+        self.exception_rows = list(exception_rows)
+
+        # Weekly working windows per weekday (1-7, Monday=1), and the rows with a recurrence rule
+        self.windows_by_weekday: Dict[int, List[Tuple[int, int]]] = {}
+        self.recurrences: List[Tuple[object, Tuple[int, int]]] = []
+        for availability in self.availability_rows:
+            window = (_parse_seconds(availability["start_time"]), _parse_seconds(availability["end_time"]))
+            recurrence = recurrence_for(availability)
+            if recurrence is not None:
+                self.recurrences.append((recurrence, window))
+            else:
+                self.windows_by_weekday.setdefault(availability["weekday"], []).append(window)
+
+        self.exceptions_by_date: Dict[date, List[Dict]] = {}
+        for exception in self.exception_rows:
+            self.exceptions_by_date.setdefault(date.fromisoformat(exception["exception_date"]), []).append(exception)
+
+        # Compiled windows per date, and the recurring windows per expanded block
+        self._windows_by_date: Dict[date, List[Tuple[int, int]]] = {}
+        self._recurring_by_block: Dict[int, Dict[date, List[Tuple[int, int]]]] = {}
+
+    def windows_on(self, day: date) -> List[Tuple[int, int]]:
+        """Working windows of one date, in seconds since midnight."""
+
+        windows = self._windows_by_date.get(day)
+        if windows is None:
+            windows = self._compile_day(day)
+            self._windows_by_date[day] = windows
+        return windows
+
+    def has_hours(self) -> bool:
+        """Whether any availability or exception row gives the provider working hours."""
+
+        return bool(self.windows_by_weekday or self.recurrences or self.exceptions_by_date)
+
+    def has_exceptions(self, first_day: date, last_day: date) -> bool:
+        """Whether any exception falls on a date from `first_day` through `last_day`."""
+
+        return any(first_day <= day <= last_day for day in self.exceptions_by_date)
+
+    def fits(self, day: date, start: datetime, end: datetime) -> bool:
+        """Whether [start, end) lies inside one of the date's windows (by wall-clock time)."""
+
+        return self.fits_seconds(day, seconds_of_day(start), seconds_of_day(end))
+
+    def fits_seconds(self, day: date, start_seconds: float, end_seconds: float) -> bool:
+        """`fits` for wall-clock times already in seconds since midnight."""
+
+        return any(
+            window_start <= start_seconds and end_seconds <= window_end
+            for window_start, window_end in self.windows_on(day)
+        )
+
+    def with_availability_change(self, before: Optional[Dict], after: Optional[Dict]) -> "ProviderSchedule":
+        """
+        This schedule with one availability row added (`before` None), edited or
+        removed (`after` None). Only dates on the weekdays involved are recompiled;
+        an RRULE row can fall on any weekday, so its change recompiles every date.
+        """
+
+        availability_rows = _replace_row(self.availability_rows, before, after)
+        rows = [row for row in (before, after) if row]
+        weekdays = {row["weekday"] for row in rows}
+
+        schedule = ProviderSchedule(self.provider_id, availability_rows, self.exception_rows)
+        if any(row.get("recurrence") for row in rows):
+            return schedule
+        schedule._windows_by_date = {
+            day: windows for day, windows in self._windows_by_date.items() if day.isoweekday() not in weekdays
+        }
+        if not any(row.get("week_parity") for row in rows):
+            schedule._recurring_by_block = self._recurring_by_block
+        return schedule
+
+    def with_exception_change(self, before: Optional[Dict], after: Optional[Dict]) -> "ProviderSchedule":
+        """This schedule with one exception row added, edited or removed. Only its dates are recompiled."""
+
+        exception_rows = _replace_row(self.exception_rows, before, after)
+        days = {date.fromisoformat(row["exception_date"]) for row in (before, after) if row}
+
+        schedule = ProviderSchedule(self.provider_id, self.availability_rows, exception_rows)
+        schedule._windows_by_date = {
+            day: windows for day, windows in self._windows_by_date.items() if day not in days
+        }
+        schedule._recurring_by_block = self._recurring_by_block
+        return schedule
+
+    def _compile_day(self, day: date) -> List[Tuple[int, int]]:
+        windows = list(self.windows_by_weekday.get(day.isoweekday(), []))
+        if self.recurrences:
+            windows += self._recurring_windows(day)
+
+        exceptions = self.exceptions_by_date.get(day, [])
+        for exception in exceptions:
+            if exception["kind"] != "closed":
+                continue
+            if exception.get("start_time") is None:
+                windows = []
+            else:
+                windows = _subtract(windows, _parse_seconds(exception["start_time"]), _parse_seconds(exception["end_time"]))
+        for exception in exceptions:
+            if exception["kind"] == "open":
+                windows.append((_parse_seconds(exception["start_time"]), _parse_seconds(exception["end_time"])))
+
+        return windows
+
+    def _recurring_windows(self, day: date) -> List[Tuple[int, int]]:
+        """Windows the recurring rows give the date, expanding its whole block on first use."""
+
+        block = block_of(day)
+        expanded = self._recurring_by_block.get(block)
+        if expanded is None:
+            expanded = expand_block(self.recurrences, block)
+            self._recurring_by_block[block] = expanded
+        return expanded.get(day, [])
+
+class ScheduleCache:
+    """
+    Process-level cache of compiled provider schedules with a TTL and LRU eviction.
+
+    Warm Windmill workers keep the module loaded between runs, so repeated checks
+    for the same provider skip the `availability` query entirely. After editing
+    an availability or exception row, call `update_availability` or
+    `update_exception` (only the dates it touches are recompiled) or `invalidate`.
+
+    With SCHEDULE_EXCEPTIONS_ENABLED, the upcoming exceptions of the whole clinic
+    are read in one query and kept for the same TTL.
+    """
+
+    def __init__(self, ttl_seconds: float = SCHEDULE_TTL_SECONDS, max_entries: int = SCHEDULE_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, ProviderSchedule]]" = OrderedDict()
+        # Bumped by every invalidation so a read racing with it is not cached
+        self._generation = 0
+        # Upcoming exception rows of every provider: (loaded_at, rows)
+        self._exceptions: Optional[Tuple[float, List[Dict]]] = None
+        self._exceptions_missing_since: Optional[float] = None
+        # Slot searches for several providers run on worker threads
+        self._lock = Lock()
+
+    def get(self, supabase: Client, provider_id: str) -> ProviderSchedule:
+        """Compiled schedule for the provider, read from `availability` on a miss."""
+
+        schedule = self.peek(provider_id)
+        if schedule is not None:
+            return schedule
+
+        generation = self._generation
+        availability_response = supabase.table("availability").select("*").eq("provider_id", provider_id).execute()
+        exception_rows = self._fresh_exceptions()
+        if exception_rows is None:
+            try:
+                exceptions_response = _exceptions_query(supabase).execute()
+            except Exception as e:
+                exception_rows = self._exceptions_failed(e)
+            else:
+                exception_rows = self._store_exceptions(exceptions_response.data or [], generation)
+        schedule = ProviderSchedule(provider_id, availability_response.data or [], _rows_for(exception_rows, provider_id))
+        self.put(schedule, generation)
+        return schedule
+
+    async def get_async(self, supabase, provider_id: str) -> ProviderSchedule:
+        """`get` for the async Supabase client (same cache entries; both tables are read concurrently)."""
+
+        schedule = self.peek(provider_id)
+        if schedule is not None:
+            return schedule
+
+        async def read_exceptions() -> List[Dict]:
+            try:
+                exceptions_response = await _exceptions_query(supabase).execute()
+            except Exception as e:
+                return self._exceptions_failed(e)
+            return self._store_exceptions(exceptions_response.data or [], generation)
+
+        generation = self._generation
+        exception_rows = self._fresh_exceptions()
+        if exception_rows is None:
+            availability_response, exception_rows = await asyncio.gather(
+                supabase.table("availability").select("*").eq("provider_id", provider_id).execute(),
+                read_exceptions()
+            )
+        else:
+            availability_response = await supabase.table("availability").select("*").eq("provider_id", provider_id).execute()
+        schedule = ProviderSchedule(provider_id, availability_response.data or [], _rows_for(exception_rows, provider_id))
+        self.put(schedule, generation)
+        return schedule
+
+    def peek(self, provider_id: str) -> Optional[ProviderSchedule]:
+        """Cached schedule if present and fresh, without querying."""
+
+        with self._lock:
+            entry = self._entries.get(provider_id)
+            if entry is None:
+                return None
+            loaded_at, schedule = entry
+            if monotonic_clock.monotonic() - loaded_at >= self.ttl_seconds:
+                del self._entries[provider_id]
+                return None
+            self._entries.move_to_end(provider_id)
+            return schedule
+
+    def put(self, schedule: ProviderSchedule, generation: int = None) -> None:
+        """Cache a schedule, unless it was read before an invalidation of `generation`."""
+
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[schedule.provider_id] = (monotonic_clock.monotonic(), schedule)
+            self._entries.move_to_end(schedule.provider_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, provider_id: str = None) -> None:
+        """Drop one provider's schedule, or every schedule (and the exceptions) when no provider is given."""
+
+        with self._lock:
+            self._generation += 1
+            if provider_id is None:
+                self._entries.clear()
+                self._exceptions = None
+                self._exceptions_missing_since = None
+            else:
+                self._entries.pop(provider_id, None)
+
+    def update_availability(self, before: Optional[Dict], after: Optional[Dict]) -> None:
+        """Apply an availability row insert (`before` None), edit or delete (`after` None) to the cached schedule."""
+
+        provider_id = (after or before)["provider_id"]
+        with self._lock:
+            self._generation += 1
+            entry = self._entries.get(provider_id)
+            if entry is not None:
+                loaded_at, schedule = entry
+                self._entries[provider_id] = (loaded_at, schedule.with_availability_change(before, after))
+
+    def update_exception(self, before: Optional[Dict], after: Optional[Dict]) -> None:
+        """Apply an exception row insert, edit or delete to every cached schedule it concerns."""
+
+        with self._lock:
+            self._generation += 1
+            if self._exceptions is not None:
+                loaded_at, rows = self._exceptions
+                self._exceptions = (loaded_at, _replace_row(rows, before, after))
+
+            for provider_id, (loaded_at, schedule) in list(self._entries.items()):
+                provider_before, provider_after = (
+                    row if row and row.get("provider_id") in (None, provider_id) else None for row in (before, after)
+                )
+                if provider_before or provider_after:
+                    self._entries[provider_id] = (loaded_at, schedule.with_exception_change(provider_before, provider_after))
+
+    def _fresh_exceptions(self) -> Optional[List[Dict]]:
+        """Cached exception rows ([] when exceptions are off or the table is missing), or None to read them."""
+
+        with self._lock:
+            if not SCHEDULE_EXCEPTIONS_ENABLED:
+                return []
+            now = monotonic_clock.monotonic()
+            if self._exceptions_missing_since is not None and now - self._exceptions_missing_since < TABLE_RECHECK_SECONDS:
+                return []
+            if self._exceptions is not None and now - self._exceptions[0] < self.ttl_seconds:
+                return self._exceptions[1]
+            return None
+
+    def _store_exceptions(self, rows: List[Dict], generation: int) -> List[Dict]:
+        """Cache the exception rows, unless they were read before an invalidation of `generation`."""
+
+        with self._lock:
+            if generation == self._generation:
+                self._exceptions = (monotonic_clock.monotonic(), rows)
+                self._exceptions_missing_since = None
+        return rows
+
+    def _exceptions_failed(self, error: Exception) -> List[Dict]:
+        """No exceptions when the table is not installed (asked again after TABLE_RECHECK_SECONDS)."""
+
+        if getattr(error, "code", None) not in _MISSING_TABLE_CODES:
+            raise error
+        with self._lock:
+            self._exceptions_missing_since = monotonic_clock.monotonic()
+        return []
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Shared by every script loaded in this worker process
+schedule_cache = ScheduleCache()
+
+def get_provider_schedule(supabase: Client, provider_id: str) -> ProviderSchedule:
+    """Compiled schedule for the provider from the process-level cache."""
+
+    return schedule_cache.get(supabase, provider_id)
+
+async def get_provider_schedule_async(supabase, provider_id: str) -> ProviderSchedule:
+    """`get_provider_schedule` for the async Supabase client."""
+
+    return await schedule_cache.get_async(supabase, provider_id)
+
+def invalidate_provider_schedule(provider_id: str = None) -> None:
+    """Invalidation hook for schedule edits (all providers when no provider is given)."""
+
+    schedule_cache.invalidate(provider_id)
+
+def update_provider_availability(before: Optional[Dict], after: Optional[Dict]) -> None:
+    """Hook for availability row writes: recompiles the dates on the weekdays the row covers."""
+
+    schedule_cache.update_availability(before, after)
+
+def update_schedule_exception(before: Optional[Dict], after: Optional[Dict]) -> None:
+    """Hook for schedule_exceptions row writes: recompiles the dates the row covers."""
+
+    schedule_cache.update_exception(before, after)
+
+def has_schedule_exceptions(supabase: Client, provider_id: str, first_day: date, last_day: date) -> bool:
+    """
+    Whether exceptions change the provider's hours on a date from `first_day`
+    through `last_day`. The availability RPCs and the free_slots table know only
+    the weekly hours, so callers answer with the slot engine then. Always False
+    (without a query) while exceptions are off.
+    """
+
+    if not SCHEDULE_EXCEPTIONS_ENABLED:
+        return False
+    return schedule_cache.get(supabase, provider_id).has_exceptions(first_day, last_day)
+
+async def has_schedule_exceptions_async(supabase, provider_id: str, first_day: date, last_day: date) -> bool:
+    """`has_schedule_exceptions` for the async Supabase client."""
+
+    if not SCHEDULE_EXCEPTIONS_ENABLED:
+        return False
+    return (await schedule_cache.get_async(supabase, provider_id)).has_exceptions(first_day, last_day)
+
+def seconds_of_day(value: datetime) -> float:
+    """Wall-clock time of day in seconds (fractional when the datetime has microseconds)."""
+
+    return value.hour * 3600 + value.minute * 60 + value.second + value.microsecond / 1_000_000
+
+def _parse_seconds(value: str) -> int:
+    parsed = datetime.strptime(value, "%H:%M:%S")
+    return parsed.hour * 3600 + parsed.minute * 60 + parsed.second
+
+def _exceptions_query(supabase):
+    """Exceptions of every provider from today on (past dates are never searched)."""
+
+    return supabase.table(SCHEDULE_EXCEPTIONS_TABLE).select("*").gte("exception_date", local_now().date().isoformat())
+
+def _rows_for(exception_rows: List[Dict], provider_id: str) -> List[Dict]:
+    # Rows without a provider apply to the whole clinic
+    return [row for row in exception_rows if row.get("provider_id") in (None, provider_id)]
+
+def _replace_row(rows: List[Dict], before: Optional[Dict], after: Optional[Dict]) -> List[Dict]:
+    """`rows` without `before` (matched by id) and with `after`."""
+
+    if before is not None:
+        rows = [row for row in rows if row.get("id", row) != before.get("id", before)]
+    return list(rows) + ([after] if after is not None else [])
+
+def _subtract(windows: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    """Windows with [start, end) cut out of them."""
+
+    remaining = []
+    for window_start, window_end in windows:
+        if end <= window_start or window_end <= start:
+            remaining.append((window_start, window_end))
+            continue
+        if window_start < start:
+            remaining.append((window_start, start))
+        if end < window_end:
+            remaining.append((end, window_end))
+    return remaining
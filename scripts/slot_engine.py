@@ -0,0 +1,656 @@
+import asyncio
+import heapq
+from supabase import Client
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date, datetime, timedelta, time
+from typing import Dict, Iterator, List, Optional, Tuple, Union
+from clinic_time import ClinicClock, MICROSECONDS_PER_MINUTE, MICROSECONDS_PER_SECOND, clinic_clock, local_now
+from deadline import Deadline, NO_DEADLINE
+from occupancy_grid import OccupancyGrid
+from schedule_cache import ProviderSchedule, get_provider_schedule, get_provider_schedule_async
+from reference_data import get_visit_type, get_visit_type_async
+from slot_holds import held_appointments
+
+SLOT_INTERVAL_MINUTES = 15
+# Upper bound on an appointment's length; time-bounded appointment queries
+# start this far before the window so long appointments reaching into it are seen
+MAX_APPOINTMENT_MINUTES = 24 * 60
+
+class ProviderSnapshot:
+    """
+    In-memory copy of everything needed to evaluate appointment slots for one provider.
+
+    The provider's compiled schedule and the visit type (both from process-level
+    caches) and the provider's scheduled appointments are fetched once in `load`.
+    Every candidate slot is then evaluated without further Supabase round-trips,
+    using exactly the same rules as `check_time_availability`.
+
+    Times are naive wall-clock times of the clinic (see clinic_time.py); overlaps
+    are decided on integer instants.
+    """
+
+    def __init__(
+        self,
+        provider_id: str,
+        appointment_type: str,
+        schedule: Union[ProviderSchedule, List[Dict]],
+        visit_type: Optional[Dict],
+        appointment_rows: List[Dict],
+        clock: ClinicClock = None
+    ):
+        self.provider_id = provider_id
+        self.appointment_type = appointment_type
+        self.visit_type = visit_type
+        self.clock = clock or clinic_clock()
+
+        # Working windows per date in seconds since midnight (raw availability rows are compiled here)
+        if not isinstance(schedule, ProviderSchedule):
+            schedule = ProviderSchedule(provider_id, schedule)
+        self.schedule = schedule
+        self.windows_by_weekday = schedule.windows_by_weekday
+
+        # Scheduled appointments, parsed once and indexed by start instant
+        self.appointment_rows = list(appointment_rows)
+        self.appointments = AppointmentIndex(self.appointment_rows, self.clock)
+        # Occupancy grid over the last search horizon, built on first search
+        self._grid: Optional[OccupancyGrid] = None
+        # [start, end) the appointments were loaded for (None = full history)
+        self.window: Optional[Tuple[datetime, datetime]] = None
+
+    @classmethod
+    def load(
+        cls,
+        supabase: Client,
+        provider_id: str,
+        appointment_type: str,
+        exclude_appointment_id: str = None,
+        window: Tuple[datetime, datetime] = None
+    ) -> "ProviderSnapshot":
+        """
+        Fetch the provider's schedule, the visit type and the provider's scheduled
+        appointments. The schedule and the visit type come from process-level
+        caches, so a warm worker makes a single query for the appointments.
+
+        Args:
+            supabase: Supabase client
+            provider_id: Provider whose slots will be evaluated
+            appointment_type: Visit type name used for capacity checks
+            exclude_appointment_id: Appointment to ignore (the one being rescheduled)
+            window: Optional [start, end) of the slots that will be evaluated. Only
+                appointments that can overlap it are downloaded; slots outside it
+                cannot be evaluated. See `search_window`.
+
+        Returns:
+            ProviderSnapshot ready for in-memory slot evaluation
+        """
+
+        schedule = get_provider_schedule(supabase, provider_id)
+
+        visit_type = get_visit_type(supabase, appointment_type)
+
+        appointments_response = provider_appointments_query(supabase, provider_id, exclude_appointment_id, window).execute()
+
+        return cls.from_rows(
+            provider_id, appointment_type, schedule, visit_type,
+            appointments_response.data or [], exclude_appointment_id, window
+        )
+
+    @classmethod
+    async def load_async(
+        cls,
+        supabase,
+        provider_id: str,
+        appointment_type: str,
+        exclude_appointment_id: str = None,
+        window: Tuple[datetime, datetime] = None
+    ) -> "ProviderSnapshot":
+        """
+        `load` for the async Supabase client. The schedule, visit type and
+        appointments are independent, so any that miss the caches are read
+        concurrently.
+        """
+
+        schedule, visit_type, appointments_response = await asyncio.gather(
+            get_provider_schedule_async(supabase, provider_id),
+            get_visit_type_async(supabase, appointment_type),
+            provider_appointments_query(supabase, provider_id, exclude_appointment_id, window).execute()
+        )
+
+        return cls.from_rows(
+            provider_id, appointment_type, schedule, visit_type,
+            appointments_response.data or [], exclude_appointment_id, window
+        )
+
+    @classmethod
+    def from_rows(
+        cls,
+        provider_id: str,
+        appointment_type: str,
+        schedule: ProviderSchedule,
+        visit_type: Optional[Dict],
+        appointment_rows: List[Dict],
+        exclude_appointment_id: Optional[str],
+        window: Optional[Tuple[datetime, datetime]]
+    ) -> "ProviderSnapshot":
+        """Snapshot from rows already read (slot holds are merged in now, so they are current)."""
+
+        snapshot = cls(
+            provider_id,
+            appointment_type,
+            schedule,
+            visit_type,
+            # Slots other callers hold (see slot_holds.py) count like booked appointments
+            appointment_rows + held_appointments(provider_id, exclude_appointment_id)
+        )
+        snapshot.window = window
+        return snapshot
+
+    def check(self, requested_dt: datetime, duration_minutes: int) -> Tuple[bool, str]:
+        """
+        Check if a specific time slot is available.
+
+        Returns:
+            Tuple of (is_available, reason_if_not_available)
+        """
+
+        requested_dt = self.clock.local_datetime(requested_dt)
+        self._ensure_loaded(requested_dt, requested_dt + timedelta(minutes=duration_minutes))
+
+        # Check provider availability for the day of week
+        weekday = requested_dt.weekday() + 1  # Convert to 1-7 format (Monday=1)
+        day = requested_dt.date()
+
+        if not self.schedule.windows_on(day):
+            if self.windows_by_weekday.get(weekday) or self.schedule.recurrences:
+                # Hours on some of these weekdays, but not this date (holiday, day off, off week)
+                return False, f"Provider not available on {requested_dt.strftime('%A, %Y-%m-%d')}"
+            return False, f"Provider not available on {requested_dt.strftime('%A')}"
+
+        # Check if requested time falls within provider's working hours
+        requested_end = requested_dt + timedelta(minutes=duration_minutes)
+        if not self.schedule.fits(day, requested_dt, requested_end):
+            return False, "Requested time is outside provider's working hours"
+
+        if not self.visit_type:
+            return False, f"Invalid appointment type: {self.appointment_type}"
+
+        max_patients_per_slot = self.visit_type["max_patients_per_slot"]
+
+        # Check for conflicting appointments and count patients in the same time slot
+        start = self.clock.to_instant(requested_dt)
+        overlapping = self.appointments.overlapping_entries(start, start + duration_minutes * MICROSECONDS_PER_MINUTE)
+        overlapping_appointments = [existing for _, _, existing in overlapping]
+        exact_time_appointments = [existing for existing_start, _, existing in overlapping if existing_start == start]
+
+        return _slot_verdict(requested_dt, max_patients_per_slot, overlapping_appointments, exact_time_appointments, self.clock)
+
+    def find_next(
+        self,
+        start_from: datetime,
+        duration_minutes: int,
+        max_days_ahead: int = 30
+    ) -> Optional[Dict]:
+        """
+        Find the next available slot at or after `start_from`, scanning 15-minute
+        intervals through each working day for up to `max_days_ahead` days.
+
+        Returns:
+            Dict with next available slot info or None if no slot found
+        """
+
+        slots = self.find_available_slots(start_from, duration_minutes, 1, max_days_ahead)
+        return slots[0] if slots else None
+
+    def find_available_slots(
+        self,
+        start_from: datetime,
+        duration_minutes: int,
+        max_results: int,
+        max_days_ahead: int = 30
+    ) -> List[Dict]:
+        """
+        Find up to `max_results` available slots at or after `start_from`, earliest first.
+
+        All results come from the same in-memory scan, so asking for more
+        alternatives costs no extra queries.
+
+        Returns:
+            List of slot info dicts (empty if no slot found)
+        """
+
+        slots, _ = self.search_slots(start_from, duration_minutes, max_results, max_days_ahead)
+        return slots
+
+    def search_slots(
+        self,
+        start_from: datetime,
+        duration_minutes: int,
+        max_results: int,
+        max_days_ahead: int = 30,
+        deadline: Deadline = NO_DEADLINE
+    ) -> Tuple[List[Dict], bool]:
+        """
+        `find_available_slots` within a time budget: the scan stops at the first
+        day boundary after `deadline` has passed.
+
+        Returns:
+            Tuple of (slots found, complete) where complete is False when the
+            deadline cut the scan short
+        """
+
+        slots = []
+        for slot in self._iter_available_slots(start_from, duration_minutes, max_days_ahead, deadline):
+            if slot is None:
+                return slots, False
+            slots.append(format_slot(slot))
+            if len(slots) >= max_results:
+                break
+        return slots, True
+
+    def _iter_available_slots(
+        self,
+        start_from: datetime,
+        duration_minutes: int,
+        max_days_ahead: int,
+        deadline: Deadline = NO_DEADLINE
+    ) -> Iterator[Optional[datetime]]:
+        """Yield available slots in chronological order, then None if `deadline` ended the scan early."""
+
+        if not self.schedule.has_hours():
+            return
+
+        # Ensure we don't search in the past
+        now = self.clock.now()
+        search_start = max(self.clock.local_datetime(start_from), now)
+        current_date = search_start.date()
+        end_date = current_date + timedelta(days=max_days_ahead)
+        self._ensure_loaded(search_start, datetime.combine(end_date + timedelta(days=1), time()))
+        grid = self.occupancy_grid(current_date, max_days_ahead + 1)
+
+        while current_date <= end_date:
+            if deadline.expired():
+                yield None
+                return
+
+            # Every working window of the date is scanned (a split shift has several)
+            midnight = datetime.combine(current_date, time())
+            runs = []
+            for window_start, window_end in sorted(set(self.schedule.windows_on(current_date))):
+                # Start from the requested time if it's the same day, otherwise from start of working hours
+                start_of_window = midnight + timedelta(seconds=window_start)
+                if current_date == search_start.date():
+                    start_of_window = max(search_start, start_of_window)
+
+                first_slot = _round_up_to_interval(start_of_window)
+
+                # Evaluate the whole window at once when the candidates sit on the grid
+                # (wall-clock quanta, so not on the days the clocks change)
+                if self.visit_type and grid.supports(first_slot, duration_minutes) and self.clock.local_day(current_date)[1]:
+                    runs.append(self._free_slots_on_day(grid, first_slot, midnight + timedelta(seconds=window_end), duration_minutes))
+                else:
+                    runs.append(self._scan_day(first_slot, window_end, duration_minutes))
+
+            if len(runs) == 1:
+                yield from runs[0]
+            elif runs:
+                yield from _merge_unique(runs)
+
+            current_date += timedelta(days=1)
+
+    def _scan_day(self, first_slot: datetime, day_end: int, duration_minutes: int) -> Iterator[datetime]:
+        """
+        Evaluate the day's candidates one by one from `first_slot` until a slot
+        would end after `day_end` (seconds since midnight). Candidates are integer
+        offsets from local midnight; only available slots become datetimes.
+        """
+
+        day = first_slot.date()
+        midnight = datetime.combine(day, time())
+        midnight_instant, uniform = self.clock.local_day(day)
+
+        duration = duration_minutes * MICROSECONDS_PER_MINUTE
+        step = SLOT_INTERVAL_MINUTES * MICROSECONDS_PER_MINUTE
+        day_length = 86400 * MICROSECONDS_PER_SECOND
+        offset = (first_slot - midnight) // timedelta(microseconds=1)
+        last_offset = day_end * MICROSECONDS_PER_SECOND - duration
+
+        while offset <= last_offset:
+            # Working hours by wall-clock time (the end wraps past midnight, as in `check`)
+            if self.schedule.fits_seconds(
+                day, offset / MICROSECONDS_PER_SECOND, (offset + duration) % day_length / MICROSECONDS_PER_SECOND
+            ) and self.visit_type:
+                if uniform:
+                    start = midnight_instant + offset
+                else:
+                    start = self.clock.to_instant(midnight + timedelta(microseconds=offset))
+
+                overlapping = self.appointments.overlapping_entries(start, start + duration)
+                same_start = sum(1 for existing_start, _, _ in overlapping if existing_start == start)
+                if same_start:
+                    is_available = same_start < self.visit_type["max_patients_per_slot"]
+                else:
+                    is_available = not overlapping
+
+                if is_available:
+                    yield midnight + timedelta(microseconds=offset)
+
+            offset += step
+
+    def _ensure_loaded(self, start: datetime, end: datetime) -> None:
+        """Refuse to evaluate slots whose appointments were not downloaded."""
+
+        if self.window and (start < self.window[0] or end > self.window[1]):
+            raise ValueError(
+                f"Slots between {start.isoformat()} and {end.isoformat()} are outside the loaded window "
+                f"{self.window[0].isoformat()} - {self.window[1].isoformat()}"
+            )
+
+    def _free_slots_on_day(
+        self,
+        grid: OccupancyGrid,
+        first_slot: datetime,
+        end_of_day: datetime,
+        duration_minutes: int
+    ) -> Iterator[datetime]:
+        """Free grid-aligned slots from `first_slot` until the slot would run past `end_of_day`."""
+
+        midnight = datetime.combine(first_slot.date(), time())
+        quantum = timedelta(minutes=SLOT_INTERVAL_MINUTES)
+        first_quantum = (first_slot - midnight) // quantum
+        last_quantum = (end_of_day - timedelta(minutes=duration_minutes) - midnight) // quantum
+
+        available = grid.day_availability(
+            first_slot.date(),
+            first_quantum,
+            last_quantum,
+            duration_minutes,
+            self.visit_type["max_patients_per_slot"],
+            self.schedule.windows_on(first_slot.date())
+        )
+        for offset in available.nonzero()[0]:
+            yield first_slot + quantum * int(offset)
+
+    def occupancy_grid(self, first_day: date, days: int) -> OccupancyGrid:
+        """Occupancy grid covering `days` days from `first_day`, reused while it covers the range."""
+
+        if self._grid is None or not self._grid.covers(first_day, days):
+            self._grid = OccupancyGrid(first_day, days, self.appointment_rows, self.clock)
+        return self._grid
+
+class AppointmentIndex:
+    """
+    Sorted interval index over one provider's appointments.
+
+    Rows are parsed once into integer instants (see clinic_time.py) and kept
+    sorted by start. Because no appointment is longer than the longest one seen,
+    every appointment overlapping a window [start, end) starts in
+    (start - longest_duration, end), which two bisections locate in O(log n + k).
+    """
+
+    def __init__(self, appointment_rows: List[Dict], clock: ClinicClock = None):
+        self.clock = clock or clinic_clock()
+        entries = []
+        longest = 0
+        for position, existing in enumerate(appointment_rows):
+            existing_start = self.clock.to_instant(existing["appointment_time"])
+            duration = existing["duration_minutes"] * MICROSECONDS_PER_MINUTE
+            longest = max(longest, duration)
+            entries.append((existing_start, position, existing_start + duration, existing))
+
+        entries.sort(key=lambda entry: (entry[0], entry[1]))
+        self._entries = entries
+        self._starts = [entry[0] for entry in entries]
+        self._longest = longest
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def overlapping_entries(self, start: int, end: int) -> List[Tuple[int, int, Dict]]:
+        """
+        Appointments overlapping the instants [start, end) as (start, end, row) tuples.
+
+        Results keep the order the rows were loaded in, so callers that report
+        "the first conflict" see the same row as a linear scan would.
+        """
+
+        low = bisect_right(self._starts, start - self._longest)
+        high = bisect_left(self._starts, end)
+        hits = [entry for entry in self._entries[low:high] if entry[2] > start]
+        hits.sort(key=lambda entry: entry[1])
+        return [(entry[0], entry[2], entry[3]) for entry in hits]
+
+    def overlapping(self, start: datetime, end: datetime) -> List[Dict]:
+        """Appointment rows overlapping [start, end)."""
+
+        return [existing for _, _, existing in self.overlapping_entries(self.clock.to_instant(start), self.clock.to_instant(end))]
+
+    def starting_at(self, requested_dt: datetime) -> List[Dict]:
+        """Appointment rows starting exactly at `requested_dt`."""
+
+        requested = self.clock.to_instant(requested_dt)
+        low = bisect_left(self._starts, requested)
+        high = bisect_right(self._starts, requested)
+        return [entry[3] for entry in sorted(self._entries[low:high], key=lambda entry: entry[1])]
+
+def search_window(start_from: datetime, max_days_ahead: int = 30) -> Tuple[datetime, datetime]:
+    """
+    Window covering a check at `start_from` plus a slot search of `max_days_ahead`
+    days from it (or from now, if `start_from` is in the past).
+    """
+
+    search_start = max(start_from, local_now())
+    window_end = datetime.combine(search_start.date() + timedelta(days=max_days_ahead + 1), time())
+    return start_from, window_end
+
+def find_earliest_slots_across_providers(
+    supabase: Client,
+    providers: List[Dict],
+    start_from: datetime,
+    duration_minutes: int,
+    appointment_type: str,
+    exclude_appointment_id: str = None,
+    max_days_ahead: int = 30,
+    max_workers: int = 8,
+    deadline: Deadline = NO_DEADLINE
+) -> Dict:
+    """
+    Search several providers concurrently for their earliest available slot.
+
+    Each provider is loaded and searched on its own worker thread, so the total
+    time is bounded by the slowest provider rather than the sum of all of them.
+
+    Args:
+        supabase: Supabase client (shared by the worker threads)
+        providers: Provider rows with at least "id", "full_name" and "specialty"
+        start_from: Earliest acceptable slot
+        duration_minutes: Length of the appointment
+        appointment_type: Visit type name used for capacity checks
+        exclude_appointment_id: Appointment to ignore (the one being rescheduled)
+        max_days_ahead: How far ahead to search per provider
+        max_workers: Upper bound on concurrent provider searches
+        deadline: Time budget; providers not searched in time are reported with
+            "timed_out" and the result gets "partial"
+
+    Returns:
+        Dict with one option per provider and the overall earliest option
+    """
+
+    def search(provider: Dict) -> Dict:
+        option = _provider_option(provider)
+        try:
+            snapshot = ProviderSnapshot.load(
+                supabase, provider["id"], appointment_type, exclude_appointment_id,
+                search_window(start_from, max_days_ahead)
+            )
+            _set_next_available(option, snapshot, start_from, duration_minutes, max_days_ahead, deadline)
+        except Exception as e:
+            option["error"] = str(e)
+        return option
+
+    if not providers:
+        return _earliest_option([], deadline)
+
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(providers)))
+    futures = [executor.submit(search, provider) for provider in providers]
+    done, _ = wait(futures, timeout=deadline.remaining_seconds())
+    # Searches still running finish in the background; their answers are not waited for
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    options = [
+        future.result() if future in done else dict(_provider_option(provider), timed_out=True)
+        for provider, future in zip(providers, futures)
+    ]
+    return _earliest_option(options, deadline)
+
+async def find_earliest_slots_across_providers_async(
+    supabase,
+    providers: List[Dict],
+    start_from: datetime,
+    duration_minutes: int,
+    appointment_type: str,
+    exclude_appointment_id: str = None,
+    max_days_ahead: int = 30,
+    deadline: Deadline = NO_DEADLINE
+) -> Dict:
+    """
+    `find_earliest_slots_across_providers` for the async Supabase client: every
+    provider is loaded concurrently on the event loop instead of on threads.
+    """
+
+    async def search(provider: Dict) -> Dict:
+        option = _provider_option(provider)
+        try:
+            snapshot = await ProviderSnapshot.load_async(
+                supabase, provider["id"], appointment_type, exclude_appointment_id,
+                search_window(start_from, max_days_ahead)
+            )
+            _set_next_available(option, snapshot, start_from, duration_minutes, max_days_ahead, deadline)
+        except Exception as e:
+            option["error"] = str(e)
+        return option
+
+    if not providers:
+        return _earliest_option([], deadline)
+
+    tasks = [asyncio.ensure_future(search(provider)) for provider in providers]
+    done, pending = await asyncio.wait(tasks, timeout=deadline.remaining_seconds())
+    for task in pending:
+        task.cancel()
+
+    options = [
+        task.result() if task in done else dict(_provider_option(provider), timed_out=True)
+        for provider, task in zip(providers, tasks)
+    ]
+    return _earliest_option(options, deadline)
+
+def _provider_option(provider: Dict) -> Dict:
+    return {
+        "provider_id": provider["id"],
+        "provider_name": provider.get("full_name", "Unknown Provider"),
+        "provider_specialty": provider.get("specialty", ""),
+        "next_available": None
+    }
+
+def _set_next_available(
+    option: Dict,
+    snapshot: ProviderSnapshot,
+    start_from: datetime,
+    duration_minutes: int,
+    max_days_ahead: int,
+    deadline: Deadline
+) -> None:
+    slots, complete = snapshot.search_slots(start_from, duration_minutes, 1, max_days_ahead, deadline)
+    option["next_available"] = slots[0] if slots else None
+    if not complete:
+        option["timed_out"] = True
+
+def _earliest_option(options: List[Dict], deadline: Deadline = NO_DEADLINE) -> Dict:
+    available_options = [option for option in options if option["next_available"]]
+    earliest = min(
+        available_options,
+        key=lambda option: clinic_clock().to_instant(option["next_available"]["datetime"]),
+        default=None
+    )
+
+    result = {"provider_options": options, "earliest": earliest}
+    if deadline.bounded:
+        result["partial"] = any(option.get("timed_out") for option in options)
+    return result
+
+def provider_appointments_query(
+    supabase,
+    provider_id: str,
+    exclude_appointment_id: Optional[str],
+    window: Optional[Tuple[datetime, datetime]]
+):
+    """Scheduled appointments of a provider, limited to those that can overlap `window`."""
+
+    query = supabase.table("appointments").select("*").eq("provider_id", provider_id).eq("status", "scheduled")
+
+    if exclude_appointment_id:
+        query = query.neq("id", exclude_appointment_id)
+
+    if window:
+        window_start, window_end = window
+        query = query.gte("appointment_time", (window_start - timedelta(minutes=MAX_APPOINTMENT_MINUTES)).isoformat())
+        query = query.lt("appointment_time", window_end.isoformat())
+
+    return query
+
+def _slot_verdict(
+    requested_dt: datetime,
+    max_patients_per_slot: int,
+    overlapping_appointments: List[Dict],
+    exact_time_appointments: List[Dict],
+    clock: ClinicClock = None
+) -> Tuple[bool, str]:
+    """Turn overlapping/exact-start appointments into an availability verdict."""
+
+    # For appointments at the exact same time, check if we can accommodate more patients
+    if exact_time_appointments:
+        patients_at_same_time = len(exact_time_appointments)
+
+        if patients_at_same_time >= max_patients_per_slot:
+            return False, f"Time slot full: {patients_at_same_time}/{max_patients_per_slot} patients already scheduled at {requested_dt.strftime('%Y-%m-%d %H:%M')}"
+
+        # If there's room, it's available (same time slot, different patients)
+        return True, ""
+
+    # For overlapping but not exact same time, it's a conflict
+    if overlapping_appointments:
+        conflict_time = (clock or clinic_clock()).local_datetime(overlapping_appointments[0]["appointment_time"])
+        return False, f"Conflicts with existing appointment at {conflict_time.strftime('%Y-%m-%d %H:%M')}"
+
+    return True, ""
+
+def _merge_unique(runs: List[Iterator[datetime]]) -> Iterator[datetime]:
+    """Merge sorted slot runs of overlapping windows, each slot once."""
+
+    previous = None
+    for slot in heapq.merge(*runs):
+        if slot != previous:
+            yield slot
+        previous = slot
+
+def _round_up_to_interval(slot: datetime) -> datetime:
+    """Round a datetime up to the next 15-minute boundary (unchanged if already on one)."""
+
+    minutes = slot.minute
+    if minutes % SLOT_INTERVAL_MINUTES != 0:
+        next_quarter = ((minutes // SLOT_INTERVAL_MINUTES) + 1) * SLOT_INTERVAL_MINUTES
+        if next_quarter >= 60:
+            return slot.replace(hour=slot.hour + 1, minute=0, second=0, microsecond=0)
+        return slot.replace(minute=next_quarter, second=0, microsecond=0)
+    return slot
+
+def format_slot(slot: datetime) -> Dict:
+    """Format a slot datetime for the AI agent."""
+
+    return {
+        "datetime": slot.isoformat(),
+        "formatted_datetime": slot.strftime("%Y-%m-%d at %I:%M %p"),
+        "date": slot.strftime("%Y-%m-%d"),
+        "time": slot.strftime("%H:%M"),
+        "weekday": slot.strftime("%A")
+    }
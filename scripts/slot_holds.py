@@ -0,0 +1,197 @@
+import time as monotonic_clock
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime
+from threading import Lock
+from typing import Dict, List, Optional, Set
+
+# How long a slot offered by n7 stays reserved for the caller
+HOLD_TTL_SECONDS = 90
+
+# Timing wheel resolution and size (one revolution = 512 seconds)
+WHEEL_TICK_SECONDS = 1.0
+WHEEL_SIZE = 512
+
+class TimingWheel:
+    """
+    Hashed timing wheel: expiry deadlines are dropped into buckets by tick,
+    and advancing the clock only visits the buckets of the ticks that passed.
+
+    Deadlines further away than one revolution stay in their bucket until a
+    later pass finds them due.
+    """
+
+    def __init__(self, tick_seconds: float = WHEEL_TICK_SECONDS, size: int = WHEEL_SIZE, now: float = 0.0):
+        self.tick_seconds = tick_seconds
+        self.size = size
+        self._buckets: List[Dict[str, float]] = [{} for _ in range(size)]
+        self._current_tick = int(now // tick_seconds)
+
+    def add(self, key: str, deadline: float) -> None:
+        tick = max(int(deadline // self.tick_seconds), self._current_tick)
+        self._buckets[tick % self.size][key] = deadline
+
+    def remove(self, key: str, deadline: float) -> None:
+        tick = max(int(deadline // self.tick_seconds), self._current_tick)
+        self._buckets[tick % self.size].pop(key, None)
+
+    def advance(self, now: float) -> List[str]:
+        """Move the clock to `now` and return the keys whose deadline has passed."""
+
+        now_tick = int(now // self.tick_seconds)
+        if now_tick < self._current_tick:
+            return []
+
+        # Visit each passed tick once (every bucket at most once per call)
+        first_tick = self._current_tick if now_tick - self._current_tick < self.size else now_tick - self.size + 1
+        expired = []
+        for tick in range(first_tick, now_tick + 1):
+            bucket = self._buckets[tick % self.size]
+            due = [key for key, deadline in bucket.items() if deadline <= now]
+            for key in due:
+                del bucket[key]
+            expired.extend(due)
+        self._current_tick = now_tick
+        return expired
+
+class HoldStore(ABC):
+    """
+    Where slot holds live. The default keeps them in the worker process;
+    subclass and install with `set_hold_store` to share holds between workers.
+    """
+
+    @abstractmethod
+    def place(self, hold: Dict, ttl_seconds: float = HOLD_TTL_SECONDS) -> str:
+        """Store a hold and return its token."""
+
+    @abstractmethod
+    def peek(self, token: str) -> Optional[Dict]:
+        """Return an unexpired hold without removing it, or None."""
+
+    @abstractmethod
+    def redeem(self, token: str) -> Optional[Dict]:
+        """Remove and return an unexpired hold, or None."""
+
+    @abstractmethod
+    def release_for_appointment(self, appointment_id: str) -> None:
+        """Drop every hold placed for one appointment."""
+
+    @abstractmethod
+    def active_holds(self, provider_id: str) -> List[Dict]:
+        """Unexpired holds on one provider's calendar."""
+
+class InMemoryHoldStore(HoldStore):
+    """Holds kept in this worker process, expired by a timing wheel swept on every call."""
+
+    def __init__(self):
+        self._holds: Dict[str, Dict] = {}
+        self._by_provider: Dict[str, Set[str]] = {}
+        self._by_appointment: Dict[str, Set[str]] = {}
+        self._wheel = TimingWheel(now=monotonic_clock.monotonic())
+        self._lock = Lock()
+
+    def place(self, hold: Dict, ttl_seconds: float = HOLD_TTL_SECONDS) -> str:
+        token = uuid.uuid4().hex
+        with self._lock:
+            self._sweep()
+            hold = dict(hold, token=token, expires_at=monotonic_clock.monotonic() + ttl_seconds)
+            self._holds[token] = hold
+            self._by_provider.setdefault(hold["provider_id"], set()).add(token)
+            self._by_appointment.setdefault(hold["appointment_id"], set()).add(token)
+            self._wheel.add(token, hold["expires_at"])
+        return token
+
+    def peek(self, token: str) -> Optional[Dict]:
+        with self._lock:
+            self._sweep()
+            return self._holds.get(token)
+
+    def redeem(self, token: str) -> Optional[Dict]:
+        with self._lock:
+            self._sweep()
+            if token not in self._holds:
+                return None
+            return self._drop(token)
+
+    def release_for_appointment(self, appointment_id: str) -> None:
+        with self._lock:
+            for token in list(self._by_appointment.get(appointment_id, ())):
+                self._drop(token)
+
+    def active_holds(self, provider_id: str) -> List[Dict]:
+        with self._lock:
+            self._sweep()
+            return [self._holds[token] for token in self._by_provider.get(provider_id, ())]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sweep()
+            return len(self._holds)
+
+    def _sweep(self) -> None:
+        for token in self._wheel.advance(monotonic_clock.monotonic()):
+            if token in self._holds:
+                self._drop(token, in_wheel=False)
+
+    def _drop(self, token: str, in_wheel: bool = True) -> Dict:
+        hold = self._holds.pop(token)
+        if in_wheel:
+            self._wheel.remove(token, hold["expires_at"])
+        for index, key in ((self._by_provider, hold["provider_id"]), (self._by_appointment, hold["appointment_id"])):
+            tokens = index.get(key)
+            tokens.discard(token)
+            if not tokens:
+                del index[key]
+        return hold
+
+# Shared by every script loaded in this worker process
+_hold_store: HoldStore = InMemoryHoldStore()
+
+def get_hold_store() -> HoldStore:
+    return _hold_store
+
+def set_hold_store(store: HoldStore) -> None:
+    """Install another hold store (e.g. one shared by every worker)."""
+
+    global _hold_store
+    _hold_store = store
+
+def hold_slot(
+    appointment: Dict,
+    slot_start: datetime,
+    ttl_seconds: float = HOLD_TTL_SECONDS
+) -> str:
+    """
+    Reserve `slot_start` on the appointment's provider for the caller moving it.
+
+    Returns:
+        Hold token to pass to n8
+    """
+
+    return _hold_store.place({
+        "appointment_id": appointment["id"],
+        "provider_id": appointment["provider_id"],
+        "appointment_type": appointment["type"],
+        "duration_minutes": appointment["duration_minutes"],
+        "slot_start": slot_start.isoformat()
+    }, ttl_seconds)
+
+def held_appointments(provider_id: str, exclude_appointment_id: str = None) -> List[Dict]:
+    """
+    Active holds on a provider, shaped like scheduled appointment rows so the
+    slot engine counts them against capacity and overlap. Holds placed for
+    `exclude_appointment_id` (the caller's own offers) are left out.
+    """
+
+    return [
+        {
+            "id": f"hold-{hold['token']}",
+            "provider_id": hold["provider_id"],
+            "type": hold["appointment_type"],
+            "status": "scheduled",
+            "appointment_time": hold["slot_start"],
+            "duration_minutes": hold["duration_minutes"]
+        }
+        for hold in _hold_store.active_holds(provider_id)
+        if hold["appointment_id"] != exclude_appointment_id
+    ]
@@ -0,0 +1,151 @@
+import asyncio
+import os
+import time as monotonic_clock
+import weakref
+import wmill
+from supabase import create_client, Client
+from threading import Lock, Thread
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# Windmill resource holding the Supabase URL and key
+SUPABASE_RESOURCE = "u/gregory/supabase"
+
+# How long a warm worker trusts the resource before fetching it again (picks up rotated keys)
+RESOURCE_TTL_SECONDS = 300
+
+class ClientPool:
+    """
+    One Supabase client per worker process, reused by every warm invocation.
+
+    The client's HTTP session keeps its connections alive (HTTP/2, so concurrent
+    queries from the slot search threads share one multiplexed connection), so
+    only the first invocation pays the resource fetch, client construction and
+    TLS handshake. A new client is built when the resource changes or after
+    `invalidate`.
+    """
+
+    def __init__(self, resource_path: str = SUPABASE_RESOURCE, ttl_seconds: float = RESOURCE_TTL_SECONDS):
+        self.resource_path = resource_path
+        self.ttl_seconds = ttl_seconds
+        self._config: Optional[Dict] = None
+        self._config_loaded_at = 0.0
+        self._client: Optional[Client] = None
+        self._client_key: Optional[Tuple] = None
+        # Async clients are bound to the event loop they were built on: one per running loop
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = Lock()
+
+    def get(self, factory: Callable[[str, str], Client] = create_client) -> Client:
+        """
+        The shared client, built with `factory(url, key)` on first use.
+
+        Args:
+            factory: Client constructor (the calling script passes its own
+                `create_client`, so a script-level replacement is honoured)
+        """
+
+        with self._lock:
+            config = self._resource()
+            key = (config["url"], config["key"], factory)
+            if self._client is None or self._client_key != key:
+                self._client = factory(config["url"], config["key"])
+                self._client_key = key
+            return self._client
+
+    async def get_async(self, factory: Callable[[str, str], Awaitable[Any]]) -> Any:
+        """
+        The async client shared by the coroutines of the running event loop,
+        built with `await factory(url, key)` on first use.
+
+        Concurrent first calls on one loop wait for the same construction.
+
+        Args:
+            factory: Async client constructor (the calling script passes its own
+                `acreate_client`)
+        """
+
+        loop = asyncio.get_running_loop()
+        if self._resource_stale():
+            # Fetching the resource is a blocking HTTP call: keep it off the event loop
+            await asyncio.to_thread(self.resource)
+        with self._lock:
+            config = self._resource()
+            key = (config["url"], config["key"], factory)
+            cached = self._async_clients.get(loop)
+            if cached is None or cached[0] != key:
+                cached = (key, loop.create_task(factory(config["url"], config["key"])))
+                self._async_clients[loop] = cached
+
+        try:
+            return await cached[1]
+        except Exception:
+            with self._lock:
+                if self._async_clients.get(loop) is cached:
+                    del self._async_clients[loop]
+            raise
+
+    def invalidate(self) -> None:
+        """Drop the clients and the resource (e.g. after rotating the key)."""
+
+        with self._lock:
+            self._config = None
+            self._client = None
+            self._client_key = None
+            self._async_clients.clear()
+
+    def resource(self) -> Dict:
+        """The Supabase resource (fetched when missing or older than the TTL)."""
+
+        with self._lock:
+            return self._resource()
+
+    def _resource_stale(self) -> bool:
+        return self._config is None or monotonic_clock.monotonic() - self._config_loaded_at >= self.ttl_seconds
+
+    def _resource(self) -> Dict:
+        """The Supabase resource, fetched again once it is older than the TTL (lock held)."""
+
+        if self._resource_stale():
+            self._config = wmill.get_resource(self.resource_path)
+            self._config_loaded_at = monotonic_clock.monotonic()
+        return self._config
+
+# Shared by every script loaded in this worker process
+supabase_pool = ClientPool()
+
+def get_supabase_client(factory: Callable[[str, str], Client] = create_client) -> Client:
+    """Supabase client shared by warm invocations of every script in this worker."""
+
+    return supabase_pool.get(factory)
+
+async def get_async_supabase_client(factory: Callable[[str, str], Awaitable[Any]]) -> Any:
+    """Async Supabase client shared by the concurrent calls served on the running event loop."""
+
+    return await supabase_pool.get_async(factory)
+
+def prewarm_supabase() -> Client:
+    """
+    Build the shared client and open its connection before the first call arrives.
+
+    One bulk read of the reference tables opens the connection (TLS handshake
+    included) and fills the reference data cache at the same time.
+    """
+
+    from reference_data import providers, visit_types
+
+    supabase = get_supabase_client()
+    visit_types.all(supabase)
+    providers.all(supabase)
+    return supabase
+
+def _prewarm_in_background() -> None:
+    try:
+        prewarm_supabase()
+    except Exception:
+        # The first invocation builds the client itself
+        supabase_pool.invalidate()
+
+# Dedicated workers can pre-warm on import with SUPABASE_PREWARM=1 (in the background,
+# so importing never waits on the network)
+if os.environ.get("SUPABASE_PREWARM") == "1":
+    Thread(target=_prewarm_in_background, daemon=True).start()
@@ -0,0 +1,76 @@
+-- Atomic reschedule for n8 (reschedule_appointment.py with atomic=True)
+--
+-- Optional. Requires sql/availability_rpc.sql (slot_conflict_reason) and
+-- sql/availability_recurrence.sql. Providers with recurring availability rows
+-- get {"engine_only": true} and n8 moves their appointments itself. The new
+-- slot is re-validated and the appointment moved in one transaction, so two
+-- callers offered the same slot by n7 cannot both take it. The loser gets a
+-- structured conflict instead of an overbooked slot.
+--
+-- Concurrency:
+--   1. a transaction-scoped advisory lock per provider serializes moves onto
+--      that provider's calendar; other providers are not blocked
+--   2. the appointment row is locked and its appointment_time must still be
+--      p_expected_time, the value the caller read (optimistic version check)
+--   3. working hours, max_patients_per_slot and overlap are then checked
+--      against committed rows, exactly as n7 checks them
+--
+-- Install with the Supabase SQL editor or `psql -f sql/atomic_reschedule.sql`.
+
+create or replace function public.reschedule_appointment_atomic(
+    p_appointment_id public.appointments.id%type,
+    p_new_time timestamp,
+    p_expected_time timestamp,
+    p_notes text
+) returns jsonb
+language plpgsql volatile
+as $$
+declare
+    v_appointment public.appointments%rowtype;
+    v_reason text;
+begin
+    select * into v_appointment from public.appointments where id = p_appointment_id;
+    if not found then
+        return jsonb_build_object('success', false, 'conflict', false, 'conflict_reason', 'Appointment not found');
+    end if;
+
+    if public.provider_has_recurring_hours(v_appointment.provider_id) then
+        return jsonb_build_object('engine_only', true);
+    end if;
+
+    perform pg_advisory_xact_lock(hashtextextended('appointments:' || v_appointment.provider_id::text, 0));
+
+    -- Re-read under the locks: another transaction may have moved it meanwhile
+    select * into v_appointment from public.appointments where id = p_appointment_id for update;
+
+    if v_appointment.status <> 'scheduled' then
+        return jsonb_build_object(
+            'success', false, 'conflict', true,
+            'conflict_reason', 'Appointment is no longer scheduled (status: ' || v_appointment.status || ')'
+        );
+    end if;
+
+    if p_expected_time is not null and v_appointment.appointment_time is distinct from p_expected_time then
+        return jsonb_build_object(
+            'success', false, 'conflict', true,
+            'conflict_reason', 'Appointment was changed by another request'
+        );
+    end if;
+
+    v_reason := public.slot_conflict_reason(
+        v_appointment.provider_id, v_appointment.type, p_new_time,
+        v_appointment.duration_minutes, v_appointment.id
+    );
+    if v_reason is not null then
+        return jsonb_build_object('success', false, 'conflict', true, 'conflict_reason', v_reason);
+    end if;
+
+    update public.appointments
+       set appointment_time = p_new_time,
+           notes = p_notes
+     where id = p_appointment_id
+    returning * into v_appointment;
+
+    return jsonb_build_object('success', true, 'conflict', false, 'conflict_reason', '', 'appointment', to_jsonb(v_appointment));
+end;
+$$;
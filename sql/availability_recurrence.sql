@@ -0,0 +1,43 @@
+-- Recurring availability rows (alternating weeks, "first and third Friday")
+--
+-- Adds three optional columns to availability. A row with neither set is a
+-- plain weekly row, as before:
+--   recurrence        an RFC 5545 RRULE, e.g. FREQ=WEEKLY;INTERVAL=2;BYDAY=FR or
+--                     FREQ=MONTHLY;BYDAY=1FR,3FR (the rule picks the dates, so
+--                     weekday is not used)
+--   recurrence_start  the rule's DTSTART: first date it may apply and the phase
+--                     of INTERVAL > 1 (defaults to 2024-01-01)
+--   week_parity       'even' or 'odd': the row's weekday in weeks with an even or
+--                     odd ISO week number only (a 53-week year has two odd
+--                     weeks in a row; use an RRULE with INTERVAL=2 for a strict
+--                     alternation)
+--
+-- The slot engine (scripts/recurrence.py) expands the rules. The availability
+-- and atomic reschedule functions answer {"engine_only": true} for providers
+-- with such rows, and the scripts then use the engine instead.
+--
+-- Install before sql/availability_rpc.sql, with the Supabase SQL editor or
+-- `psql -f sql/availability_recurrence.sql`.
+
+alter table public.availability
+    add column if not exists recurrence text,
+    add column if not exists recurrence_start date,
+    add column if not exists week_parity text;
+
+alter table public.availability drop constraint if exists availability_week_parity_check;
+alter table public.availability
+    add constraint availability_week_parity_check
+    check (week_parity is null or (week_parity in ('even', 'odd') and recurrence is null));
+
+-- Whether the provider has rows only the slot engine can expand
+create or replace function public.provider_has_recurring_hours(
+    p_provider_id public.appointments.provider_id%type
+) returns boolean
+language sql stable
+as $$
+    select exists (
+        select 1 from public.availability a
+        where a.provider_id = p_provider_id
+          and (a.recurrence is not null or a.week_parity is not null)
+    );
+$$;
@@ -0,0 +1,190 @@
+-- Server-side availability check for n7 (check_appointment_availability.py)
+--
+-- Optional. When installed, the script calls check_slot_availability through
+-- supabase.rpc and gets the verdict plus the next free slots in one round-trip.
+-- When it is missing the script falls back to its client-side slot engine.
+-- Requires sql/availability_recurrence.sql: providers with recurring
+-- availability rows get {"engine_only": true} and are checked by the engine.
+--
+-- The rules mirror slot_engine.ProviderSnapshot.check:
+--   1. the provider must have an availability row for the weekday (1-7, Monday=1)
+--   2. the slot must start and end inside one of that weekday's windows
+--   3. the visit type must exist
+--   4. appointments starting at exactly the same time are allowed up to
+--      max_patients_per_slot; any other overlapping appointment is a conflict
+--
+-- Install with the Supabase SQL editor or `psql -f sql/availability_rpc.sql`.
+
+create index if not exists appointments_provider_time_idx
+    on public.appointments (provider_id, appointment_time)
+    where status = 'scheduled';
+
+-- Returns NULL when the slot is available, otherwise the reason it is not
+create or replace function public.slot_conflict_reason(
+    p_provider_id public.appointments.provider_id%type,
+    p_appointment_type text,
+    p_requested timestamp,
+    p_duration_minutes integer,
+    p_exclude_appointment_id public.appointments.id%type default null
+) returns text
+language plpgsql stable
+as $$
+declare
+    v_requested_end timestamp := p_requested + make_interval(mins => p_duration_minutes);
+    v_weekday integer := extract(isodow from p_requested)::integer;
+    v_max_patients integer;
+    v_exact integer;
+    v_conflict timestamp;
+begin
+    if not exists (
+        select 1 from public.availability a
+        where a.provider_id = p_provider_id and a.weekday = v_weekday
+    ) then
+        return 'Provider not available on ' || to_char(p_requested, 'FMDay');
+    end if;
+
+    if not exists (
+        select 1 from public.availability a
+        where a.provider_id = p_provider_id
+          and a.weekday = v_weekday
+          and a.start_time <= p_requested::time
+          and v_requested_end::time <= a.end_time
+    ) then
+        return 'Requested time is outside provider''s working hours';
+    end if;
+
+    select vt.max_patients_per_slot into v_max_patients
+    from public.visit_types vt
+    where vt.name = p_appointment_type
+    limit 1;
+
+    if not found then
+        return 'Invalid appointment type: ' || p_appointment_type;
+    end if;
+
+    -- Appointments at the exact same time share the slot up to capacity
+    select count(*) into v_exact
+    from public.appointments ap
+    where ap.provider_id = p_provider_id
+      and ap.status = 'scheduled'
+      and (p_exclude_appointment_id is null or ap.id <> p_exclude_appointment_id)
+      and ap.appointment_time = p_requested
+      and ap.appointment_time < v_requested_end
+      and ap.appointment_time + make_interval(mins => ap.duration_minutes) > p_requested;
+
+    if v_exact > 0 then
+        if v_exact >= v_max_patients then
+            return format(
+                'Time slot full: %s/%s patients already scheduled at %s',
+                v_exact, v_max_patients, to_char(p_requested, 'YYYY-MM-DD HH24:MI')
+            );
+        end if;
+        return null;
+    end if;
+
+    -- Any other overlap is a conflict
+    select ap.appointment_time into v_conflict
+    from public.appointments ap
+    where ap.provider_id = p_provider_id
+      and ap.status = 'scheduled'
+      and (p_exclude_appointment_id is null or ap.id <> p_exclude_appointment_id)
+      and ap.appointment_time < v_requested_end
+      and ap.appointment_time + make_interval(mins => ap.duration_minutes) > p_requested
+    order by ap.appointment_time
+    limit 1;
+
+    if found then
+        return 'Conflicts with existing appointment at ' || to_char(v_conflict, 'YYYY-MM-DD HH24:MI');
+    end if;
+
+    return null;
+end;
+$$;
+
+-- Verdict for the requested slot plus up to p_max_alternatives free slots
+-- (15-minute steps, earliest first) when it is taken. Candidates are checked
+-- day by day in time order and the search stops as soon as enough are free,
+-- so a slot found on the first day costs one day of checks, not thirty.
+create or replace function public.check_slot_availability(
+    p_provider_id public.appointments.provider_id%type,
+    p_appointment_type text,
+    p_requested timestamp,
+    p_duration_minutes integer,
+    p_exclude_appointment_id public.appointments.id%type default null,
+    p_max_alternatives integer default 1,
+    p_max_days_ahead integer default 30,
+    p_now timestamp default localtimestamp
+) returns jsonb
+language plpgsql stable
+as $$
+declare
+    v_reason text;
+    v_search_start timestamp := greatest(p_requested, p_now);
+    v_wanted integer := greatest(p_max_alternatives, 1);
+    v_day timestamp;
+    v_slot timestamp;
+    v_alternatives jsonb := '[]'::jsonb;
+    v_found integer := 0;
+begin
+    if public.provider_has_recurring_hours(p_provider_id) then
+        return jsonb_build_object('engine_only', true);
+    end if;
+
+    v_reason := public.slot_conflict_reason(
+        p_provider_id, p_appointment_type, p_requested, p_duration_minutes, p_exclude_appointment_id
+    );
+
+    if v_reason is null then
+        return jsonb_build_object('available', true, 'conflict_reason', '', 'alternatives', '[]'::jsonb);
+    end if;
+
+    <<days>>
+    for v_day in
+        select day.d
+        from generate_series(
+            v_search_start::date::timestamp,
+            (v_search_start::date + p_max_days_ahead)::timestamp,
+            interval '1 day'
+        ) as day(d)
+    loop
+        -- The day's candidates in time order (windows may overlap, hence distinct)
+        for v_slot in
+            select distinct candidate.slot
+            from public.availability a
+            -- Same day: start from the requested time, otherwise from the start of working hours
+            cross join lateral (
+                select case
+                    when v_day::date = v_search_start::date then greatest(v_search_start, v_day + a.start_time)
+                    else v_day + a.start_time
+                end as first_candidate
+            ) f
+            -- Round up to the next 15-minute boundary
+            cross join lateral (
+                select case
+                    when extract(minute from f.first_candidate)::integer % 15 = 0 then f.first_candidate
+                    else date_trunc('hour', f.first_candidate)
+                         + ((extract(minute from f.first_candidate)::integer / 15) + 1) * interval '15 minutes'
+                end as first_slot
+            ) r
+            cross join lateral generate_series(
+                r.first_slot,
+                v_day + a.end_time - make_interval(mins => p_duration_minutes),
+                interval '15 minutes'
+            ) as candidate(slot)
+            where a.provider_id = p_provider_id
+              and a.weekday = extract(isodow from v_day)::integer
+            order by candidate.slot
+        loop
+            if public.slot_conflict_reason(
+                p_provider_id, p_appointment_type, v_slot, p_duration_minutes, p_exclude_appointment_id
+            ) is null then
+                v_alternatives := v_alternatives || to_jsonb(to_char(v_slot, 'YYYY-MM-DD"T"HH24:MI:SS'));
+                v_found := v_found + 1;
+                exit days when v_found >= v_wanted;
+            end if;
+        end loop;
+    end loop;
+
+    return jsonb_build_object('available', false, 'conflict_reason', v_reason, 'alternatives', v_alternatives);
+end;
+$$;
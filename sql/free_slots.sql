@@ -0,0 +1,158 @@
+-- Materialized free slots for n7 (check_appointment_availability.py)
+--
+-- Optional. One row per provider, 15-minute slot and visit type, holding how
+-- many more patients of that visit type can start there (with the visit type's
+-- default duration) and, when none can, the reason n7 would report.
+--
+-- Keeping the table in step is off the request path:
+--   1. a trigger on appointments marks the days an insert, move, cancellation
+--      or delete touches stale in free_slot_days, in the writing transaction
+--   2. scripts/rebuild_free_slots.py with stale_only=true (scheduled every
+--      minute or so) recomputes the stale days; without it (nightly) it
+--      regenerates the whole horizon and reports drift
+--   3. both write through replace_free_slots, which replaces a provider's days
+--      in one transaction and only marks a day fresh if nothing was written to
+--      it since the rows were computed
+-- n7 reads the table only when called with use_free_slots=true, trusts only
+-- days that are materialized and not stale, and falls back to the live
+-- computation whenever the table cannot answer exactly.
+--
+-- Install with the Supabase SQL editor or `psql -f sql/free_slots.sql`.
+
+create table if not exists public.free_slots (
+    provider_id uuid not null references public.providers (id) on delete cascade,
+    slot_date date not null,
+    slot_start timestamp not null,
+    visit_type text not null,
+    duration_minutes integer not null,
+    remaining_capacity integer not null,
+    conflict_reason text not null default '',
+    refreshed_at timestamp not null default localtimestamp,
+    primary key (provider_id, visit_type, slot_start)
+);
+
+-- "Next free slot" scans only rows that still have room
+create index if not exists free_slots_open_idx
+    on public.free_slots (provider_id, visit_type, slot_start)
+    where remaining_capacity > 0;
+
+-- Per-day refreshes replace a provider's rows for a set of days
+create index if not exists free_slots_day_idx
+    on public.free_slots (provider_id, slot_date);
+
+-- One row per provider and materialized day. A day's free_slots rows are
+-- trusted only while its row exists and is not stale; version grows with every
+-- appointment write touching the day
+create table if not exists public.free_slot_days (
+    provider_id uuid not null references public.providers (id) on delete cascade,
+    slot_date date not null,
+    version bigint not null default 0,
+    stale boolean not null default true,
+    refreshed_at timestamp,
+    primary key (provider_id, slot_date)
+);
+
+-- Stale-only refreshes find their work without scanning fresh days
+create index if not exists free_slot_days_stale_idx
+    on public.free_slot_days (slot_date)
+    where stale;
+
+create or replace function public.mark_free_slot_days_stale(
+    p_provider_id uuid,
+    p_start timestamp,
+    p_duration_minutes integer
+) returns void
+language sql volatile
+as $$
+    insert into public.free_slot_days (provider_id, slot_date, version, stale)
+    select p_provider_id, day::date, 1, true
+      from generate_series(
+               p_start::date,
+               (p_start + make_interval(mins => p_duration_minutes))::date,
+               interval '1 day'
+           ) as day
+    on conflict (provider_id, slot_date) do update
+        set version = public.free_slot_days.version + 1,
+            stale = true;
+$$;
+
+create or replace function public.free_slot_days_on_appointment_write() returns trigger
+language plpgsql
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public.mark_free_slot_days_stale(old.provider_id, old.appointment_time, old.duration_minutes);
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public.mark_free_slot_days_stale(new.provider_id, new.appointment_time, new.duration_minutes);
+    end if;
+    return null;
+end;
+$$;
+
+drop trigger if exists appointments_free_slot_days on public.appointments;
+create trigger appointments_free_slot_days
+    after insert or delete or update of provider_id, appointment_time, duration_minutes, type, status
+    on public.appointments
+    for each row execute function public.free_slot_days_on_appointment_write();
+
+-- Replaces the rows of a provider's days in one transaction. p_days holds the
+-- version of each day the caller read before computing p_rows; a day written
+-- to since then keeps its rows and stays stale for the next refresh. Returns
+-- the days replaced.
+create or replace function public.replace_free_slots(
+    p_provider_id uuid,
+    p_days jsonb,
+    p_rows jsonb
+) returns jsonb
+language plpgsql volatile
+as $$
+declare
+    v_days date[];
+begin
+    -- Days never materialized get a stale row, so a concurrent appointment
+    -- write always has a row to bump
+    insert into public.free_slot_days (provider_id, slot_date)
+    select p_provider_id, d.slot_date
+      from jsonb_to_recordset(p_days) as d(slot_date date, version bigint)
+     order by d.slot_date
+    on conflict (provider_id, slot_date) do nothing;
+
+    -- Lock the days (in date order) so no appointment write can mark one stale
+    -- between the version check and the end of this transaction
+    select coalesce(array_agg(f.slot_date), '{}') into v_days
+      from (
+          select f.slot_date, f.version
+            from public.free_slot_days f
+           where f.provider_id = p_provider_id
+             and f.slot_date in (select d.slot_date from jsonb_to_recordset(p_days) as d(slot_date date, version bigint))
+           order by f.slot_date
+             for update
+      ) f
+      join jsonb_to_recordset(p_days) as d(slot_date date, version bigint)
+        on d.slot_date = f.slot_date and d.version = f.version;
+
+    delete from public.free_slots
+     where provider_id = p_provider_id
+       and slot_date = any(v_days);
+
+    insert into public.free_slots (
+        provider_id, slot_date, slot_start, visit_type, duration_minutes, remaining_capacity, conflict_reason
+    )
+    select p_provider_id, r.slot_date, r.slot_start, r.visit_type, r.duration_minutes,
+           r.remaining_capacity, coalesce(r.conflict_reason, '')
+      from jsonb_to_recordset(p_rows) as r(
+               slot_date date, slot_start timestamp, visit_type text,
+               duration_minutes integer, remaining_capacity integer, conflict_reason text
+           )
+     where r.slot_date = any(v_days);
+
+    update public.free_slot_days
+       set stale = false,
+           refreshed_at = localtimestamp
+     where provider_id = p_provider_id
+       and slot_date = any(v_days);
+
+    return to_jsonb(v_days);
+end;
+$$;
@@ -0,0 +1,10 @@
+-- Index for n5 (get_patient_appointments.py)
+--
+-- n5 filters patients by date of birth and a case-insensitive name match on
+-- the server. With this index Postgres reads only the patients sharing the
+-- date of birth, so the lookup stays flat as the clinic grows.
+--
+-- Install with the Supabase SQL editor or `psql -f sql/patient_lookup.sql`.
+
+create index if not exists patients_dob_name_idx
+    on public.patients (date_of_birth, lower(full_name));
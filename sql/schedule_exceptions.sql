@@ -0,0 +1,35 @@
+-- Dated schedule exceptions for the slot engine (scripts/schedule_cache.py)
+--
+-- Optional. Each row changes one date's working hours on top of the weekly
+-- `availability` rows:
+--   kind 'closed' without times   the provider is off all day (holiday, leave)
+--   kind 'closed' with times      the provider is off for that part of the day
+--   kind 'open' with times        extra hours on that date
+-- A row with a null provider_id applies to every provider (clinic holiday).
+--
+-- The scripts read it only when SCHEDULE_EXCEPTIONS=1 is set. The availability
+-- RPC, the atomic reschedule RPC and the free_slots table know only the weekly
+-- hours, so for a provider with exceptions in the searched range n7 and n8
+-- answer with the client-side slot engine. Anything that edits these rows
+-- should call schedule_cache.update_schedule_exception(before, after).
+--
+-- Install with the Supabase SQL editor or `psql -f sql/schedule_exceptions.sql`.
+
+create table if not exists public.schedule_exceptions (
+    id uuid primary key default gen_random_uuid(),
+    provider_id uuid references public.providers (id) on delete cascade,
+    exception_date date not null,
+    start_time time,
+    end_time time,
+    kind text not null default 'closed',
+    note text,
+    created_at timestamp not null default localtimestamp,
+    check (kind in ('closed', 'open')),
+    check ((start_time is null) = (end_time is null)),
+    check (start_time is null or start_time < end_time),
+    check (kind = 'closed' or start_time is not null)
+);
+
+-- Workers read the upcoming exceptions; n7 and n8 ask whether a provider has any in a range
+create index if not exists schedule_exceptions_date_idx
+    on public.schedule_exceptions (exception_date, provider_id);
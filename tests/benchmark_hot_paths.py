@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the availability, lookup and reschedule hot paths.
+
+Each scenario is a synthetic clinic (providers, patients, appointments per
+provider and booking density). Every operation runs against it on a cold
+worker (process caches cleared) and is reported with its wall time, Supabase
+round-trips, rows and bytes returned, and peak memory. The database is the
+in-memory mock from the tests, so wall time is the scripts' own work plus the
+mock's filtering; --latency-ms adds a simulated network delay per round-trip.
+Results are written as JSON; pass a previous run with --compare to list
+regressions (the exit status is 1 when there are any).
+
+    PYTHONPATH=scripts:tests python tests/benchmark_hot_paths.py --output bench.json
+    PYTHONPATH=scripts:tests python tests/benchmark_hot_paths.py --compare bench.json
+"""
+
+import argparse
+import copy
+import json
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from unittest import mock
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import build_mock_data, next_weekday
+from test_free_slots import MockStoreTable, StoreSupabase
+from availability_rpc import reset_rpc_detection
+from free_slots import reset_free_slots_detection
+from patient_lookup import invalidate_patient_lookups
+from prefetch import invalidate_prefetched
+from reference_data import invalidate_reference_data
+from schedule_cache import invalidate_provider_schedule
+import check_appointment_availability
+import get_patient_appointments
+import reschedule_appointment
+
+# Synthetic clinics, smallest first
+SCENARIOS = [
+    {"name": "small", "providers": 5, "patients": 200, "appointments_per_provider": 60, "density": 0.25},
+    {"name": "medium", "providers": 25, "patients": 2000, "appointments_per_provider": 200, "density": 0.5},
+    {"name": "large", "providers": 100, "patients": 10000, "appointments_per_provider": 500, "density": 0.8}
+]
+
+# Working hours of every synthetic provider (Monday to Friday)
+WORKDAY_START_HOUR = 9
+WORKDAY_END_HOUR = 17
+SLOTS_PER_DAY = (WORKDAY_END_HOUR - WORKDAY_START_HOUR) * 4
+
+# A run is a regression when a metric grows by more than this factor over the previous run
+DEFAULT_THRESHOLD = 1.25
+
+# Metrics compared between runs (wall time is noisy, so only its median)
+COMPARED_METRICS = ("wall_ms_median", "round_trips", "bytes", "peak_memory_kib")
+
+class MeteredTable(MockStoreTable):
+    """Mock table that also counts the bytes of every response and write payload."""
+    def execute(self):
+        response = super().execute()
+        operation, payload = self.operation
+        self.client.bytes_transferred += _json_size(response.data)
+        if payload is not None:
+            self.client.bytes_transferred += _json_size(payload)
+        return response
+
+class MeteredSupabase(StoreSupabase):
+    """Mock Supabase client with round-trip, row and byte counters."""
+    def __init__(self, mock_data, latency: float = 0.0):
+        super().__init__(mock_data, latency)
+        self.bytes_transferred = 0
+
+    def table(self, table_name):
+        self.tables.append(table_name)
+        return MeteredTable(self, table_name)
+
+def build_clinic(scenario: dict, seed: int = 7) -> dict:
+    """Synthetic clinic for a scenario; the same seed always gives the same rows."""
+    rng = random.Random(seed)
+    monday = next_weekday(1)
+    visit_types = build_mock_data()["visit_types"]
+    days_needed = math.ceil(scenario["appointments_per_provider"] / (scenario["density"] * SLOTS_PER_DAY))
+    workdays = [day for day in (monday + timedelta(days=offset) for offset in range(days_needed * 7 // 5 + 7)) if day.weekday() < 5]
+
+    providers, availability, appointments = [], [], []
+    patients = [
+        {"id": f"patient-{index}", "full_name": f"Patient {index:05d}", "email": f"patient{index}@example.com",
+         "phone": f"555-{index:07d}", "date_of_birth": (datetime(1940, 1, 1) + timedelta(days=index * 7 % 25000)).date().isoformat()}
+        for index in range(scenario["patients"])
+    ]
+
+    for index in range(scenario["providers"]):
+        provider_id = f"provider-{index}"
+        providers.append({"id": provider_id, "role": "MD", "full_name": f"Dr. Provider {index}", "specialty": f"Specialty {index % 5}"})
+        for weekday in range(1, 6):
+            availability.append({
+                "id": f"av-{index}-{weekday}", "provider_id": provider_id, "weekday": weekday,
+                "start_time": f"{WORKDAY_START_HOUR:02d}:00:00", "end_time": f"{WORKDAY_END_HOUR:02d}:00:00"
+            })
+
+        # Book `density` of each working day's quarter hours until the provider has enough appointments
+        booked = 0
+        for day in workdays:
+            quarters = rng.sample(range(SLOTS_PER_DAY), round(scenario["density"] * SLOTS_PER_DAY))
+            for quarter in sorted(quarters):
+                if booked >= scenario["appointments_per_provider"]:
+                    break
+                appointments.append({
+                    "id": f"apt-{index}-{booked}", "type": "Follow-Up", "status": "scheduled",
+                    "patient_id": f"patient-{rng.randrange(scenario['patients'])}", "provider_id": provider_id,
+                    "appointment_time": (day.replace(hour=WORKDAY_START_HOUR) + timedelta(minutes=15 * quarter)).isoformat(),
+                    "duration_minutes": 15, "notes": ""
+                })
+                booked += 1
+
+    return {"visit_types": visit_types, "providers": providers, "availability": availability,
+            "patients": patients, "appointments": appointments}
+
+def operations(clinic: dict) -> list:
+    """(name, function of a client) for every hot path, with inputs picked from the clinic."""
+    appointment = clinic["appointments"][len(clinic["appointments"]) // 2]
+    provider_id = appointment["provider_id"]
+    booked_at = datetime.fromisoformat(appointment["appointment_time"])
+    patient = next(row for row in clinic["patients"] if row["id"] == appointment["patient_id"])
+    first_day = next_weekday(1).replace(hour=WORKDAY_START_HOUR)
+    # The reschedule target is picked once, outside the measured call
+    free_time = check_appointment_availability.find_next_available_slot(
+        MeteredSupabase(clinic), provider_id, first_day, 15, "Follow-Up")["datetime"]
+
+    return [
+        ("check_time_availability", lambda client: check_appointment_availability.check_time_availability(
+            client, provider_id, booked_at, 15, "Follow-Up")),
+        ("find_next_available_slot", lambda client: check_appointment_availability.find_next_available_slot(
+            client, provider_id, first_day, 15, "Follow-Up")),
+        ("get_patient_appointments.main", lambda client: _run_script(
+            get_patient_appointments, client, patient["full_name"], patient["date_of_birth"])),
+        ("reschedule_appointment.main", lambda client: _run_script(
+            reschedule_appointment, client, appointment["id"], free_time))
+    ]
+
+def cold_worker() -> None:
+    """Forget everything a warm Windmill worker would have cached."""
+    invalidate_patient_lookups()
+    invalidate_reference_data()
+    invalidate_provider_schedule()
+    invalidate_prefetched()
+    reset_rpc_detection()
+    reset_free_slots_detection()
+
+def measure(clinic: dict, operation, repeats: int, latency: float = 0.0) -> dict:
+    """Metrics of one operation: wall time over `repeats` cold runs, then counters and peak memory from one more."""
+    wall_ms = []
+    for _ in range(repeats):
+        client = MeteredSupabase(copy.deepcopy(clinic), latency)
+        cold_worker()
+        start = time.perf_counter()
+        operation(client)
+        wall_ms.append((time.perf_counter() - start) * 1000)
+
+    # Counters are the same on every run; tracemalloc slows the call, so it is not timed
+    client = MeteredSupabase(copy.deepcopy(clinic), latency)
+    cold_worker()
+    tracemalloc.start()
+    try:
+        operation(client)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "wall_ms_median": round(statistics.median(wall_ms), 3),
+        "wall_ms_min": round(min(wall_ms), 3),
+        "round_trips": client.query_count + client.rpc_count,
+        "rows": client.rows_transferred,
+        "bytes": client.bytes_transferred,
+        "peak_memory_kib": round(peak / 1024, 1)
+    }
+
+def run_benchmarks(scenarios: list = SCENARIOS, repeats: int = 5, latency_ms: float = 0.0) -> dict:
+    """Measure every operation in every scenario."""
+    results = []
+    for scenario in scenarios:
+        clinic = build_clinic(scenario)
+        for name, operation in operations(clinic):
+            metrics = measure(clinic, operation, repeats, latency_ms / 1000)
+            results.append({"scenario": scenario["name"], "operation": name} | metrics)
+            print(f"{scenario['name']:>8} {name:<32} {metrics['wall_ms_median']:>9.2f} ms "
+                  f"{metrics['round_trips']:>3} round-trips {metrics['bytes']:>10} B {metrics['peak_memory_kib']:>9.1f} KiB")
+
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "repeats": repeats,
+        "latency_ms": latency_ms,
+        "scenarios": scenarios,
+        "results": results
+    }
+
+def compare_results(previous: dict, current: dict, threshold: float = DEFAULT_THRESHOLD) -> list:
+    """Metrics that grew by more than `threshold` since `previous`, as readable lines."""
+    before = {(row["scenario"], row["operation"]): row for row in previous["results"]}
+    regressions = []
+    for row in current["results"]:
+        old = before.get((row["scenario"], row["operation"]))
+        if old is None:
+            continue
+        for metric in COMPARED_METRICS:
+            if metric in old and row[metric] > old[metric] * threshold and row[metric] > old[metric]:
+                regressions.append(f"{row['scenario']} {row['operation']}: {metric} {old[metric]} -> {row[metric]}")
+    return regressions
+
+def _run_script(module, client, *args):
+    # The conftest `run_main` fixture, for runs outside pytest
+    with mock.patch.object(module, "create_client", lambda url, key: client):
+        return module.main(*args)
+
+def _json_size(data) -> int:
+    # What PostgREST would send: the rows as JSON
+    return len(json.dumps(data, default=str).encode())
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenarios", default=",".join(scenario["name"] for scenario in SCENARIOS),
+                        help="comma-separated scenario names")
+    parser.add_argument("--repeats", type=int, default=5, help="timed runs per operation")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="simulated latency per round-trip")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="previous results to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed growth factor per metric")
+    args = parser.parse_args()
+
+    names = args.scenarios.split(",")
+    unknown = set(names) - {scenario["name"] for scenario in SCENARIOS}
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    results = run_benchmarks([scenario for scenario in SCENARIOS if scenario["name"] in names], args.repeats, args.latency_ms)
+
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare_results(json.load(previous), results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+        print(f"No regressions against {args.compare}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
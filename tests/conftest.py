@@ -0,0 +1,55 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+@pytest.fixture(autouse=True)
+def fresh_process_caches():
+    """Each test builds its own mock clinic, so data cached by a previous test must not leak in."""
+    try:
+        from schedule_cache import invalidate_provider_schedule
+        from reference_data import invalidate_reference_data
+        from patient_lookup import invalidate_patient_lookups
+        from slot_holds import InMemoryHoldStore, set_hold_store
+        from prefetch import invalidate_prefetched
+    except ImportError:
+        yield
+        return
+    invalidate_provider_schedule()
+    invalidate_reference_data()
+    invalidate_patient_lookups()
+    invalidate_prefetched()
+    set_hold_store(InMemoryHoldStore())
+    try:
+        # Needs wmill, which the test modules replace with a mock
+        from supabase_client import supabase_pool
+        supabase_pool.invalidate()
+    except ImportError:
+        pass
+    yield
+    invalidate_provider_schedule()
+    invalidate_reference_data()
+    invalidate_patient_lookups()
+    invalidate_prefetched()
+
+@pytest.fixture
+def run_main(monkeypatch):
+    """Call a script's main() with `client` as the Supabase client it creates."""
+    def run(module, client, *args, **kwargs):
+        with monkeypatch.context() as patch:
+            patch.setattr(module, "create_client", lambda url, key: client)
+            return module.main(*args, **kwargs)
+    return run
+
+@pytest.fixture
+def clinic_defaults(monkeypatch):
+    """A UTC clinic without schedule exceptions, whatever CLINIC_TIMEZONE and SCHEDULE_EXCEPTIONS the shell sets."""
+    import clinic_time
+    import schedule_cache
+    monkeypatch.setattr(clinic_time, "CLINIC_TIMEZONE", "UTC")
+    monkeypatch.setattr(schedule_cache, "SCHEDULE_EXCEPTIONS_ENABLED", False)
+    clinic_time.clinic_clock.cache_clear()
+    yield
+    clinic_time.clinic_clock.cache_clear()
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import asyncio
+import copy
+import os
+import sys
+import time
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, next_weekday
+from test_free_slots import StoreSupabase, store_data
+from test_reference_data import PlainSupabase, clinic_with_patients
+
+# The async scripts also import the async client constructor (other test modules may have
+# installed a supabase mock without it)
+supabase_module = sys.modules["supabase"]
+if not hasattr(supabase_module, "acreate_client"):
+    supabase_module.acreate_client = None
+    supabase_module.AsyncClient = type
+
+from atomic_reschedule import reset_reschedule_rpc_detection
+from availability_rpc import reset_rpc_detection
+from free_slots import lookup_free_slots_async, rebuild_free_slots, reset_free_slots_detection
+from patient_lookup import invalidate_patient_lookups
+from reference_data import invalidate_reference_data
+import check_appointment_availability
+import check_appointment_availability_async
+import get_patient_appointments
+import get_patient_appointments_async
+import reschedule_appointment
+import reschedule_appointment_async
+
+class AsyncQuery:
+    """Async view of a sync mock query: filters pass through, execute is awaited."""
+    def __init__(self, client, query):
+        self.client = client
+        self.query = query
+
+    def __getattr__(self, name):
+        method = getattr(self.query, name)
+
+        def call(*args, **kwargs):
+            result = method(*args, **kwargs)
+            return self if result is self.query else result
+        return call
+
+    async def execute(self):
+        self.client.in_flight += 1
+        self.client.max_in_flight = max(self.client.max_in_flight, self.client.in_flight)
+        try:
+            if self.client.latency:
+                await asyncio.sleep(self.client.latency)
+            return self.query.execute()
+        finally:
+            self.client.in_flight -= 1
+
+class AsyncRpc:
+    def __init__(self, client, function_name, params):
+        self.client = client
+        self.function_name = function_name
+        self.params = params
+
+    async def execute(self):
+        if self.client.latency:
+            await asyncio.sleep(self.client.latency)
+        return self.client.sync.rpc(self.function_name, self.params).execute()
+
+class AsyncSupabase:
+    """Mock async Supabase client over a sync mock, with non-blocking latency per round-trip."""
+    def __init__(self, sync, latency: float = 0.0):
+        self.sync = sync
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def table(self, table_name):
+        return AsyncQuery(self, self.sync.table(table_name))
+
+    def rpc(self, function_name, params):
+        return AsyncRpc(self, function_name, params)
+
+def run_async_main(module, client, *args, **kwargs):
+    async def acreate_client(url, key):
+        return client
+
+    original_acreate_client = module.acreate_client
+    original_create_client = getattr(module, "create_client", None)
+    module.acreate_client = acreate_client
+    if original_create_client is not None:
+        # The prefetch load still runs on a thread with the worker's sync client
+        module.create_client = lambda url, key: client.sync
+    try:
+        return asyncio.run(module.main(*args, **kwargs))
+    finally:
+        module.acreate_client = original_acreate_client
+        if original_create_client is not None:
+            module.create_client = original_create_client
+
+def reset_detection():
+    reset_rpc_detection()
+    reset_reschedule_rpc_detection()
+    reset_free_slots_detection()
+
+def without_timestamps(result: dict) -> dict:
+    result = copy.deepcopy(result)
+    result.pop("rescheduled_at", None)
+    result.get("appointment_details", {}).pop("notes", None)
+    return result
+
+def test_async_variants_match_sync(run_main):
+    """The async entry points return exactly what the sync scripts return"""
+    print("=== ASYNC VARIANTS TESTING ===\n")
+
+    mock_data = clinic_with_patients()
+    for name, dob in (("Grace Hopper", "1906-12-09"), ("grace hoper", "1906-12-09"), ("Nobody", "1906-12-09"), ("Grace Hopper", "09/12/1906")):
+        for client_class in (CountingSupabase, PlainSupabase):
+            invalidate_patient_lookups()
+            invalidate_reference_data()
+            expected = run_main(get_patient_appointments, client_class(mock_data), name, dob)
+            invalidate_patient_lookups()
+            invalidate_reference_data()
+            assert run_async_main(get_patient_appointments_async, AsyncSupabase(client_class(mock_data)), name, dob) == expected, (name, client_class)
+
+    tuesday = next_weekday(2)
+    for appointment_id, preferred, kwargs in (
+        ("fu-single", tuesday.replace(hour=10), {}),
+        ("np-long", tuesday.replace(hour=10), {"max_alternatives": 3}),
+        ("np-long", tuesday.replace(hour=10), {"any_provider": True}),
+        ("vn-1", tuesday.replace(hour=10), {"any_provider": True, "max_alternatives": 2}),
+        ("fu-single", tuesday.replace(hour=7), {}),
+        ("missing", tuesday.replace(hour=10), {}),
+    ):
+        reset_detection()
+        expected = run_main(check_appointment_availability, CountingSupabase(mock_data), appointment_id, preferred.isoformat(), **kwargs)
+        reset_detection()
+        result = run_async_main(check_appointment_availability_async, AsyncSupabase(CountingSupabase(mock_data)),
+                                appointment_id, preferred.isoformat(), **kwargs)
+        assert result == expected, (appointment_id, kwargs)
+
+    new_time = (tuesday + timedelta(days=7)).replace(hour=14)
+    for atomic in (False, True):
+        for client_class in (StoreSupabase, PlainSupabase):
+            sync_data = store_data(with_table=False) | {"patients": clinic_with_patients()["patients"]}
+            async_data = copy.deepcopy(sync_data)
+            reset_detection()
+            expected = run_main(reschedule_appointment, client_class(sync_data), "fu-single", new_time.isoformat(), atomic)
+            reset_detection()
+            result = run_async_main(reschedule_appointment_async, AsyncSupabase(client_class(async_data)),
+                                    "fu-single", new_time.isoformat(), atomic)
+            assert expected["success"], expected
+            assert without_timestamps(result) == without_timestamps(expected), (atomic, client_class)
+            moved = next(row for row in async_data["appointments"] if row["id"] == "fu-single")
+            assert moved["appointment_time"] == new_time.isoformat()
+
+    print("✅ Async n5, n7 and n8 agree with the sync scripts")
+
+def test_free_slots_lookup_on_the_async_client(run_main, clinic_defaults):
+    """Async n7 reads the free_slots table through the async client and answers like sync n7"""
+    print("=== ASYNC FREE SLOTS TESTING ===\n")
+
+    mock_data = store_data()
+    reset_detection()
+    rebuild_free_slots(StoreSupabase(mock_data), days_ahead=50)
+
+    tuesday = next_weekday(2) + timedelta(days=7)
+    appointment = next(row for row in mock_data["appointments"] if row["id"] == "np-long")
+    answered = 0
+    for hour in range(8, 17):
+        preferred = tuesday.replace(hour=hour)
+        reset_rpc_detection()
+        expected = run_main(check_appointment_availability, StoreSupabase(mock_data),
+                            "np-long", preferred.isoformat(), 2, use_free_slots=True)
+        reset_rpc_detection()
+        client = AsyncSupabase(StoreSupabase(mock_data))
+        result = run_async_main(check_appointment_availability_async, client,
+                                "np-long", preferred.isoformat(), 2, use_free_slots=True)
+        assert result == expected, preferred
+        if asyncio.run(lookup_free_slots_async(AsyncSupabase(StoreSupabase(mock_data)), appointment, preferred, 2)) is not None:
+            # Answered from the table: after the appointment, only free_slots reads
+            assert client.sync.tables[0] == "appointments", preferred
+            assert set(client.sync.tables[1:]) == {"free_slots", "free_slot_days"}, preferred
+            answered += 1
+
+    print(f"Answered from the table: {answered}")
+    assert answered > 0
+
+def test_concurrent_calls_share_one_loop(run_main):
+    """Many calls on one event loop overlap their round-trips instead of queueing"""
+    print("=== ASYNC CONCURRENCY TESTING ===\n")
+
+    latency = 0.02
+    calls = 50
+    mock_data = clinic_with_patients()
+
+    sync_client = CountingSupabase(mock_data, latency=latency)
+    start = time.perf_counter()
+    expected = run_main(get_patient_appointments, sync_client, "Grace Hopper", "1906-12-09", False)
+    serial_seconds = (time.perf_counter() - start) * calls
+
+    client = AsyncSupabase(CountingSupabase(mock_data), latency=latency)
+    built = []
+
+    async def acreate_client(url, key):
+        built.append(key)
+        return client
+
+    async def serve():
+        return await asyncio.gather(*(
+            get_patient_appointments_async.main("Grace Hopper", "1906-12-09", False) for _ in range(calls)
+        ))
+
+    original_acreate_client = get_patient_appointments_async.acreate_client
+    get_patient_appointments_async.acreate_client = acreate_client
+    try:
+        start = time.perf_counter()
+        results = asyncio.run(serve())
+        concurrent_seconds = time.perf_counter() - start
+    finally:
+        get_patient_appointments_async.acreate_client = original_acreate_client
+
+    print(f"{calls} calls: serial ~{serial_seconds:.2f}s, concurrent {concurrent_seconds:.2f}s, "
+          f"{client.max_in_flight} round-trips in flight at most")
+    assert all(result == expected for result in results)
+    assert len(built) == 1
+    assert client.max_in_flight == calls
+    assert concurrent_seconds < serial_seconds / 5
+
+    print("✅ One worker serves concurrent calls without a thread per call")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
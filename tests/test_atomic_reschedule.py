@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import build_mock_data, next_weekday, EULER
+from test_availability_rpc import PostgresSupabase, load_database, postgres_connection
+from test_free_slots import StoreSupabase
+from atomic_reschedule import reschedule_atomically, reset_reschedule_rpc_detection
+import reschedule_appointment
+
+SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql", "atomic_reschedule.sql")
+
+def clinic_with_movers() -> dict:
+    """Mock clinic plus appointments on Dr. Euler's third Tuesday that callers will try to move."""
+    mock_data = build_mock_data()
+    third_tuesday = next_weekday(2) + timedelta(days=14)
+    for i in range(6):
+        mock_data["appointments"].append({
+            "id": f"mover-np-{i}", "type": "New Patient", "status": "scheduled", "patient_id": f"patient-np-{i}",
+            "provider_id": EULER, "appointment_time": (third_tuesday.replace(hour=10) + timedelta(minutes=30 * i)).isoformat(),
+            "duration_minutes": 30, "notes": ""
+        })
+        mock_data["appointments"].append({
+            "id": f"mover-fu-{i}", "type": "Follow-Up", "status": "scheduled", "patient_id": f"patient-fu-{i}",
+            "provider_id": EULER, "appointment_time": (third_tuesday.replace(hour=13) + timedelta(minutes=15 * i)).isoformat(),
+            "duration_minutes": 15, "notes": ""
+        })
+    mock_data["appointments"].append({
+        "id": "mover-stale", "type": "New Patient", "status": "scheduled", "patient_id": "patient-stale",
+        "provider_id": EULER, "appointment_time": third_tuesday.replace(hour=15).isoformat(),
+        "duration_minutes": 30, "notes": ""
+    })
+    return mock_data
+
+@pytest.fixture(scope="module")
+def database():
+    connection = postgres_connection()
+    if connection is None:
+        pytest.skip("no Postgres available (set TEST_DATABASE_URL or install pgserver and psycopg)")
+    mock_data = clinic_with_movers()
+    load_database(connection, mock_data)
+    with connection.cursor() as cursor, open(SQL_FILE) as sql:
+        cursor.execute(sql.read())
+    yield connection, mock_data
+    connection.close()
+
+def race(mock_data: dict, appointment_ids: list, new_time: str) -> list:
+    """Move every appointment to `new_time` at once, each caller on its own connection."""
+    by_id = {appointment["id"]: appointment for appointment in mock_data["appointments"]}
+    start = threading.Barrier(len(appointment_ids))
+    outcomes = [None] * len(appointment_ids)
+
+    def caller(index: int, appointment_id: str) -> None:
+        client = PostgresSupabase(mock_data, postgres_connection())
+        start.wait()
+        outcomes[index] = reschedule_atomically(client, by_id[appointment_id], new_time, "moved")
+        client.connection.close()
+
+    threads = [threading.Thread(target=caller, args=(i, appointment_id)) for i, appointment_id in enumerate(appointment_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return outcomes
+
+def test_concurrent_callers_never_overbook(database):
+    """Callers racing for one slot: exactly max_patients_per_slot win, the rest get a conflict"""
+    print("=== ATOMIC RESCHEDULE CONCURRENCY TESTING ===\n")
+
+    connection, mock_data = database
+    second_tuesday = next_weekday(2) + timedelta(days=7)
+    reset_reschedule_rpc_detection()
+
+    for prefix, hour, capacity in (("mover-np", 14, 1), ("mover-fu", 15, 2)):
+        new_time = second_tuesday.replace(hour=hour).isoformat()
+        outcomes = race(mock_data, [f"{prefix}-{i}" for i in range(6)], new_time)
+        winners = [outcome for outcome in outcomes if outcome["success"]]
+        losers = [outcome for outcome in outcomes if not outcome["success"]]
+
+        print(f"{prefix}: {len(winners)} moved, reasons: {sorted({outcome['conflict_reason'] for outcome in losers})}")
+        assert len(winners) == capacity
+        assert all(outcome["conflict"] for outcome in losers)
+        assert all(outcome["appointment"]["appointment_time"] == new_time for outcome in winners)
+        assert all(outcome["atomic"] for outcome in outcomes)
+
+        with connection.cursor() as cursor:
+            cursor.execute("select count(*) from public.appointments where appointment_time = %s and status = 'scheduled'", (new_time,))
+            assert cursor.fetchone()[0] == capacity
+
+def test_stale_read_is_a_conflict(database):
+    """An appointment moved since it was read is not moved again"""
+    print("=== ATOMIC RESCHEDULE VERSION TESTING ===\n")
+
+    connection, mock_data = database
+    client = PostgresSupabase(mock_data, connection)
+    reset_reschedule_rpc_detection()
+    stale = next(appointment for appointment in mock_data["appointments"] if appointment["id"] == "mover-stale")
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=15, minute=30).isoformat()
+
+    first = reschedule_atomically(client, stale, new_time, "moved")
+    second = reschedule_atomically(client, stale, new_time.replace("15:30", "13:00"), "moved again")
+    assert first["success"] and first["atomic"] is True
+    assert second == {"success": False, "conflict": True, "conflict_reason": "Appointment was changed by another request", "atomic": True}
+
+def test_fallback_revalidates_and_checks_version(run_main):
+    """Without the function n8 re-checks the slot, updates only an unchanged row and says the write was not atomic"""
+    print("=== ATOMIC RESCHEDULE FALLBACK TESTING ===\n")
+
+    mock_data = build_mock_data()
+    mock_data["patients"] = []
+    client = StoreSupabase(mock_data)
+    reset_reschedule_rpc_detection()
+    tuesday = next_weekday(2)
+
+    full = run_main(reschedule_appointment, client, "fu-single", tuesday.replace(hour=10).isoformat(), True)
+    assert full["success"] is False and full["conflict"] is True
+    assert full["conflict_reason"].startswith("Time slot full") and full["atomic"] is False
+
+    free_time = (tuesday + timedelta(days=7)).replace(hour=14).isoformat()
+    moved = run_main(reschedule_appointment, client, "fu-single", free_time, True)
+    assert moved["success"] and moved["schedule_change"]["new_datetime"] == free_time
+    assert moved["atomic"] is False
+    assert "atomic" not in run_main(reschedule_appointment, client, "fu-single", free_time.replace("14:00", "14:15"))
+
+    stale = dict(next(appointment for appointment in mock_data["appointments"] if appointment["id"] == "fu-single"))
+    stale["appointment_time"] = (tuesday + timedelta(days=7)).replace(hour=10, minute=45).isoformat()
+    lost = reschedule_atomically(client, stale, free_time.replace("14:00", "15:00"), "")
+    assert lost == {"success": False, "conflict": True, "conflict_reason": "Appointment was changed by another request", "atomic": False}
+    assert client.rpc_count == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
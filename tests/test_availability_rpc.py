@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, MockSupabaseResponse, build_mock_data, next_weekday, EULER, VON_NEUMANN, LOVELACE
+from availability_rpc import check_availability_rpc, reset_rpc_detection
+from slot_engine import ProviderSnapshot
+import check_appointment_availability
+
+SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql", "availability_rpc.sql")
+RECURRENCE_SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "sql", "availability_recurrence.sql")
+
+SCHEMA = """
+drop table if exists public.appointments, public.availability, public.visit_types, public.providers cascade;
+create table public.visit_types (id text primary key, name text, max_patients_per_slot integer, default_duration_minutes integer);
+create table public.providers (id text primary key, role text, full_name text, specialty text);
+create table public.availability (id text primary key, provider_id text, weekday integer, start_time time, end_time time);
+create table public.appointments (
+    id text primary key, patient_id text, provider_id text, appointment_time timestamp,
+    duration_minutes integer, type text, status text, notes text
+);
+"""
+
+_server = None
+
+def postgres_connection():
+    """
+    Local Postgres stand-in: TEST_DATABASE_URL if set, otherwise an embedded
+    server from the `pgserver` package. None when neither is available.
+    """
+    global _server
+
+    try:
+        import psycopg
+    except ImportError:
+        return None
+
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        try:
+            import pgserver
+        except ImportError:
+            return None
+        if _server is None:
+            _server = pgserver.get_server(tempfile.mkdtemp(prefix="rpc-test-"), cleanup_mode="delete")
+        url = _server.get_uri()
+
+    return psycopg.connect(url, autocommit=True)
+
+def load_database(connection, mock_data: dict) -> None:
+    """Create the schema, install the RPC and copy the mock rows in."""
+    with connection.cursor() as cursor:
+        cursor.execute(SCHEMA)
+        for sql_file in (RECURRENCE_SQL_FILE, SQL_FILE):
+            with open(sql_file) as sql:
+                cursor.execute(sql.read())
+        for table, rows in mock_data.items():
+            for row in rows:
+                columns = list(row.keys())
+                cursor.execute(
+                    f"insert into public.{table} ({', '.join(columns)}) values ({', '.join('%s' for _ in columns)})",
+                    [row[column] for column in columns]
+                )
+
+class MockRpcCall:
+    def __init__(self, connection, function_name, params):
+        self.connection = connection
+        self.function_name = function_name
+        self.params = params
+
+    def execute(self):
+        arguments = ", ".join(f"{name} => %({name})s" for name in self.params)
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"select public.{self.function_name}({arguments})", self.params)
+            return MockSupabaseResponse(cursor.fetchone()[0])
+
+class PostgresSupabase(CountingSupabase):
+    """Mock client whose tables are in memory and whose RPCs run in Postgres."""
+    def __init__(self, mock_data, connection):
+        super().__init__(mock_data)
+        self.connection = connection
+
+    def rpc(self, function_name, params):
+        self.rpc_count += 1
+        return MockRpcCall(self.connection, function_name, params)
+
+@pytest.fixture(scope="module")
+def database():
+    connection = postgres_connection()
+    if connection is None:
+        pytest.skip("no Postgres available (set TEST_DATABASE_URL or install pgserver and psycopg)")
+    mock_data = build_mock_data()
+    load_database(connection, mock_data)
+    yield connection, mock_data
+    connection.close()
+
+def test_rpc_matches_client_engine(database):
+    """The SQL function must agree with the client-side engine"""
+    print("=== AVAILABILITY RPC EQUIVALENCE TESTING ===\n")
+
+    connection, mock_data = database
+    client = PostgresSupabase(mock_data, connection)
+    tuesday = next_weekday(2)
+
+    scenarios = [
+        (EULER, "Follow-Up", 15, None),
+        (EULER, "New Patient", 30, None),
+        (EULER, "New Patient", 30, "np-long"),
+        (LOVELACE, "Follow-Up", 15, None),
+        (VON_NEUMANN, "New Patient", 30, None),
+        (EULER, "Annual Physical", 15, None)
+    ]
+
+    for provider_id, visit_type, duration, exclude_id in scenarios:
+        snapshot = ProviderSnapshot.load(CountingSupabase(mock_data), provider_id, visit_type, exclude_id)
+        for day_offset in range(-1, 9):
+            candidate = (tuesday + timedelta(days=day_offset)).replace(hour=8)
+            while candidate < (tuesday + timedelta(days=day_offset)).replace(hour=17, minute=30):
+                reset_rpc_detection()
+                result = check_availability_rpc(client, provider_id, visit_type, candidate, duration, exclude_id, 5)
+                is_available, reason = snapshot.check(candidate, duration)
+
+                assert result["available"] == is_available, candidate
+                assert result["conflict_reason"] == reason, candidate
+                if not is_available:
+                    assert result["alternatives"] == snapshot.find_available_slots(candidate, duration, 5), candidate
+                candidate += timedelta(minutes=20)
+
+    print("✅ RPC verdicts, reasons and alternatives match the engine")
+
+def test_main_uses_rpc_in_one_round_trip(database, run_main, clinic_defaults):
+    """n7 reads the appointment and then makes a single RPC call"""
+    print("=== AVAILABILITY RPC MAIN TESTING ===\n")
+
+    connection, mock_data = database
+    client = PostgresSupabase(mock_data, connection)
+    tuesday = next_weekday(2)
+
+    reset_rpc_detection()
+    result = run_main(check_appointment_availability, client, "fu-single", tuesday.replace(hour=10).isoformat(), max_alternatives=3)
+
+    print(f"Result: {result}")
+    assert result["available"] is False
+    assert len(result["alternatives"]) == 3
+    assert client.query_count == 1 and client.rpc_count == 1
+
+def test_falls_back_when_rpc_missing(run_main):
+    """Without the function the engine answers, and the probe is not repeated"""
+    print("=== AVAILABILITY RPC FALLBACK TESTING ===\n")
+
+    mock_data = build_mock_data()
+    client = CountingSupabase(mock_data)
+    tuesday = next_weekday(2)
+
+    reset_rpc_detection()
+    try:
+        first = run_main(check_appointment_availability, client, "fu-single", tuesday.replace(hour=10).isoformat())
+        second = run_main(check_appointment_availability, client, "fu-single", tuesday.replace(hour=10).isoformat())
+    finally:
+        reset_rpc_detection()
+
+    expected = ProviderSnapshot.load(CountingSupabase(mock_data), EULER, "Follow-Up", "fu-single").find_next(tuesday.replace(hour=10), 15)
+    assert first["next_available"] == second["next_available"] == expected
+    assert client.rpc_count == 1
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
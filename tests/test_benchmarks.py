@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+
+import copy
+import json
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from benchmark_hot_paths import (
+    COMPARED_METRICS, SCENARIOS, MeteredSupabase, build_clinic, cold_worker, compare_results, operations, run_benchmarks
+)
+
+def test_smallest_scenario_reports_every_metric():
+    """The benchmark runs each hot path on a synthetic clinic and reports JSON-ready metrics"""
+    print("=== BENCHMARK SMOKE TESTING ===\n")
+
+    clinic = build_clinic(SCENARIOS[0])
+    appointments_per_provider = len(clinic["appointments"]) / len(clinic["providers"])
+    assert appointments_per_provider == SCENARIOS[0]["appointments_per_provider"]
+    assert build_clinic(SCENARIOS[0]) == clinic
+
+    # Every operation does its job on the synthetic clinic
+    outcomes = {}
+    for name, operation in operations(clinic):
+        cold_worker()
+        outcomes[name] = operation(MeteredSupabase(copy.deepcopy(clinic)))
+    # The checked slot holds one Follow-Up, and two may share it
+    assert outcomes["check_time_availability"] == (True, "")
+    assert outcomes["find_next_available_slot"] is not None
+    assert outcomes["get_patient_appointments.main"]["success"]
+    assert outcomes["reschedule_appointment.main"]["success"]
+
+    results = run_benchmarks(SCENARIOS[:1], repeats=1)
+    json.dumps(results)
+    rows = {row["operation"]: row for row in results["results"]}
+    assert set(rows) == {name for name, _ in operations(clinic)}
+    assert all(row[metric] > 0 for row in rows.values() for metric in COMPARED_METRICS)
+    assert rows["check_time_availability"]["round_trips"] == 3
+    assert rows["get_patient_appointments.main"]["round_trips"] == 2
+    assert rows["reschedule_appointment.main"]["round_trips"] == 2
+
+    print("✅ Benchmark metrics reported")
+
+def test_comparison_flags_regressions():
+    """Only metrics that grew past the threshold are reported"""
+    print("=== BENCHMARK COMPARISON TESTING ===\n")
+
+    row = {"scenario": "small", "operation": "check_time_availability",
+           "wall_ms_median": 1.0, "round_trips": 3, "bytes": 1000, "peak_memory_kib": 20.0}
+    previous = {"results": [row]}
+
+    assert compare_results(previous, {"results": [dict(row, wall_ms_median=1.2)]}) == []
+    regressions = compare_results(previous, {"results": [dict(row, round_trips=4, bytes=900)]})
+    print(regressions)
+    assert regressions == ["small check_time_availability: round_trips 3 -> 4"]
+    assert compare_results(previous, {"results": [dict(row, scenario="medium", round_trips=9)]}) == []
+
+    print("✅ Regressions flagged")
+
+if __name__ == "__main__":
+    test_smallest_scenario_reports_every_metric()
+    test_comparison_flags_regressions()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data, next_weekday
+from availability_rpc import reset_rpc_detection
+from clinic_time import MICROSECONDS_PER_MINUTE, clinic_clock
+from slot_engine import ProviderSnapshot
+import check_appointment_availability
+
+NEW_YORK = "America/New_York"
+
+def clock_change_days(zone_name: str) -> list:
+    """The days within the next year on which the zone's clocks change."""
+    clock = clinic_clock(zone_name)
+    today = date.today()
+    return [today + timedelta(days=offset) for offset in range(1, 366) if not clock.local_day(today + timedelta(days=offset))[1]]
+
+def test_values_normalized_to_instants(run_main, clinic_defaults):
+    """Naive, UTC and offset timestamps of the same moment give one instant"""
+    print("=== CLINIC TIME TESTING ===\n")
+
+    utc = clinic_clock("UTC")
+    moment = utc.to_instant("2030-01-07T14:00:00")
+    assert utc.to_instant("2030-01-07T14:00:00Z") == moment
+    assert utc.to_instant("2030-01-07T16:00:00+02:00") == moment
+    assert utc.to_instant(datetime(2030, 1, 7, 14)) == moment
+    assert utc.to_local(moment + 90 * MICROSECONDS_PER_MINUTE) == datetime(2030, 1, 7, 15, 30)
+
+    new_york = clinic_clock(NEW_YORK)
+    assert new_york.to_instant("2030-01-07T09:00:00") == moment
+    assert new_york.local_datetime("2030-01-07T14:00:00Z") == datetime(2030, 1, 7, 9)
+
+    # Wall-clock times round-trip through instants every 15 minutes across both clock changes
+    change_days = clock_change_days(NEW_YORK)
+    assert len(change_days) == 2
+    for day in change_days:
+        midnight, uniform = new_york.local_day(day)
+        assert not uniform
+        instant = midnight
+        while instant < midnight + 25 * 60 * MICROSECONDS_PER_MINUTE:
+            assert new_york.to_instant(new_york.to_local(instant)) == instant
+            instant += 15 * MICROSECONDS_PER_MINUTE
+
+    # An aware preferred time is compared with the clinic's clock instead of failing
+    mock_data = build_mock_data()
+    preferred = next_weekday(2).replace(hour=11)
+    results = []
+    for text in (preferred.isoformat(), preferred.isoformat() + "Z"):
+        reset_rpc_detection()
+        result = run_main(check_appointment_availability, CountingSupabase(mock_data), "full-1000-0", text, 2)
+        print(f"{text}: available={result.get('available')}")
+        assert result["success"] and result["available"] is False
+        results.append(result)
+    assert results[0]["alternatives"] == results[1]["alternatives"]
+
+    print("✅ Timestamps normalized once at the edges")
+
+def test_overlaps_decided_across_clock_changes():
+    """Appointments that span a clock change end when the clock says, not 60 minutes off"""
+    print("=== DST OVERLAP TESTING ===\n")
+
+    clock = clinic_clock(NEW_YORK)
+    visit_type = {"name": "Follow-Up", "max_patients_per_slot": 1}
+
+    for day in clock_change_days(NEW_YORK):
+        midnight = datetime.combine(day, time())
+        spring = day.month < 7
+        availability = [{"provider_id": "p-night", "weekday": day.weekday() + 1, "start_time": "00:00:00", "end_time": "06:00:00"}]
+        booked = midnight.replace(hour=1, minute=30 if spring else 0)
+        appointments = [{
+            "id": "a-night", "provider_id": "p-night", "status": "scheduled", "type": "Follow-Up",
+            "appointment_time": booked.isoformat(), "duration_minutes": 60 if spring else 90
+        }]
+        snapshot = ProviderSnapshot("p-night", "Follow-Up", availability, visit_type, appointments, clock)
+
+        if spring:
+            # 01:30 EST + 60 minutes is 03:30 EDT
+            assert snapshot.check(midnight.replace(hour=3), 15)[0] is False
+            assert snapshot.check(midnight.replace(hour=3, minute=30), 15)[0] is True
+        else:
+            # 01:00 EDT + 90 minutes is 01:30 EST, long before 02:15
+            assert snapshot.check(midnight.replace(hour=2, minute=15), 15)[0] is True
+
+        # The slot search skips the occupancy grid on these days and agrees with `check`
+        found = [datetime.fromisoformat(slot["datetime"]) for slot in snapshot.find_available_slots(midnight, 15, 100, 0)]
+        expected = [
+            midnight + timedelta(minutes=15 * quantum)
+            for quantum in range(6 * 4)
+            if snapshot.check(midnight + timedelta(minutes=15 * quantum), 15)[0]
+        ]
+        print(f"{day}: {len(found)} free slots before 06:00")
+        assert found == expected
+
+    print("✅ Overlaps follow the clinic's clock")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -184,6 +184,24 @@ class MockSupabaseTable:
         self.filters[field].append(('neq', value))
         return self
     
+    def gt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gt', value))
+        return self
+    
+    def gte(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gte', value))
+        return self
+    
+    def lt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('lt', value))
+        return self
+    
     def execute(self):
         data = self.mock_data.get(self.table_name, [])
         
@@ -199,6 +217,15 @@ class MockSupabaseTable:
                     elif condition_type == 'neq' and item.get(field) == value:
                         include_item = False
                         break
+                    elif condition_type == 'gt' and not (item.get(field) or "") > value:
+                        include_item = False
+                        break
+                    elif condition_type == 'gte' and not (item.get(field) or "") >= value:
+                        include_item = False
+                        break
+                    elif condition_type == 'lt' and not (item.get(field) or "") < value:
+                        include_item = False
+                        break
                 if not include_item:
                     break
             
@@ -207,12 +234,21 @@ class MockSupabaseTable:
         
         return MockSupabaseResponse(filtered_data)
 
+class MockAPIError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
 class MockSupabase:
     def __init__(self, mock_data):
         self.mock_data = mock_data
     
     def table(self, table_name):
         return MockSupabaseTable(table_name, self.mock_data)
+    
+    def rpc(self, function_name, params):
+        # The availability RPC is not installed in the mock database
+        raise MockAPIError(f"Could not find the function public.{function_name}", "PGRST202")
 
 class MockWmill:
     @staticmethod
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data, next_weekday, EULER, VON_NEUMANN
+from test_reference_data import clinic_with_patients
+from availability_rpc import reset_rpc_detection
+from deadline import Deadline
+from slot_engine import ProviderSnapshot, find_earliest_slots_across_providers
+import check_appointment_availability
+import get_patient_appointments
+import reschedule_appointment
+
+class CountdownDeadline(Deadline):
+    """Expires after a fixed number of checks, so cut-off points are deterministic."""
+    def __init__(self, checks: int):
+        super().__init__(budget_ms=60_000)
+        self.checks_left = checks
+
+    def expired(self) -> bool:
+        self.checks_left -= 1
+        return self.checks_left < 0
+
+def test_search_returns_best_so_far():
+    """A scan cut short returns the slots it found, in order, and says it is incomplete"""
+    print("=== DEADLINE SLOT SEARCH TESTING ===\n")
+
+    tuesday = next_weekday(2)
+    snapshot = ProviderSnapshot.load(CountingSupabase(build_mock_data()), EULER, "Follow-Up", None)
+
+    full, complete = snapshot.search_slots(tuesday.replace(hour=10), 15, 1000, 30)
+    assert complete and len(full) > 20
+
+    for days in (0, 1, 3, 8):
+        slots, complete = snapshot.search_slots(tuesday.replace(hour=10), 15, 1000, 30, CountdownDeadline(days))
+        print(f"Cut after {days} days: {len(slots)} slots")
+        assert not complete
+        assert slots == full[:len(slots)]
+    assert snapshot.search_slots(tuesday.replace(hour=10), 15, 1000, 30, CountdownDeadline(0))[0] == []
+    assert 0 < len(snapshot.search_slots(tuesday.replace(hour=10), 15, 1000, 30, CountdownDeadline(8))[0]) < len(full)
+
+    # Providers still loading when the budget runs out are reported, not waited for
+    client = CountingSupabase(build_mock_data(), latency=0.3)
+    providers = [{"id": EULER, "full_name": "Dr. Leonhard Euler"}, {"id": VON_NEUMANN, "full_name": "Dr. John von Neumann"}]
+    start = time.perf_counter()
+    result = find_earliest_slots_across_providers(client, providers, tuesday.replace(hour=10), 30, "New Patient",
+                                                  deadline=Deadline(50))
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.3
+    assert result["partial"] and result["earliest"] is None
+    assert all(option["timed_out"] for option in result["provider_options"])
+
+    print("✅ Search stops at the deadline with the slots found so far")
+
+def test_scripts_answer_within_budget(run_main):
+    """n7 marks partial answers, n5 skips optional stages and n8 never writes late"""
+    print("=== DEADLINE SCRIPT TESTING ===\n")
+
+    mock_data = clinic_with_patients()
+    preferred = next_weekday(2).replace(hour=10).isoformat()
+
+    reset_rpc_detection()
+    expected = run_main(check_appointment_availability, CountingSupabase(mock_data), "np-long", preferred, 3, True)
+    reset_rpc_detection()
+    generous = run_main(check_appointment_availability, CountingSupabase(mock_data), "np-long", preferred, 3, True,
+                        deadline_ms=10_000)
+    assert generous == dict(expected, partial=False)
+
+    # Spent while loading: the preferred time is still answered, the searches are skipped
+    reset_rpc_detection()
+    late = run_main(check_appointment_availability, CountingSupabase(mock_data, latency=0.03), "np-long", preferred, 3, True,
+                    deadline_ms=20)
+    print(f"n7 late: available={late['available']}, alternatives={late['alternatives']}, partial={late['partial']}")
+    assert late["success"] and late["available"] is False and late["partial"] is True
+    assert late["conflict_reason"] == expected["conflict_reason"]
+    assert late["alternatives"] == [] and late["provider_options"] == [] and late["earliest_any_provider"] is None
+
+    exact = run_main(get_patient_appointments, CountingSupabase(mock_data, latency=0.03), "Grace Hopper", "1906-12-09",
+                     deadline_ms=20)
+    assert exact["success"] and exact["partial"] is False and exact["total_appointments"] == 24
+    misspelled = run_main(get_patient_appointments, CountingSupabase(mock_data, latency=0.03), "Grace Hoper", "1906-12-09",
+                          fuzzy_match=True, deadline_ms=20)
+    assert misspelled["success"] is False and misspelled["partial"] is True
+
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14).isoformat()
+    refused = run_main(reschedule_appointment, CountingSupabase(mock_data, latency=0.03), "fu-single", new_time,
+                       deadline_ms=20)
+    assert refused["success"] is False and refused["deadline_exceeded"] is True
+    assert next(row for row in mock_data["appointments"] if row["id"] == "fu-single")["appointment_time"] != new_time
+
+    print("✅ Scripts stay within their budget")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import (
+    CountingSupabase, MockAPIError, MockSupabaseResponse, MockSupabaseTable,
+    build_mock_data, next_weekday, EULER, VON_NEUMANN
+)
+from availability_rpc import reset_rpc_detection
+from prefetch import invalidate_prefetched
+from reference_data import invalidate_reference_data
+from schedule_cache import invalidate_provider_schedule
+from free_slots import (
+    lookup_free_slots, rebuild_free_slots, refresh_free_slots, refresh_stale_free_slots,
+    reset_free_slots_detection, _day_versions, _replace_days
+)
+import check_appointment_availability
+import reschedule_appointment
+
+FREE_SLOTS_KEY = ("provider_id", "visit_type", "slot_start")
+
+class MockStoreTable(MockSupabaseTable):
+    """Mock table that also supports the writes and paging free_slots.py uses."""
+    def __init__(self, client, table_name):
+        super().__init__(client, table_name)
+        self.operation = ("select", None)
+        self.row_limit = None
+        self.offset = 0
+
+    def in_(self, field, values):
+        self.filters.append(lambda item: item.get(field) in values)
+        return self
+
+    def lte(self, field, value):
+        self.filters.append(lambda item: item.get(field) <= value)
+        return self
+
+    def order(self, field):
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def range(self, start, end):
+        self.offset, self.row_limit = start, end - start + 1
+        return self
+
+    def upsert(self, rows):
+        self.operation = ("upsert", rows)
+        return self
+
+    def update(self, data):
+        self.operation = ("update", data)
+        return self
+
+    def delete(self):
+        self.operation = ("delete", None)
+        return self
+
+    def execute(self):
+        if self.table_name not in self.client.mock_data:
+            raise MockAPIError(f"Could not find the table 'public.{self.table_name}' in the schema cache", "PGRST205")
+
+        operation, payload = self.operation
+        if operation == "select":
+            response = super().execute()
+            rows = sorted(response.data, key=lambda item: (item.get("slot_start", ""), item.get("visit_type", "")))
+            end = None if self.row_limit is None else self.offset + self.row_limit
+            return MockSupabaseResponse([dict(item) for item in rows[self.offset:end]])
+
+        self.client.query_count += 1
+        table = self.client.mock_data[self.table_name]
+        if operation == "upsert":
+            stored = {tuple(item[key] for key in FREE_SLOTS_KEY): index for index, item in enumerate(table)}
+            for row in payload:
+                key = tuple(row[k] for k in FREE_SLOTS_KEY)
+                if key in stored:
+                    table[stored[key]] = dict(row)
+                else:
+                    stored[key] = len(table)
+                    table.append(dict(row))
+            return MockSupabaseResponse(payload)
+
+        matches = [item for item in table if all(f(item) for f in self.filters)]
+        before = [dict(item) for item in matches]
+        if operation == "update":
+            for item in matches:
+                item.update(payload)
+        else:
+            table[:] = [item for item in table if item not in matches]
+        if self.table_name == "appointments":
+            mark_days_stale(self.client.mock_data, before + matches)
+        return MockSupabaseResponse([dict(item) for item in matches])
+
+class MockRpcCall:
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self):
+        return MockSupabaseResponse(self.result)
+
+class StoreSupabase(CountingSupabase):
+    def table(self, table_name):
+        self.tables.append(table_name)
+        return MockStoreTable(self, table_name)
+
+    def rpc(self, function_name, params):
+        if function_name != "replace_free_slots" or "free_slot_days" not in self.mock_data:
+            return super().rpc(function_name, params)
+        self.rpc_count += 1
+        return MockRpcCall(replace_free_slots(self.mock_data, params))
+
+def manifest_row(mock_data, provider_id, slot_date):
+    """The free_slot_days row of a day, created (stale, version 0) if missing."""
+    for row in mock_data["free_slot_days"]:
+        if row["provider_id"] == provider_id and row["slot_date"] == slot_date:
+            return row
+    row = {"provider_id": provider_id, "slot_date": slot_date, "version": 0, "stale": True}
+    mock_data["free_slot_days"].append(row)
+    return row
+
+def mark_days_stale(mock_data, appointments):
+    """What the appointments trigger in sql/free_slots.sql does for the rows before and after a write."""
+    if "free_slot_days" not in mock_data:
+        return
+    for appointment in appointments:
+        start = datetime.fromisoformat(appointment["appointment_time"])
+        end = start + timedelta(minutes=appointment["duration_minutes"])
+        day = start.date()
+        while day <= end.date():
+            row = manifest_row(mock_data, appointment["provider_id"], day.isoformat())
+            row["version"] += 1
+            row["stale"] = True
+            day += timedelta(days=1)
+
+def replace_free_slots(mock_data, params):
+    """What replace_free_slots in sql/free_slots.sql does in its transaction."""
+    provider_id = params["p_provider_id"]
+    replaced = [
+        day["slot_date"] for day in params["p_days"]
+        if manifest_row(mock_data, provider_id, day["slot_date"])["version"] == day["version"]
+    ]
+    mock_data["free_slots"][:] = [
+        row for row in mock_data["free_slots"] if row["provider_id"] != provider_id or row["slot_date"] not in replaced
+    ]
+    mock_data["free_slots"].extend(dict(row) for row in params["p_rows"] if row["slot_date"] in replaced)
+    for slot_date in replaced:
+        manifest_row(mock_data, provider_id, slot_date)["stale"] = False
+    return replaced
+
+def store_data(with_table: bool = True) -> dict:
+    mock_data = build_mock_data()
+    mock_data["patients"] = []
+    if with_table:
+        mock_data["free_slots"] = []
+        mock_data["free_slot_days"] = []
+    return mock_data
+
+def test_lookup_matches_live_computation(run_main):
+    """Answers from the table are exactly what n7 computes live, or the script falls back"""
+    print("=== FREE SLOTS LOOKUP TESTING ===\n")
+
+    mock_data = store_data()
+    client = StoreSupabase(mock_data)
+    reset_free_slots_detection()
+    report = rebuild_free_slots(client, days_ahead=50)
+    print(f"Materialized {report['rows']} rows")
+    assert report["rows"] > 0
+
+    tuesday = next_weekday(2)
+    monday = next_weekday(1)
+    answered = 0
+
+    for appointment_id, days in (("fu-single", (tuesday, tuesday + timedelta(days=7))),
+                                 ("np-long", (tuesday, tuesday + timedelta(days=7))),
+                                 ("vn-1", (monday, monday + timedelta(days=7)))):
+        appointment = next(row for row in mock_data["appointments"] if row["id"] == appointment_id)
+        for day in days:
+            candidate = day.replace(hour=8)
+            while candidate < day.replace(hour=17):
+                for max_alternatives in (1, 3):
+                    reset_rpc_detection()
+                    live = run_main(check_appointment_availability, CountingSupabase(mock_data),
+                                    appointment_id, candidate.isoformat(), max_alternatives)
+                    from_store = run_main(check_appointment_availability, client,
+                                          appointment_id, candidate.isoformat(), max_alternatives, use_free_slots=True)
+                    assert from_store == live, (appointment_id, candidate, max_alternatives)
+                    if lookup_free_slots(client, appointment, candidate, max_alternatives) is not None:
+                        answered += 1
+                candidate += timedelta(minutes=15)
+
+    print(f"Answered from the table: {answered}")
+    assert answered > 100
+    reset_rpc_detection()
+
+def test_lookup_is_indexed(run_main, clinic_defaults):
+    """A free slot costs two indexed lookups (the slot and its day) after reading the appointment"""
+    print("=== FREE SLOTS ROUND-TRIP TESTING ===\n")
+
+    client = StoreSupabase(store_data())
+    reset_free_slots_detection()
+    rebuild_free_slots(client, days_ahead=50)
+
+    free_slot = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+    client.query_count = client.rpc_count = 0
+    result = run_main(check_appointment_availability, client, "np-long", free_slot.isoformat(), use_free_slots=True)
+
+    assert result["available"] is True
+    assert client.query_count == 3 and client.rpc_count == 0
+
+def test_reschedule_leaves_maintenance_to_the_refresh(run_main):
+    """n8 does no free_slots work; its days turn stale until the stale-only refresh catches up"""
+    print("=== FREE SLOTS MAINTENANCE TESTING ===\n")
+
+    mock_data = store_data()
+    client = StoreSupabase(mock_data)
+    reset_free_slots_detection()
+    rebuild_free_slots(client, days_ahead=50)
+
+    fu_single = next(row for row in mock_data["appointments"] if row["id"] == "fu-single")
+    old_slot = (next_weekday(2) + timedelta(days=7)).replace(hour=10, minute=45)
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+
+    # Cold (process caches and the table's detection forgotten) and warm, n8 reads and
+    # writes the appointment only
+    for target, detection in ((new_time + timedelta(days=1), "cold"), (new_time, "warm")):
+        if detection == "cold":
+            invalidate_reference_data()
+            invalidate_provider_schedule()
+            invalidate_prefetched()
+            reset_rpc_detection()
+            reset_free_slots_detection()
+        client.query_count = client.rpc_count = 0
+        result = run_main(reschedule_appointment, client, "fu-single", target.isoformat())
+        print(f"Reschedule ({detection}): {result.get('message', result.get('error'))}, "
+              f"{client.query_count + client.rpc_count} round-trips")
+        assert result["success"] and "free_slots_refreshed" not in result
+        assert client.query_count + client.rpc_count == 2
+        assert set(client.tables[-2:]) == {"appointments"}
+
+    # The days it touched are stale, so n7 computes them live
+    stale = {(row["provider_id"], row["slot_date"]) for row in mock_data["free_slot_days"] if row["stale"]}
+    assert stale == {(EULER, day.date().isoformat()) for day in (new_time, new_time + timedelta(days=1))}
+    assert lookup_free_slots(client, fu_single, new_time) is None
+    assert rebuild_free_slots(client, days_ahead=50, dry_run=True)["drift_detected"]
+
+    report = refresh_stale_free_slots(client, days_ahead=50)
+    assert (report["stale_days"], report["refreshed_days"], report["providers"]) == (2, 2, 1)
+    assert not rebuild_free_slots(client, days_ahead=50, dry_run=True)["drift_detected"]
+    assert not any(row["stale"] for row in mock_data["free_slot_days"])
+
+    rows = {(row["visit_type"], row["slot_start"]): row for row in mock_data["free_slots"] if row["provider_id"] == EULER}
+    assert rows[("Follow-Up", old_slot.isoformat())]["remaining_capacity"] == 2
+    assert rows[("Follow-Up", new_time.isoformat())]["remaining_capacity"] == 1
+    assert rows[("New Patient", new_time.isoformat())]["remaining_capacity"] == 0
+
+def test_refresh_skips_days_written_meanwhile(run_main):
+    """A day an appointment write touches while its rows are computed stays stale"""
+    print("=== FREE SLOTS CONCURRENT REFRESH TESTING ===\n")
+
+    mock_data = store_data()
+    client = StoreSupabase(mock_data)
+    reset_free_slots_detection()
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+    other_day = new_time.date() + timedelta(days=1)
+
+    # A refresh reads the versions, then n8 moves an appointment before the rows are written
+    versions = _day_versions(client, EULER, [new_time.date(), other_day])
+    assert run_main(reschedule_appointment, client, "fu-single", new_time.isoformat())["success"]
+    assert _replace_days(client, EULER, versions, []) == [other_day]
+
+    fu_single = next(row for row in mock_data["appointments"] if row["id"] == "fu-single")
+    assert lookup_free_slots(client, fu_single, new_time) is None
+    assert refresh_free_slots(client, EULER, [new_time.date()]) == [new_time.date()]
+    assert lookup_free_slots(client, fu_single, new_time - timedelta(hours=1)) is not None
+
+def test_rebuild_reports_and_repairs_drift():
+    """Missing, stale and mismatched rows are counted, then fixed"""
+    print("=== FREE SLOTS REBUILD TESTING ===\n")
+
+    mock_data = store_data()
+    client = StoreSupabase(mock_data)
+    reset_free_slots_detection()
+    rebuild_free_slots(client, days_ahead=20)
+
+    table = mock_data["free_slots"]
+    table.pop(0)
+    table[0]["remaining_capacity"] += 1
+    off_grid = datetime.fromisoformat(table[1]["slot_start"]) + timedelta(minutes=7)
+    table.append({**table[1], "slot_start": off_grid.isoformat()})
+
+    report = rebuild_free_slots(client, days_ahead=20, dry_run=True)
+    print(f"Drift: {report['missing']} missing, {report['stale']} stale, {report['mismatched']} mismatched")
+    assert (report["missing"], report["stale"], report["mismatched"]) == (1, 1, 1)
+
+    rebuild_free_slots(client, days_ahead=20)
+    assert not rebuild_free_slots(client, days_ahead=20, dry_run=True)["drift_detected"]
+
+def test_missing_table_falls_back_once(run_main):
+    """Without the table n7 computes live and stops probing for it"""
+    print("=== FREE SLOTS FALLBACK TESTING ===\n")
+
+    client = StoreSupabase(store_data(with_table=False))
+    reset_free_slots_detection()
+    appointment = next(row for row in client.mock_data["appointments"] if row["id"] == "vn-1")
+    requested = next_weekday(1).replace(hour=9)
+
+    assert lookup_free_slots(client, appointment, requested + timedelta(days=7)) is None
+    queries = client.query_count
+    assert lookup_free_slots(client, appointment, requested + timedelta(days=14)) is None
+    assert client.query_count == queries
+
+    assert refresh_free_slots(client, VON_NEUMANN, [requested.date()]) is None
+    assert refresh_stale_free_slots(client)["installed"] is False
+    assert client.query_count == queries
+
+    result = run_main(reschedule_appointment, client, "vn-1", (requested + timedelta(hours=2)).isoformat())
+    assert result["success"]
+    assert next(row for row in client.mock_data["appointments"] if row["id"] == "vn-1")["provider_id"] == VON_NEUMANN
+    reset_free_slots_detection()
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -10,6 +10,7 @@ This test demonstrates the full end-to-end workflow:
 5. System reschedules appointment (n8)
 """
 
+import re
 import sys
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
@@ -111,6 +112,24 @@ MOCK_DATA = {
     ]
 }
 
+def like_regex(pattern: str):
+    """Translate an SQL ILIKE pattern into a case-insensitive regex."""
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
 class MockSupabaseResponse:
     def __init__(self, data):
         self.data = data
@@ -143,6 +162,30 @@ class MockSupabaseTable:
         self.update_data = data
         return self
     
+    def gt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gt', value))
+        return self
+    
+    def gte(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gte', value))
+        return self
+    
+    def ilike(self, field, pattern):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('ilike', pattern))
+        return self
+    
+    def lt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('lt', value))
+        return self
+    
     def execute(self):
         data = self.mock_data.get(self.table_name, [])
         
@@ -185,6 +228,18 @@ class MockSupabaseTable:
                     elif condition_type == 'neq' and item.get(field) == value:
                         include_item = False
                         break
+                    elif condition_type == 'gt' and not (item.get(field) or "") > value:
+                        include_item = False
+                        break
+                    elif condition_type == 'gte' and not (item.get(field) or "") >= value:
+                        include_item = False
+                        break
+                    elif condition_type == 'lt' and not (item.get(field) or "") < value:
+                        include_item = False
+                        break
+                    elif condition_type == 'ilike' and not like_regex(value).fullmatch(item.get(field) or ""):
+                        include_item = False
+                        break
                 if not include_item:
                     break
             
@@ -193,12 +248,21 @@ class MockSupabaseTable:
         
         return MockSupabaseResponse(filtered_data)
 
+class MockAPIError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
 class MockSupabase:
     def __init__(self, mock_data):
         self.mock_data = mock_data
     
     def table(self, table_name):
         return MockSupabaseTable(table_name, self.mock_data)
+    
+    def rpc(self, function_name, params):
+        # The availability RPC is not installed in the mock database
+        raise MockAPIError(f"Could not find the function public.{function_name}", "PGRST202")
 
 class MockWmill:
     @staticmethod
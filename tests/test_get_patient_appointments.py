@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 
+import re
 import sys
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Tuple
@@ -145,6 +146,24 @@ MOCK_DATA = {
     ]
 }
 
+def like_regex(pattern: str):
+    """Translate an SQL ILIKE pattern into a case-insensitive regex."""
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
 class MockSupabaseResponse:
     def __init__(self, data):
         self.data = data
@@ -166,6 +185,30 @@ class MockSupabaseTable:
         self.filters[field].append(('eq', value))
         return self
     
+    def gt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gt', value))
+        return self
+    
+    def gte(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gte', value))
+        return self
+    
+    def ilike(self, field, pattern):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('ilike', pattern))
+        return self
+    
+    def lt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('lt', value))
+        return self
+    
     def execute(self):
         data = self.mock_data.get(self.table_name, [])
         
@@ -178,6 +221,18 @@ class MockSupabaseTable:
                     if condition_type == 'eq' and item.get(field) != value:
                         include_item = False
                         break
+                    elif condition_type == 'gt' and not (item.get(field) or "") > value:
+                        include_item = False
+                        break
+                    elif condition_type == 'gte' and not (item.get(field) or "") >= value:
+                        include_item = False
+                        break
+                    elif condition_type == 'lt' and not (item.get(field) or "") < value:
+                        include_item = False
+                        break
+                    elif condition_type == 'ilike' and not like_regex(value).fullmatch(item.get(field) or ""):
+                        include_item = False
+                        break
                 if not include_item:
                     break
             
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, next_weekday
+from test_reference_data import clinic_with_patients
+from availability_rpc import reset_rpc_detection
+from patient_lookup import invalidate_patient_lookups
+from reference_data import invalidate_reference_data
+from schedule_cache import invalidate_provider_schedule
+import check_appointment_availability
+import get_patient_appointments
+import get_patient_availability
+
+def cold_worker():
+    invalidate_patient_lookups()
+    invalidate_reference_data()
+    invalidate_provider_schedule()
+    reset_rpc_detection()
+
+def test_one_call_answers_like_n5_then_n7(run_main):
+    """The composite call returns n5's and n7's answers with one round-trip fewer"""
+    print("=== COMBINED VOICE TURN TESTING ===\n")
+
+    mock_data = clinic_with_patients()
+    preferred = next_weekday(2).replace(hour=10).isoformat()
+
+    for appointment_id, kwargs in ((None, {}), (None, {"max_alternatives": 3, "any_provider": True}), ("fu-single", {})):
+        separate_client = CountingSupabase(mock_data)
+        cold_worker()
+        patient = run_main(get_patient_appointments, separate_client, "Alan Turing" if appointment_id else "Grace Hopper",
+                           "1912-06-23" if appointment_id else "1906-12-09")
+        target = next(a for a in patient["upcoming_appointments"] if a["appointment_id"] == appointment_id) \
+            if appointment_id else patient["next_appointment"]
+        availability = run_main(check_appointment_availability, separate_client, target["appointment_id"], preferred, **kwargs)
+
+        combined_client = CountingSupabase(mock_data)
+        cold_worker()
+        combined = run_main(get_patient_availability, combined_client,
+                            patient["patient_name"], "1912-06-23" if appointment_id else "1906-12-09",
+                            preferred, appointment_id, **kwargs)
+
+        print(f"{target['appointment_id']}: separate {separate_client.query_count} round-trips, combined {combined_client.query_count}")
+        assert combined == dict(patient, target_appointment=target, availability=availability)
+        assert combined_client.query_count == separate_client.query_count - 1
+
+    print("✅ Patient, target appointment and availability in one call")
+
+def test_without_preferred_time_or_unknown_appointment(run_main):
+    """No preferred time returns the target only; an appointment of someone else is refused"""
+    print("=== COMBINED VOICE TURN EDGE CASES ===\n")
+
+    mock_data = clinic_with_patients()
+    client = CountingSupabase(mock_data)
+
+    result = run_main(get_patient_availability, client, "Grace Hopper", "1906-12-09")
+    assert result["success"] and result["name_match"] == "exact"
+    assert result["target_appointment"] == result["next_appointment"]
+    assert "availability" not in result
+
+    result = run_main(get_patient_availability, client, "grace hoper", "1906-12-09",
+                      next_weekday(2).replace(hour=10).isoformat(), fuzzy_match=True)
+    assert result["success"] is False and result["confirmation_required"]
+    assert "target_appointment" not in result and "availability" not in result
+    confirmed = run_main(get_patient_availability, client, "grace hoper", "1906-12-09",
+                         next_weekday(2).replace(hour=10).isoformat(), fuzzy_match=True,
+                         confirmation_token=result["confirmation_token"], phone_last4="0000")
+    assert confirmed["success"] and confirmed["name_match"] == "confirmed" and "availability" in confirmed
+
+    result = run_main(get_patient_availability, client, "Grace Hopper", "1906-12-09",
+                      next_weekday(2).replace(hour=10).isoformat(), "fu-single")
+    assert result["success"] is False and "not one of Grace Hopper's upcoming appointments" in result["error"]
+    assert result["upcoming_appointments"]
+
+    result = run_main(get_patient_availability, client, "Nobody", "1906-12-09", next_weekday(2).isoformat())
+    assert result["success"] is False and "No patient found" in result["error"]
+
+    print("✅ Edge cases answered without checking availability")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import random
+import time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data
+from test_patient_lookup import random_patients
+from name_matching import BKTree, PatientNameIndex, edit_distance, metaphone
+from patient_lookup import name_confirmations
+import get_patient_appointments
+
+def test_phonetic_and_edit_distance():
+    """Metaphone keys sound-alike names together; the BK-tree finds every name a scan would"""
+    print("=== NAME MATCHING TESTING ===\n")
+
+    assert metaphone("Jon") == metaphone("John") == "JN"
+    assert metaphone("Rivera") == metaphone("Riviera") == "RFR"
+    assert metaphone("Smith") == metaphone("Smyth")
+    assert metaphone("Knight") == "NT"
+    assert edit_distance("carlos riviera", "carlos rivera") == 1
+    assert edit_distance("kitten", "sitting", limit=1) == 2
+
+    rng = random.Random(11)
+    words = ["".join(rng.choice("abcdehlmnorst") for _ in range(rng.randrange(3, 9))) for _ in range(1000)]
+    tree = BKTree(words)
+    for query in rng.sample(words, 50) + ["xyz", "anna"]:
+        expected = sorted({(edit_distance(query, word), word) for word in words if edit_distance(query, word) <= 2})
+        assert sorted(tree.search(query, 2)) == expected, query
+
+    print("✅ Phonetic keys and BK-tree search agree with brute force")
+
+def test_candidates_ranked_within_dob():
+    """Only the caller's DOB partition is searched; exact beats phonetic beats spelling"""
+    print("=== NAME CANDIDATE RANKING TESTING ===\n")
+
+    index = PatientNameIndex([
+        {"id": "p1", "full_name": "John Doe", "date_of_birth": "1980-05-15"},
+        {"id": "p2", "full_name": "Joan Dole", "date_of_birth": "1980-05-15"},
+        {"id": "p3", "full_name": "Jon Doe", "date_of_birth": "1990-01-01"},
+        {"id": "p4", "full_name": "Carlos Rivera", "date_of_birth": "1975-03-22"}
+    ])
+
+    ranked = index.candidates("Jon Doe", "1980-05-15")
+    assert [candidate["patient"]["id"] for candidate in ranked] == ["p1", "p2"]
+    assert ranked[0]["phonetic_match"] and ranked[0]["distance"] == 1
+    assert ranked[1]["distance"] == 2 and ranked[0]["score"] < ranked[1]["score"]
+
+    assert index.candidates("john doe", "1980-05-15")[0]["score"] == 0
+    assert index.candidates("Carlos Riviera", "1975-03-22")[0]["patient"]["id"] == "p4"
+    assert index.candidates("Carlos Riviera", "1980-05-15") == []
+    assert index.candidates("Someone Else", "1980-05-15") == []
+
+    print("✅ Candidates are ranked within the DOB partition")
+
+def test_voice_transcripts_resolve_in_n5(run_main):
+    """n5 resolves a near match only once the caller confirms it with their phone digits"""
+    print("=== SPOKEN NAME LOOKUP TESTING ===\n")
+
+    mock_data = build_mock_data()
+    mock_data["patients"] = [
+        {"id": "patient-1", "full_name": "John Doe", "date_of_birth": "1980-05-15", "email": "john@example.com", "phone": "555-0101"},
+        {"id": "patient-2", "full_name": "Carlos Rivera", "date_of_birth": "1975-03-22", "email": "", "phone": ""},
+        {"id": "patient-3", "full_name": "Ann Lee", "date_of_birth": "1960-02-02", "email": "", "phone": "(555) 010-3303"},
+        {"id": "patient-4", "full_name": "Anne Lee", "date_of_birth": "1960-02-02", "email": "", "phone": "555-010-4404"}
+    ]
+    client = CountingSupabase(mock_data)
+
+    exact = run_main(get_patient_appointments, client, "John Doe", "1980-05-15")
+    assert exact["success"] and exact["name_match"] == "exact"
+
+    def ask(spoken, dob):
+        result = run_main(get_patient_appointments, client, spoken, dob, fuzzy_match=True)
+        assert not result["success"] and result["confirmation_required"] and result["name_match"] == "approximate", spoken
+        assert set(result) == {"success", "confirmation_required", "name_match", "confirmation_token", "error"}
+        assert not any(name in result["error"] for name in ("John Doe", "Ann Lee", "Anne Lee")), spoken
+        return result["confirmation_token"]
+
+    def confirm(spoken, dob, token, digits):
+        return run_main(get_patient_appointments, client, spoken, dob, fuzzy_match=True,
+                        confirmation_token=token, phone_last4=digits)
+
+    # A wrong answer is refused; the right one returns the patient
+    token = ask("Jon Doe", "1980-05-15")
+    refused = confirm("Jon Doe", "1980-05-15", token, "9999")
+    assert not refused["success"] and refused["confirmation_failed"] and "patient_name" not in refused
+    confirmed = confirm("Jon Doe", "1980-05-15", token, "0101")
+    assert confirmed["success"] and confirmed["name_match"] == "confirmed" and confirmed["patient_name"] == "John Doe"
+
+    # Two similar names: the digits pick one; a token is single use and bound to its date of birth
+    token = ask("Anna Lee", "1960-02-02")
+    assert not confirm("Anna Lee", "1961-02-02", token, "4404")["success"]
+    assert confirm("Anna Lee", "1960-02-02", token, "44-04")["patient_name"] == "Anne Lee"
+    assert confirm("Anna Lee", "1960-02-02", token, "4404")["confirmation_failed"]
+
+    # Wrong answers use the token up
+    token = ask("Anna Lee", "1960-02-02")
+    for digits in ("1111", "2222", "3333"):
+        assert confirm("Anna Lee", "1960-02-02", token, digits)["confirmation_failed"]
+    assert confirm("Anna Lee", "1960-02-02", token, "3303")["confirmation_failed"]
+    assert len(name_confirmations) == 0
+
+    # No phone number to confirm with, or off by default: a near miss is just not found
+    unconfirmable = run_main(get_patient_appointments, client, "Carlos Riviera", "1975-03-22", fuzzy_match=True)
+    assert not unconfirmable["success"] and "confirmation_required" not in unconfirmable
+    strict = run_main(get_patient_appointments, client, "Jon Doe", "1980-05-15")
+    assert not strict["success"] and "confirmation_required" not in strict
+    assert run_main(get_patient_appointments, client, "Someone Else", "1980-05-15", fuzzy_match=True).get("confirmation_required") is None
+
+    print("✅ Transcribed names are confirmed by phone digits before any record is returned")
+
+def test_large_index_lookup_speed():
+    """Lookups stay fast with partitions denser than a million-patient clinic's"""
+    print("=== NAME INDEX SCALING TESTING ===\n")
+
+    # ~250 patients per date of birth (a million patients over 80 years is ~35)
+    patients = random_patients(50000)
+    for i, patient in enumerate(patients):
+        patient["date_of_birth"] = f"1980-{i % 10 + 1:02d}-{i // 10 % 20 + 1:02d}"
+    index = PatientNameIndex(patients)
+    rng = random.Random(7)
+    targets = rng.sample(patients, 500)
+
+    start = time.perf_counter()
+    for patient in targets:
+        spoken = patient["full_name"].replace("o", "a", 1)
+        ranked = index.candidates(spoken, patient["date_of_birth"])
+        assert any(candidate["patient"]["full_name"] == patient["full_name"] for candidate in ranked)
+    per_lookup_ms = (time.perf_counter() - start) * 1000 / len(targets)
+
+    print(f"Average lookup: {per_lookup_ms:.3f} ms")
+    assert per_lookup_ms < 5
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
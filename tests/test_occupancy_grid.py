@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import random
+from datetime import datetime, timedelta, time
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data, next_weekday, EULER
+from occupancy_grid import QUANTA_PER_DAY
+from slot_engine import ProviderSnapshot
+
+def random_clinic(seed: int) -> list:
+    """Dense random bookings for one provider over two weeks, some off the 15-minute grid."""
+    rng = random.Random(seed)
+    monday = next_weekday(1)
+    rows = []
+    for i in range(400):
+        start = monday + timedelta(days=rng.randrange(0, 14), minutes=rng.choice(range(8 * 60, 17 * 60, 15)))
+        if rng.random() < 0.1:
+            start += timedelta(minutes=rng.randrange(1, 14))
+        rows.append({
+            "id": f"apt-{i}",
+            "type": rng.choice(["Follow-Up", "New Patient"]),
+            "status": "scheduled",
+            "provider_id": EULER,
+            "appointment_time": start.isoformat(),
+            "duration_minutes": rng.choice([15, 15, 30, 45])
+        })
+    return rows
+
+def test_day_availability_matches_per_slot_check():
+    """Vectorized day evaluation must agree with the per-slot check for every candidate"""
+    print("=== OCCUPANCY GRID TESTING ===\n")
+
+    monday = next_weekday(1)
+    availability = [
+        {"provider_id": EULER, "weekday": weekday, "start_time": "08:30:00", "end_time": "17:00:00"}
+        for weekday in range(1, 6)
+    ]
+    visit_type = {"name": "Follow-Up", "max_patients_per_slot": 2}
+
+    for seed in range(5):
+        snapshot = ProviderSnapshot(EULER, "Follow-Up", availability, visit_type, random_clinic(seed))
+        grid = snapshot.occupancy_grid(monday.date(), 14)
+
+        for day_offset in range(14):
+            day = (monday + timedelta(days=day_offset)).date()
+            windows = snapshot.windows_by_weekday.get(day.weekday() + 1, [])
+            for duration in (15, 30, 45):
+                mask = grid.day_availability(day, 0, QUANTA_PER_DAY - duration // 15, duration, 2, windows)
+                for quantum, available in enumerate(mask):
+                    slot = datetime.combine(day, time()) + timedelta(minutes=15 * quantum)
+                    assert bool(available) == snapshot.check(slot, duration)[0], (slot, duration)
+
+    print("✅ Grid verdicts match per-slot checks")
+
+def test_find_next_uses_grid_for_aligned_days(clinic_defaults):
+    """Aligned days are answered by the grid, not by the per-slot scan"""
+    print("=== OCCUPANCY GRID SEARCH TESTING ===\n")
+
+    snapshot = ProviderSnapshot.load(CountingSupabase(build_mock_data()), EULER, "Follow-Up")
+    grid_days, scanned_days = [], []
+    original_free_slots_on_day = snapshot._free_slots_on_day
+    original_scan_day = snapshot._scan_day
+    snapshot._free_slots_on_day = lambda grid, first_slot, *args: \
+        grid_days.append(first_slot.date()) or original_free_slots_on_day(grid, first_slot, *args)
+    snapshot._scan_day = lambda first_slot, *args: scanned_days.append(first_slot.date()) or original_scan_day(first_slot, *args)
+
+    tuesday = next_weekday(2)
+    result = snapshot.find_next(tuesday.replace(hour=10), 15)
+    print(f"Next available: {result['formatted_datetime']} after grid days {grid_days}")
+    assert result["date"] == (tuesday + timedelta(days=7)).strftime("%Y-%m-%d")
+    # Every working day up to the answer went through the grid (the fully booked Tuesday included)
+    assert grid_days[0] == tuesday.date() and grid_days[-1] == (tuesday + timedelta(days=7)).date()
+    assert scanned_days == []
+
+    # Off-grid candidates (a start between quarter hours) fall back to the scan
+    snapshot.find_next(tuesday.replace(hour=10, minute=5) + timedelta(days=7), 20)
+    assert scanned_days
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import random
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase
+from patient_lookup import find_patient, patient_index
+
+FIRST_NAMES = ["John", "Jane", "Carlos", "Ada", "Alan", "Grace", "Anne_Marie", "Zoë"]
+LAST_NAMES = ["Doe", "Smith", "Rivera", "Lovelace", "Turing", "Hopper", "100% Pure", "O'Brien"]
+
+def random_patients(count: int, seed: int = 3) -> list:
+    rng = random.Random(seed)
+    patients = []
+    for i in range(count):
+        patients.append({
+            "id": f"patient-{i}",
+            "full_name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            "date_of_birth": f"{rng.randrange(1930, 2010)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+            "email": f"patient{i}@example.com",
+            "phone": f"555-{i:07d}"
+        })
+    return patients
+
+def legacy_find_patient(patients: list, patient_name: str, date_of_birth: str):
+    """The full-table scan n5 used to run."""
+    patient_name_lower = patient_name.lower().strip()
+    for patient in patients:
+        if (patient.get("full_name", "").lower().strip() == patient_name_lower and
+            patient.get("date_of_birth") == date_of_birth):
+            return patient
+    return None
+
+def test_lookup_matches_full_scan():
+    """Server-side filtering finds exactly the patient the full scan found"""
+    print("=== PATIENT LOOKUP TESTING ===\n")
+
+    patients = random_patients(3000)
+    patients.append({"id": "padded", "full_name": "  Padded Name  ", "date_of_birth": "1970-01-01"})
+    client = CountingSupabase({"patients": patients})
+    rng = random.Random(5)
+
+    queries = [(p["full_name"], p["date_of_birth"]) for p in rng.sample(patients, 200)]
+    queries += [(name.upper(), dob) for name, dob in queries[:50]]
+    queries += [(f"  {name.lower()} ", dob) for name, dob in queries[:50]]
+    queries += [("Anne%Marie Doe", "1980-01-01"), ("J_hn Doe", patients[0]["date_of_birth"]), ("padded name", "1970-01-01")]
+    queries += [(name, "1900-01-01") for name, _ in queries[:20]]
+
+    for patient_name, date_of_birth in queries:
+        expected = legacy_find_patient(patients, patient_name, date_of_birth)
+        assert find_patient(client, patient_name, date_of_birth, use_index=False) == expected, (patient_name, date_of_birth)
+
+    print(f"✅ {len(queries)} lookups match the full-table scan")
+
+def test_rows_transferred_stay_flat():
+    """Only patients sharing the DOB and name come back, however large the clinic"""
+    print("=== PATIENT LOOKUP SCALING TESTING ===\n")
+
+    transferred = []
+    for count in (1000, 100000):
+        patients = random_patients(count)
+        client = CountingSupabase({"patients": patients})
+        target = patients[count // 2]
+        assert find_patient(client, target["full_name"], target["date_of_birth"], use_index=False) is not None
+        transferred.append(client.rows_transferred)
+
+    print(f"Rows transferred: {transferred}")
+    assert max(transferred) <= 3
+
+def test_warm_index_skips_database():
+    """Repeat lookups are served from the in-process index"""
+    print("=== PATIENT INDEX TESTING ===\n")
+
+    patients = random_patients(500)
+    client = CountingSupabase({"patients": patients})
+    target = patients[42]
+    patient_index.invalidate()
+
+    first = find_patient(client, target["full_name"], target["date_of_birth"])
+    started = time.perf_counter()
+    second = find_patient(client, f" {target['full_name'].upper()} ", target["date_of_birth"])
+    elapsed = time.perf_counter() - started
+
+    print(f"Warm lookup: {elapsed * 1e6:.1f} µs")
+    assert first == second == target
+    assert client.query_count == 1
+
+    # Misses are never cached, and the index can be bypassed or invalidated
+    assert find_patient(client, "Nobody Here", target["date_of_birth"]) is None
+    assert find_patient(client, "Nobody Here", target["date_of_birth"]) is None
+    assert client.query_count == 3
+    find_patient(client, target["full_name"], target["date_of_birth"], use_index=False)
+    patient_index.invalidate(target["id"])
+    find_patient(client, target["full_name"], target["date_of_birth"])
+    assert client.query_count == 5
+
+if __name__ == "__main__":
+    test_lookup_matches_full_scan()
+    test_rows_transferred_stay_flat()
+    test_warm_index_skips_database()
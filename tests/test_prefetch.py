@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import threading
+import time
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import next_weekday
+from test_free_slots import StoreSupabase, store_data
+from test_reference_data import clinic_with_patients
+from availability_rpc import reset_rpc_detection
+from free_slots import reset_free_slots_detection
+from patient_lookup import invalidate_patient_lookups
+from reference_data import invalidate_reference_data
+from schedule_cache import invalidate_provider_schedule
+from prefetch import invalidate_prefetched, peek_prefetched_calendar
+import prefetch
+import check_appointment_availability
+import get_patient_appointments
+import reschedule_appointment
+
+def clinic() -> dict:
+    return store_data(with_table=False) | {"patients": clinic_with_patients()["patients"]}
+
+def cold_worker():
+    invalidate_patient_lookups()
+    invalidate_reference_data()
+    invalidate_provider_schedule()
+    invalidate_prefetched()
+    reset_rpc_detection()
+    reset_free_slots_detection()
+
+def test_n7_after_n5_served_from_prefetch(run_main):
+    """With prefetch, the n7 call following n5 makes no round-trips and answers the same"""
+    print("=== PREFETCH TESTING ===\n")
+
+    tuesday = next_weekday(2)
+    for preferred, max_alternatives in ((tuesday.replace(hour=10), 3), (tuesday.replace(hour=16), 1),
+                                        (tuesday + timedelta(days=8), 2)):
+        mock_data = clinic()
+        cold_worker()
+        patient = run_main(get_patient_appointments, StoreSupabase(mock_data), "Grace Hopper", "1906-12-09")
+        appointment_id = patient["next_appointment"]["appointment_id"]
+        expected = run_main(check_appointment_availability, StoreSupabase(mock_data), appointment_id, preferred.isoformat(), max_alternatives)
+
+        cold_worker()
+        run_main(get_patient_appointments, StoreSupabase(mock_data, latency=0.02), "Grace Hopper", "1906-12-09", prefetch=True)
+        # An in-flight load must not hold up the worker's exit
+        assert all(thread.daemon for thread in threading.enumerate() if thread.name == "prefetch")
+        assert peek_prefetched_calendar(appointment_id) is not None  # let the background load finish
+
+        n7_client = StoreSupabase(mock_data, latency=0.02)
+        start = time.perf_counter()
+        result = run_main(check_appointment_availability, n7_client, appointment_id, preferred.isoformat(), max_alternatives)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        print(f"{preferred.isoformat()}: available={result['available']}, {n7_client.query_count} round-trips, {elapsed_ms:.1f} ms")
+        assert result == expected
+        assert n7_client.query_count == 0 and n7_client.rpc_count == 0
+        assert elapsed_ms < 20
+
+    print("✅ n7 answered from the prefetched calendar")
+
+def test_prefetch_never_serves_stale_calendars(run_main):
+    """Writes, expiry and searches beyond the prefetched horizon all go back to the database"""
+    print("=== PREFETCH STALENESS TESTING ===\n")
+
+    mock_data = clinic()
+    client = StoreSupabase(mock_data)
+    cold_worker()
+    patient = run_main(get_patient_appointments, client, "Alan Turing", "1912-06-23", prefetch=True)
+    appointment_id = patient["next_appointment"]["appointment_id"]
+    assert peek_prefetched_calendar(appointment_id) is not None
+
+    # Beyond the prefetched horizon
+    far = (next_weekday(2) + timedelta(days=63)).replace(hour=10)
+    reset_rpc_detection()
+    far_client = StoreSupabase(mock_data)
+    run_main(check_appointment_availability, far_client, appointment_id, far.isoformat())
+    assert far_client.tables.count("appointments") == 1
+
+    # After the prefetch TTL
+    original_monotonic = prefetch.monotonic_clock.monotonic
+    prefetch.monotonic_clock.monotonic = lambda: original_monotonic() + prefetch.PREFETCH_TTL_SECONDS
+    try:
+        assert peek_prefetched_calendar(appointment_id) is None
+    finally:
+        prefetch.monotonic_clock.monotonic = original_monotonic
+
+    # After a reschedule through n8
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+    booked = run_main(reschedule_appointment, client, "fu-single", new_time.isoformat())
+    assert booked["success"]
+    assert peek_prefetched_calendar(appointment_id) is None
+
+    reset_rpc_detection()
+    check_client = StoreSupabase(mock_data)
+    result = run_main(check_appointment_availability, check_client, appointment_id, new_time.isoformat())
+    assert check_client.query_count > 0
+    assert result["success"]
+
+    print("✅ Stale prefetched calendars are not used")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
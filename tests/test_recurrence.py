@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import date, datetime, time, timedelta
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import next_weekday
+from recurrence import RecurrenceRule, WeekParity
+from schedule_cache import ProviderSchedule
+from slot_engine import ProviderSnapshot
+import schedule_cache as schedule_cache_module
+
+def rotating_provider_rows(anchor: date) -> list:
+    """Every Monday, Fridays of alternating weeks from `anchor`, first and third Wednesdays, odd-week Thursdays."""
+    return [
+        {"id": "av-mon", "provider_id": "p-rota", "weekday": 1, "start_time": "09:00:00", "end_time": "11:00:00"},
+        {"id": "av-fri", "provider_id": "p-rota", "weekday": 5, "start_time": "13:00:00", "end_time": "15:00:00",
+         "recurrence": "FREQ=WEEKLY;INTERVAL=2;BYDAY=FR", "recurrence_start": anchor.isoformat()},
+        {"id": "av-wed", "provider_id": "p-rota", "weekday": 3, "start_time": "08:00:00", "end_time": "10:00:00",
+         "recurrence": "RRULE:FREQ=MONTHLY;BYDAY=1WE,3WE"},
+        {"id": "av-thu", "provider_id": "p-rota", "weekday": 4, "start_time": "10:00:00", "end_time": "12:00:00",
+         "week_parity": "odd"}
+    ]
+
+def test_rules_expand_to_dates():
+    """RRULE and week-parity rows select the dates RFC 5545 and ISO week numbers give"""
+    print("=== RECURRENCE RULE TESTING ===\n")
+
+    october = (date(2026, 10, 1), date(2026, 10, 31))
+    assert RecurrenceRule("FREQ=MONTHLY;BYDAY=1FR,3FR").occurrences(*october) == [date(2026, 10, 2), date(2026, 10, 16)]
+    assert RecurrenceRule("FREQ=MONTHLY;BYDAY=-1MO").occurrences(*october) == [date(2026, 10, 26)]
+    assert RecurrenceRule("FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE", date(2026, 10, 5)).occurrences(*october) == [
+        date(2026, 10, 5), date(2026, 10, 7), date(2026, 10, 19), date(2026, 10, 21)
+    ]
+    # COUNT is counted from DTSTART, UNTIL is inclusive
+    assert RecurrenceRule("FREQ=WEEKLY;COUNT=3", date(2026, 10, 6)).occurrences(date(2026, 10, 14), date(2026, 12, 31)) == [
+        date(2026, 10, 20)
+    ]
+    assert RecurrenceRule("FREQ=MONTHLY;BYMONTHDAY=-1;UNTIL=20261130T000000Z", date(2026, 1, 1)).occurrences(
+        date(2026, 9, 1), date(2027, 6, 1)
+    ) == [date(2026, 9, 30), date(2026, 10, 31), date(2026, 11, 30)]
+    assert WeekParity("odd", 5).occurrences(*october) == [date(2026, 10, 9), date(2026, 10, 23)]
+    assert WeekParity("even", 5).occurrences(*october) == [date(2026, 10, 2), date(2026, 10, 16), date(2026, 10, 30)]
+
+    for unsupported in ("FREQ=YEARLY", "FREQ=WEEKLY;BYDAY=1FR", "FREQ=WEEKLY;BYSETPOS=1", "FREQ=DAILY;INTERVAL=0"):
+        try:
+            RecurrenceRule(unsupported)
+        except ValueError:
+            continue
+        raise AssertionError(f"{unsupported} was accepted")
+
+    print("✅ Rules expand to the expected dates")
+
+def test_search_expands_each_block_once():
+    """The slot search agrees with `check` and expands recurrences once per block, not per slot"""
+    print("=== RECURRING SCHEDULE SEARCH TESTING ===\n")
+
+    monday = next_weekday(1).date()
+    visit_type = {"name": "Follow-Up", "max_patients_per_slot": 1}
+    friday = monday + timedelta(days=4)
+    appointments = [{
+        "id": "a-fri", "provider_id": "p-rota", "status": "scheduled", "type": "Follow-Up",
+        "appointment_time": datetime.combine(friday, time(13)).isoformat(), "duration_minutes": 30
+    }]
+
+    expansions = []
+    original_expand_block = schedule_cache_module.expand_block
+    schedule_cache_module.expand_block = lambda recurrences, block: expansions.append(block) or original_expand_block(recurrences, block)
+    try:
+        schedule = ProviderSchedule("p-rota", rotating_provider_rows(friday))
+        snapshot = ProviderSnapshot("p-rota", "Follow-Up", schedule, visit_type, appointments)
+
+        start = datetime.combine(monday, time())
+        found = [slot["datetime"] for slot in snapshot.find_available_slots(start, 15, 1000, 55)]
+        expected = [
+            candidate.isoformat()
+            for day in range(56)
+            for candidate in (start + timedelta(days=day, minutes=15 * quarter) for quarter in range(95))
+            if snapshot.check(candidate, 15)[0]
+        ]
+        print(f"{len(found)} slots over eight weeks, {len(expansions)} block expansions")
+        assert found == expected
+        assert len(expansions) == len(set(expansions)) <= 2
+
+        # Fridays alternate from the anchor; the off week names the date
+        assert any(slot.startswith(datetime.combine(friday, time(13, 30)).isoformat()) for slot in found)
+        off_friday = datetime.combine(friday + timedelta(days=7), time(13))
+        assert not any(slot.startswith(off_friday.date().isoformat()) for slot in found)
+        assert snapshot.check(off_friday, 15) == (False, f"Provider not available on {off_friday.strftime('%A, %Y-%m-%d')}")
+        assert snapshot.check(off_friday + timedelta(days=7), 15) == (True, "")
+
+        # A weekly row edit keeps the expanded blocks; an RRULE edit recompiles everything
+        expanded = len(expansions)
+        moved_monday = dict(rotating_provider_rows(friday)[0], start_time="10:00:00")
+        edited = schedule.with_availability_change(rotating_provider_rows(friday)[0], moved_monday)
+        assert edited.windows_on(monday) == [(10 * 3600, 11 * 3600)]
+        assert edited.windows_on(friday) == [(13 * 3600, 15 * 3600)]
+        assert len(expansions) == expanded
+
+        weekly_friday = dict(rotating_provider_rows(friday)[1], recurrence=None)
+        edited = schedule.with_availability_change(rotating_provider_rows(friday)[1], weekly_friday)
+        assert edited.windows_on(off_friday.date()) == [(13 * 3600, 15 * 3600)]
+    finally:
+        schedule_cache_module.expand_block = original_expand_block
+
+    print("✅ Recurrences expanded once per block")
+
+if __name__ == "__main__":
+    test_rules_expand_to_dates()
+    test_search_expands_each_block_once()
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data, next_weekday
+from test_free_slots import MockStoreTable, StoreSupabase, store_data
+from free_slots import reset_free_slots_detection
+from reference_data import MISS_RELOAD_SECONDS, ReferenceTable, invalidate_reference_data
+from patient_lookup import invalidate_patient_lookups
+import reference_data
+import get_patient_appointments
+import reschedule_appointment
+
+class PlainTable(MockStoreTable):
+    def select(self, fields):
+        return self
+
+class PlainSupabase(StoreSupabase):
+    """A server that ignores foreign-key embedding."""
+    def table(self, table_name):
+        self.tables.append(table_name)
+        return PlainTable(self, table_name)
+
+def clinic_with_patients() -> dict:
+    mock_data = build_mock_data()
+    mock_data["patients"] = [
+        {"id": "patient-0", "full_name": "Grace Hopper", "date_of_birth": "1906-12-09", "email": "grace@example.com", "phone": "555-000-0000"},
+        {"id": "patient-8", "full_name": "Alan Turing", "date_of_birth": "1912-06-23", "email": "alan@example.com", "phone": "555-888-8888"}
+    ]
+    return mock_data
+
+def test_provider_names_embedded_in_n5(run_main):
+    """n5 gets provider names from the appointments query, in a constant number of round-trips"""
+    print("=== REFERENCE DATA TESTING ===\n")
+
+    mock_data = clinic_with_patients()
+    client = StoreSupabase(mock_data)
+
+    result = run_main(get_patient_appointments, client, "Grace Hopper", "1906-12-09")
+    print(f"Appointments: {result['total_appointments']}, tables: {client.tables}")
+    assert result["total_appointments"] == 24
+    assert all(appointment["provider_name"] == "Dr. Leonhard Euler" for appointment in result["upcoming_appointments"])
+    assert client.tables == ["patients", "appointments"]
+
+    # One appointment or twenty-four: the same two round-trips
+    graces = [a for a in mock_data["appointments"] if a["patient_id"] == "patient-0" and a["status"] == "scheduled"]
+    few = dict(mock_data, appointments=graces[:1])
+    few_client = CountingSupabase(few)
+    invalidate_patient_lookups()
+    assert run_main(get_patient_appointments, few_client, "Grace Hopper", "1906-12-09")["total_appointments"] == 1
+    assert few_client.query_count == 2
+
+    # Without embedding (older servers), providers come from the cache in one bulk read
+    plain_client = PlainSupabase(mock_data)
+    invalidate_patient_lookups()
+    assert run_main(get_patient_appointments, plain_client, "Grace Hopper", "1906-12-09") == result
+    assert plain_client.tables.count("providers") == 1
+
+def test_n8_details_embedded(run_main):
+    """n8 reads the appointment with its patient and provider, then updates: two round-trips"""
+    print("=== RESCHEDULE ROUND-TRIP TESTING ===\n")
+
+    client = StoreSupabase(store_data(with_table=False) | {"patients": clinic_with_patients()["patients"]})
+    reset_free_slots_detection()
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+    # The first reschedule also learns that the optional free_slots table is missing
+    run_main(reschedule_appointment, client, "fu-single", new_time.isoformat())
+
+    client.tables = []
+    result = run_main(reschedule_appointment, client, "fu-single", new_time.replace(hour=15).isoformat())
+    print(f"Tables: {client.tables}")
+    assert result["success"]
+    assert result["patient"] == {"name": "Alan Turing", "email": "alan@example.com", "phone": "555-888-8888"}
+    assert result["provider"] == {"name": "Dr. Leonhard Euler", "specialty": "Family Medicine"}
+    assert client.tables == ["appointments", "appointments"]
+
+def test_provider_names_served_from_cache(run_main):
+    """Without embedding, n8 reads providers once in bulk, and not at all once warm"""
+    print("=== REFERENCE DATA CACHE TESTING ===\n")
+
+    client = PlainSupabase(clinic_with_patients())
+    invalidate_reference_data()
+
+    new_time = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+    result = run_main(reschedule_appointment, client, "fu-single", new_time.isoformat())
+    assert result["provider"] == {"name": "Dr. Leonhard Euler", "specialty": "Family Medicine"}
+    assert client.tables.count("providers") == 1
+
+    cold_tables = list(client.tables)
+    result = run_main(reschedule_appointment, client, "fu-single", new_time.replace(hour=15).isoformat())
+    assert result["provider"] == {"name": "Dr. Leonhard Euler", "specialty": "Family Medicine"}
+    assert "providers" not in client.tables[len(cold_tables):]
+
+def test_ttl_miss_and_invalidation():
+    """Rows added later are found on a (rate-limited) miss, edits after the TTL or an invalidation"""
+    print("=== REFERENCE DATA REFRESH TESTING ===\n")
+
+    mock_data = build_mock_data()
+    client = CountingSupabase(mock_data)
+    table = ReferenceTable("visit_types", "name", ttl_seconds=60)
+
+    now = [1000.0]
+    original_monotonic = reference_data.monotonic_clock.monotonic
+    reference_data.monotonic_clock.monotonic = lambda: now[0]
+    try:
+        assert table.get(client, "Follow-Up")["max_patients_per_slot"] == 2
+        assert table.get(client, "New Patient")["max_patients_per_slot"] == 1
+        assert client.query_count == 1
+
+        # A new visit type is picked up by the lookup that misses it
+        mock_data["visit_types"].append({"id": "vt-ap", "name": "Annual Physical", "max_patients_per_slot": 1, "default_duration_minutes": 45})
+        assert table.get(client, "Annual Physical")["default_duration_minutes"] == 45
+        assert client.query_count == 2
+
+        # Further misses read the table at most once per MISS_RELOAD_SECONDS
+        mock_data["visit_types"].append({"id": "vt-tc", "name": "Telehealth", "max_patients_per_slot": 1, "default_duration_minutes": 15})
+        for _ in range(10):
+            assert table.get(client, "Unknown") is None and table.get(client, "Telehealth") is None
+        assert client.query_count == 2
+        now[0] += MISS_RELOAD_SECONDS
+        assert table.get(client, "Telehealth")["default_duration_minutes"] == 15
+        assert table.get(client, "Unknown") is None
+        assert client.query_count == 3
+
+        # An edited row is served stale until the TTL runs out
+        mock_data["visit_types"][1] = {**mock_data["visit_types"][1], "max_patients_per_slot": 3}
+        assert table.get(client, "Follow-Up")["max_patients_per_slot"] == 2
+        now[0] += 61
+        assert table.get(client, "Follow-Up")["max_patients_per_slot"] == 3
+
+        # ... or until it is invalidated
+        mock_data["visit_types"][1] = {**mock_data["visit_types"][1], "max_patients_per_slot": 4}
+        table.invalidate()
+        assert table.get(client, "Follow-Up")["max_patients_per_slot"] == 4
+        assert [row["name"] for row in table.all(client)] == ["New Patient", "Follow-Up", "Annual Physical", "Telehealth"]
+    finally:
+        reference_data.monotonic_clock.monotonic = original_monotonic
+
+    print("✅ Reference data refreshes on miss, TTL and invalidation")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
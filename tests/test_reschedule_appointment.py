@@ -144,6 +144,24 @@ class MockSupabaseTable:
         self.update_data = data
         return self
     
+    def gt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gt', value))
+        return self
+    
+    def gte(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('gte', value))
+        return self
+    
+    def lt(self, field, value):
+        if field not in self.filters:
+            self.filters[field] = []
+        self.filters[field].append(('lt', value))
+        return self
+    
     def execute(self):
         data = self.mock_data.get(self.table_name, [])
         
@@ -183,6 +201,15 @@ class MockSupabaseTable:
                     if condition_type == 'eq' and item.get(field) != value:
                         include_item = False
                         break
+                    elif condition_type == 'gt' and not (item.get(field) or "") > value:
+                        include_item = False
+                        break
+                    elif condition_type == 'gte' and not (item.get(field) or "") >= value:
+                        include_item = False
+                        break
+                    elif condition_type == 'lt' and not (item.get(field) or "") < value:
+                        include_item = False
+                        break
                 if not include_item:
                     break
             
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import (
+    CountingSupabase, build_mock_data, legacy_check_time_availability, next_weekday, EULER, VON_NEUMANN, LOVELACE
+)
+from availability_rpc import reset_rpc_detection
+from schedule_cache import ProviderSchedule, ScheduleCache, invalidate_provider_schedule
+from slot_engine import ProviderSnapshot
+import schedule_cache as schedule_cache_module
+import check_appointment_availability
+
+def test_warm_worker_skips_availability_query(run_main):
+    """The second check for a provider reuses the compiled schedule"""
+    print("=== SCHEDULE CACHE TESTING ===\n")
+
+    mock_data = build_mock_data()
+    client = CountingSupabase(mock_data)
+    preferred = (next_weekday(2) + timedelta(days=7)).replace(hour=14)
+
+    invalidate_provider_schedule()
+    first = run_main(check_appointment_availability, client, "fu-single", preferred.isoformat())
+    tables_after_first = list(client.tables)
+    second = run_main(check_appointment_availability, client, "fu-single", preferred.isoformat())
+
+    print(f"Cold: {tables_after_first}")
+    print(f"Warm: {client.tables[len(tables_after_first):]}")
+    assert first == second
+    assert tables_after_first.count("availability") == 1
+    assert "availability" not in client.tables[len(tables_after_first):]
+
+def test_ttl_lru_and_invalidation(clinic_defaults):
+    """Entries expire, the least recently used provider is evicted, edits invalidate"""
+    print("=== SCHEDULE CACHE POLICY TESTING ===\n")
+
+    mock_data = build_mock_data()
+    client = CountingSupabase(mock_data)
+    cache = ScheduleCache(ttl_seconds=60, max_entries=2)
+
+    now = [1000.0]
+    original_monotonic = schedule_cache_module.monotonic_clock.monotonic
+    schedule_cache_module.monotonic_clock.monotonic = lambda: now[0]
+    try:
+        cache.get(client, EULER)
+        cache.get(client, VON_NEUMANN)
+        cache.get(client, EULER)
+        assert client.query_count == 2
+
+        # Von Neumann is the least recently used and makes room for Lovelace
+        cache.get(client, LOVELACE)
+        assert cache.peek(VON_NEUMANN) is None and cache.peek(EULER) is not None
+        assert len(cache) == 2
+
+        # A schedule edit is visible right after invalidation
+        mock_data["availability"].append({"id": "av-5", "provider_id": EULER, "weekday": 3, "start_time": "08:00:00", "end_time": "12:00:00"})
+        assert 3 not in cache.get(client, EULER).windows_by_weekday
+        cache.invalidate(EULER)
+        assert cache.get(client, EULER).windows_by_weekday[3] == [(8 * 3600, 12 * 3600)]
+
+        # And after the TTL without invalidation
+        mock_data["availability"].append({"id": "av-6", "provider_id": LOVELACE, "weekday": 5, "start_time": "09:00:00", "end_time": "10:00:00"})
+        assert 5 not in cache.get(client, LOVELACE).windows_by_weekday
+        now[0] += 61
+        assert 5 in cache.get(client, LOVELACE).windows_by_weekday
+    finally:
+        schedule_cache_module.monotonic_clock.monotonic = original_monotonic
+
+    print("✅ TTL, LRU eviction and invalidation behave")
+
+def test_compiled_windows_match_legacy_parsing():
+    """Integer windows give the legacy verdicts, including sub-second edges"""
+    print("=== COMPILED SCHEDULE TESTING ===\n")
+
+    mock_data = build_mock_data()
+    mock_data["availability"].append({"id": "av-7", "provider_id": EULER, "weekday": 2, "start_time": "07:30:15", "end_time": "08:45:00"})
+    tuesday = next_weekday(2)
+
+    schedule = ProviderSchedule(EULER, [row for row in mock_data["availability"] if row["provider_id"] == EULER])
+    appointments = [row for row in mock_data["appointments"] if row["provider_id"] == EULER and row["status"] == "scheduled"]
+    snapshot = ProviderSnapshot(EULER, "Follow-Up", schedule, mock_data["visit_types"][1], appointments)
+
+    candidates = [
+        tuesday.replace(hour=7, minute=30, second=15),
+        tuesday.replace(hour=7, minute=30, second=14, microsecond=999999),
+        tuesday.replace(hour=8, minute=30),
+        tuesday.replace(hour=8, minute=30, microsecond=1),
+        tuesday.replace(hour=15, minute=45),
+        tuesday.replace(hour=15, minute=45, second=1),
+        tuesday.replace(hour=23, minute=50)
+    ]
+    for candidate in candidates:
+        for duration in (15, 30):
+            expected = legacy_check_time_availability(CountingSupabase(mock_data), EULER, candidate, duration, "Follow-Up")
+            assert snapshot.check(candidate, duration) == expected, (candidate, duration)
+
+    print("✅ Compiled windows agree with per-call parsing")
+
+def exceptions_clinic() -> tuple:
+    """Dr. Euler with a split Tuesday shift, a clinic holiday, a break and one extra day."""
+    mock_data = build_mock_data()
+    mock_data["availability"].append({"id": "av-8", "provider_id": EULER, "weekday": 2, "start_time": "07:00:00", "end_time": "08:00:00"})
+    holiday = next_weekday(2, 3)
+    break_day = next_weekday(2, 4)
+    extra_day = next_weekday(3, 4)
+    mock_data["schedule_exceptions"] = [
+        {"id": "ex-1", "provider_id": None, "exception_date": holiday.date().isoformat(), "kind": "closed", "start_time": None, "end_time": None},
+        {"id": "ex-2", "provider_id": EULER, "exception_date": break_day.date().isoformat(), "kind": "closed", "start_time": "12:00:00", "end_time": "13:00:00"},
+        {"id": "ex-3", "provider_id": EULER, "exception_date": extra_day.date().isoformat(), "kind": "open", "start_time": "09:00:00", "end_time": "11:00:00"}
+    ]
+    return mock_data, holiday, break_day, extra_day
+
+def test_split_shifts_and_exceptions():
+    """Every window of a date is searched, and exceptions close or open single dates"""
+    print("=== SCHEDULE COMPILER TESTING ===\n")
+
+    mock_data, holiday, break_day, extra_day = exceptions_clinic()
+    schedule_cache_module.SCHEDULE_EXCEPTIONS_ENABLED = True
+    invalidate_provider_schedule()
+    try:
+        client = CountingSupabase(mock_data)
+        snapshot = ProviderSnapshot.load(client, EULER, "Follow-Up")
+        assert client.tables.count("schedule_exceptions") == 1
+
+        assert snapshot.check(holiday.replace(hour=10), 15) == (False, f"Provider not available on {holiday.strftime('%A, %Y-%m-%d')}")
+        assert snapshot.check(break_day.replace(hour=11, minute=45), 15) == (True, "")
+        assert snapshot.check(break_day.replace(hour=12, minute=15), 15) == (False, "Requested time is outside provider's working hours")
+        assert snapshot.check(break_day.replace(hour=7, minute=30), 15) == (True, "")
+        assert snapshot.check(extra_day.replace(hour=9, minute=30), 15) == (True, "")
+
+        # The search agrees with checking every quarter hour of every day
+        start = holiday - timedelta(days=7)
+        found = [slot["datetime"] for slot in snapshot.find_available_slots(start, 15, 1000, 20)]
+        expected = [
+            candidate.isoformat()
+            for day in range(21)
+            for candidate in (start + timedelta(days=day, minutes=15 * quarter) for quarter in range(95))
+            if snapshot.check(candidate, 15)[0]
+        ]
+        print(f"{len(found)} slots over three weeks")
+        assert found == expected
+        assert any(slot.startswith((start.date().isoformat() + "T07:")) for slot in found)
+        assert not any(slot.startswith(holiday.date().isoformat()) for slot in found)
+        assert any(slot.startswith(extra_day.date().isoformat()) for slot in found)
+
+        # The availability RPC knows only the weekly hours, so n7 answers with the engine
+        reset_rpc_detection()
+        original_create_client = check_appointment_availability.create_client
+        check_appointment_availability.create_client = lambda url, key: client
+        try:
+            result = check_appointment_availability.main("fu-single", holiday.replace(hour=10).isoformat())
+        finally:
+            check_appointment_availability.create_client = original_create_client
+        assert client.rpc_count == 0
+        assert result["available"] is False and "not available on" in result["conflict_reason"]
+        assert result["alternatives"][0]["datetime"] == break_day.replace(hour=7).isoformat()
+    finally:
+        schedule_cache_module.SCHEDULE_EXCEPTIONS_ENABLED = False
+        invalidate_provider_schedule()
+
+    print("✅ Split shifts and exceptions are compiled per date")
+
+def test_row_changes_recompile_only_their_dates():
+    """Availability and exception edits reuse every compiled date they do not touch"""
+    print("=== INCREMENTAL SCHEDULE RECOMPILE TESTING ===\n")
+
+    mock_data, holiday, break_day, _ = exceptions_clinic()
+    client = CountingSupabase(mock_data)
+    cache = ScheduleCache()
+    schedule_cache_module.SCHEDULE_EXCEPTIONS_ENABLED = True
+    try:
+        schedule = cache.get(client, EULER)
+        days = [holiday.date() + timedelta(days=offset) for offset in range(28)]
+        compiled = {day: schedule.windows_on(day) for day in days}
+        assert compiled[holiday.date()] == []
+
+        # A clinic-wide closure reaches every cached provider, one date each
+        closure = {"id": "ex-4", "provider_id": None, "exception_date": (break_day + timedelta(days=7)).date().isoformat(),
+                   "kind": "closed", "start_time": None, "end_time": None}
+        cache.update_exception(None, closure)
+        updated = cache.peek(EULER)
+        assert updated.windows_on(closure_day := (break_day + timedelta(days=7)).date()) == []
+        assert all(updated.windows_on(day) is compiled[day] for day in days if day != closure_day)
+
+        # Removing the holiday reopens it; another provider's exception leaves Euler alone
+        cache.update_exception(mock_data["schedule_exceptions"][0], None)
+        assert cache.peek(EULER).windows_on(holiday.date()) == [(10 * 3600, 16 * 3600), (7 * 3600, 8 * 3600)]
+        before_other = cache.peek(EULER)
+        cache.update_exception(None, dict(closure, id="ex-5", provider_id=LOVELACE))
+        assert cache.peek(EULER) is before_other
+
+        # A new Thursday row recompiles Thursdays only
+        thursday_row = {"id": "av-9", "provider_id": EULER, "weekday": 4, "start_time": "08:00:00", "end_time": "09:00:00"}
+        tuesdays = {day: cache.peek(EULER).windows_on(day) for day in days if day.isoweekday() == 2}
+        cache.update_availability(None, thursday_row)
+        schedule = cache.peek(EULER)
+        assert all(schedule.windows_on(day) == [(8 * 3600, 9 * 3600)] for day in days if day.isoweekday() == 4)
+        assert all(schedule.windows_on(day) is windows for day, windows in tuesdays.items())
+        cache.update_availability(thursday_row, None)
+        assert all(cache.peek(EULER).windows_on(day) == [] for day in days if day.isoweekday() == 4)
+
+        assert client.query_count == 2
+    finally:
+        schedule_cache_module.SCHEDULE_EXCEPTIONS_ENABLED = False
+
+    print("✅ Only the touched dates are recompiled")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
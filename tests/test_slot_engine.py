@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import datetime, timedelta
+import json
+import random
+import re
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+class MockWmill:
+    @staticmethod
+    def get_resource(resource_name):
+        return {"url": "mock_url", "key": "mock_key"}
+
+class MockSupabaseModule:
+    @staticmethod
+    def create_client(url, key):
+        return CountingSupabase(build_mock_data())
+
+    Client = type
+
+# Mock the imports (other test modules may already have installed theirs)
+sys.modules.setdefault('wmill', MockWmill())
+sys.modules.setdefault('supabase', MockSupabaseModule())
+
+# The legacy per-slot implementation is kept in test_appointment_availability
+# and serves as the reference the engine must agree with
+from test_appointment_availability import (
+    check_time_availability as legacy_check_time_availability,
+    find_next_available_slot as legacy_find_next_available_slot
+)
+from slot_engine import AppointmentIndex, ProviderSnapshot, find_earliest_slots_across_providers, search_window
+from schedule_cache import invalidate_provider_schedule
+from reference_data import invalidate_reference_data
+
+EULER = "1cb198af-6574-4f0a-a057-c24cdde69329"
+VON_NEUMANN = "b42f0f8e-9c40-460e-844a-d280012c4539"
+LOVELACE = "3f1c2a77-5d0e-4d52-9a0b-7c8e1f2a9b10"
+
+def next_weekday(weekday: int, weeks_ahead: int = 1) -> datetime:
+    """Midnight of the given weekday (1-7, Monday=1) at least `weeks_ahead` weeks from today."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    days = (weekday - 1 - today.weekday()) % 7 + 7 * weeks_ahead
+    return today + timedelta(days=days)
+
+def build_mock_data() -> dict:
+    """Future-dated clinic with a fully booked Tuesday for Dr. Euler."""
+    tuesday = next_weekday(2)
+    monday = next_weekday(1)
+
+    appointments = []
+    # Fill Dr. Euler's first Tuesday completely with Follow-Ups (2 per slot = full)
+    slot = tuesday.replace(hour=10)
+    while slot < tuesday.replace(hour=16):
+        for seat in range(2):
+            appointments.append({
+                "id": f"full-{slot.strftime('%H%M')}-{seat}",
+                "type": "Follow-Up",
+                "status": "scheduled",
+                "patient_id": f"patient-{seat}",
+                "provider_id": EULER,
+                "appointment_time": slot.isoformat(),
+                "duration_minutes": 15
+            })
+        slot += timedelta(minutes=15)
+
+    # Second Tuesday: a 30-minute New Patient at 10:00 and one Follow-Up at 10:45
+    second_tuesday = tuesday + timedelta(days=7)
+    appointments.extend([
+        {
+            "id": "np-long",
+            "type": "New Patient",
+            "status": "scheduled",
+            "patient_id": "patient-9",
+            "provider_id": EULER,
+            "appointment_time": second_tuesday.replace(hour=10).isoformat(),
+            "duration_minutes": 30
+        },
+        {
+            "id": "fu-single",
+            "type": "Follow-Up",
+            "status": "scheduled",
+            "patient_id": "patient-8",
+            "provider_id": EULER,
+            "appointment_time": second_tuesday.replace(hour=10, minute=45).isoformat(),
+            "duration_minutes": 15
+        },
+        {
+            "id": "cancelled",
+            "type": "Follow-Up",
+            "status": "cancelled",
+            "patient_id": "patient-7",
+            "provider_id": EULER,
+            "appointment_time": second_tuesday.replace(hour=11).isoformat(),
+            "duration_minutes": 15
+        },
+        {
+            "id": "vn-1",
+            "type": "New Patient",
+            "status": "scheduled",
+            "patient_id": "patient-6",
+            "provider_id": VON_NEUMANN,
+            "appointment_time": monday.replace(hour=9).isoformat(),
+            "duration_minutes": 30
+        }
+    ])
+
+    return {
+        "visit_types": [
+            {"id": "vt-np", "name": "New Patient", "max_patients_per_slot": 1, "default_duration_minutes": 30},
+            {"id": "vt-fu", "name": "Follow-Up", "max_patients_per_slot": 2, "default_duration_minutes": 15}
+        ],
+        "providers": [
+            {"id": EULER, "role": "NP", "full_name": "Dr. Leonhard Euler", "specialty": "Family Medicine"},
+            {"id": VON_NEUMANN, "role": "MD", "full_name": "Dr. John von Neeumann", "specialty": "Gastroenterology"},
+            {"id": LOVELACE, "role": "MD", "full_name": "Dr. Ada Lovelace", "specialty": "Family Medicine"}
+        ],
+        "availability": [
+            {"id": "av-1", "provider_id": VON_NEUMANN, "weekday": 1, "start_time": "09:00:00", "end_time": "15:30:00"},
+            {"id": "av-2", "provider_id": EULER, "weekday": 2, "start_time": "10:00:00", "end_time": "16:00:00"},
+            {"id": "av-3", "provider_id": LOVELACE, "weekday": 2, "start_time": "13:00:00", "end_time": "17:00:00"},
+            {"id": "av-4", "provider_id": LOVELACE, "weekday": 4, "start_time": "08:00:00", "end_time": "12:00:00"}
+        ],
+        "appointments": appointments
+    }
+
+def like_regex(pattern: str):
+    """Translate an SQL ILIKE pattern into a case-insensitive regex."""
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), re.IGNORECASE | re.DOTALL)
+
+class MockSupabaseResponse:
+    def __init__(self, data):
+        self.data = data
+
+class MockSupabaseTable:
+    def __init__(self, client, table_name):
+        self.client = client
+        self.table_name = table_name
+        self.filters = []
+        self.embedded = []
+
+    def select(self, fields):
+        # Foreign-key embedding such as "*, providers(full_name, specialty)"
+        for table_name, columns in re.findall(r"(\w+)\(([^)]*)\)", fields):
+            self.embedded.append((table_name, [column.strip() for column in columns.split(",")]))
+        return self
+
+    def embed(self, item):
+        if not self.embedded:
+            return item
+        item = dict(item)
+        for table_name, columns in self.embedded:
+            # Many-to-one: appointments.provider_id -> providers.id
+            foreign_key = f"{table_name[:-1]}_id"
+            related = next((row for row in self.client.mock_data.get(table_name, []) if row.get("id") == item.get(foreign_key)), None)
+            item[table_name] = None if related is None else {column: related.get(column) for column in columns}
+        return item
+
+    def eq(self, field, value):
+        self.filters.append(lambda item: item.get(field) == value)
+        return self
+
+    def neq(self, field, value):
+        self.filters.append(lambda item: item.get(field) != value)
+        return self
+
+    def gt(self, field, value):
+        self.filters.append(lambda item: item.get(field) > value)
+        return self
+
+    def gte(self, field, value):
+        self.filters.append(lambda item: item.get(field) >= value)
+        return self
+
+    def lt(self, field, value):
+        self.filters.append(lambda item: item.get(field) < value)
+        return self
+
+    def ilike(self, field, pattern):
+        regex = like_regex(pattern)
+        self.filters.append(lambda item: regex.fullmatch(item.get(field) or "") is not None)
+        return self
+
+    def execute(self):
+        self.client.query_count += 1
+        if self.client.latency:
+            time.sleep(self.client.latency)
+        rows = [self.embed(item) for item in self.client.mock_data.get(self.table_name, []) if all(f(item) for f in self.filters)]
+        self.client.rows_transferred += len(rows)
+        return MockSupabaseResponse(rows)
+
+class MockAPIError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+class CountingSupabase:
+    """Mock Supabase client that counts round-trips."""
+    def __init__(self, mock_data, latency: float = 0.0):
+        self.mock_data = mock_data
+        self.query_count = 0
+        self.rows_transferred = 0
+        self.rpc_count = 0
+        self.latency = latency
+        self.tables = []
+
+    def table(self, table_name):
+        self.tables.append(table_name)
+        return MockSupabaseTable(self, table_name)
+
+    def rpc(self, function_name, params):
+        # The availability RPC is not installed in the mock database
+        self.rpc_count += 1
+        raise MockAPIError(f"Could not find the function public.{function_name}", "PGRST202")
+
+def test_find_next_matches_legacy_search():
+    """The engine must return exactly the slot the per-slot implementation returns"""
+    print("=== SLOT ENGINE EQUIVALENCE TESTING ===\n")
+
+    mock_data = build_mock_data()
+    tuesday = next_weekday(2)
+
+    scenarios = [
+        ("Fully booked Tuesday (Follow-Up)", EULER, tuesday.replace(hour=10), 15, "Follow-Up", None),
+        ("Fully booked Tuesday (New Patient)", EULER, tuesday.replace(hour=9), 30, "New Patient", None),
+        ("Overlap on second Tuesday", EULER, (tuesday + timedelta(days=7)).replace(hour=10, minute=5), 30, "New Patient", None),
+        ("Self-exclusion", EULER, (tuesday + timedelta(days=7)).replace(hour=10), 30, "New Patient", "np-long"),
+        ("Mid-quarter start", VON_NEUMANN, next_weekday(1).replace(hour=9, minute=7), 30, "New Patient", None),
+        ("Unknown visit type", EULER, tuesday.replace(hour=10), 15, "Annual Physical", None),
+        ("Provider without schedule", "unknown-provider", tuesday, 15, "Follow-Up", None)
+    ]
+
+    for description, provider_id, start_from, duration, visit_type, exclude_id in scenarios:
+        legacy_client = CountingSupabase(mock_data)
+        expected = legacy_find_next_available_slot(legacy_client, provider_id, start_from, duration, visit_type, exclude_id)
+
+        invalidate_provider_schedule()
+        invalidate_reference_data()
+        engine_client = CountingSupabase(mock_data)
+        snapshot = ProviderSnapshot.load(engine_client, provider_id, visit_type, exclude_id)
+        actual = snapshot.find_next(start_from, duration)
+
+        print(f"{description}: {json.dumps(actual)}")
+        print(f"  Queries: legacy={legacy_client.query_count}, engine={engine_client.query_count}")
+        assert actual == expected
+        assert engine_client.query_count == 3
+
+def test_check_matches_legacy_verdicts():
+    """Verdicts and reasons must match the per-slot implementation for every candidate"""
+    print("=== SLOT ENGINE VERDICT TESTING ===\n")
+
+    mock_data = build_mock_data()
+    second_tuesday = next_weekday(2) + timedelta(days=7)
+
+    for visit_type, duration in [("Follow-Up", 15), ("New Patient", 30)]:
+        snapshot = ProviderSnapshot.load(CountingSupabase(mock_data), EULER, visit_type)
+        candidate = second_tuesday.replace(hour=8)
+        while candidate < second_tuesday.replace(hour=17):
+            expected = legacy_check_time_availability(CountingSupabase(mock_data), EULER, candidate, duration, visit_type)
+            assert snapshot.check(candidate, duration) == expected, candidate
+            candidate += timedelta(minutes=5)
+
+    print("✅ All candidate verdicts match")
+
+def test_appointment_index_matches_linear_scan():
+    """Interval index queries must agree with a scan over every appointment"""
+    print("=== APPOINTMENT INDEX TESTING ===\n")
+
+    rng = random.Random(7)
+    base = datetime(2030, 1, 7, 8, 0)
+    rows = []
+    # Several years of history with mixed durations and off-grid start times
+    for i in range(3000):
+        start = base + timedelta(days=rng.randrange(0, 1000), minutes=rng.randrange(0, 600, 5))
+        rows.append({
+            "id": f"apt-{i}",
+            "appointment_time": start.isoformat(),
+            "duration_minutes": rng.choice([15, 15, 30, 45, 60])
+        })
+
+    index = AppointmentIndex(rows)
+    assert len(index) == len(rows)
+
+    parsed = []
+    for row in rows:
+        row_start = datetime.fromisoformat(row["appointment_time"])
+        parsed.append((row_start, row_start + timedelta(minutes=row["duration_minutes"]), row))
+
+    for _ in range(500):
+        start = base + timedelta(days=rng.randrange(0, 1000), minutes=rng.randrange(0, 600, 5))
+        end = start + timedelta(minutes=rng.choice([15, 30]))
+
+        expected_overlap = []
+        expected_exact = []
+        for row_start, row_end, row in parsed:
+            if start < row_end and end > row_start:
+                expected_overlap.append(row)
+            if row_start == start:
+                expected_exact.append(row)
+
+        assert index.overlapping(start, end) == expected_overlap
+        assert index.starting_at(start) == expected_exact
+
+    print("✅ Index agrees with linear scan on 500 random windows")
+
+def test_alternatives_from_single_scan():
+    """Top-N alternatives equal repeated legacy searches and cost no extra queries"""
+    print("=== ALTERNATIVE SLOTS TESTING ===\n")
+
+    import check_appointment_availability
+
+    mock_data = build_mock_data()
+    second_tuesday = next_weekday(2) + timedelta(days=7)
+
+    # Reference: call the legacy search again after each slot it returns
+    expected = []
+    start_from = second_tuesday.replace(hour=9)
+    while len(expected) < 5:
+        slot = legacy_find_next_available_slot(CountingSupabase(mock_data), EULER, start_from, 30, "New Patient", "vn-1")
+        expected.append(slot)
+        start_from = datetime.fromisoformat(slot["datetime"]) + timedelta(minutes=15)
+
+    snapshot = ProviderSnapshot.load(CountingSupabase(mock_data), EULER, "New Patient", "vn-1")
+    assert snapshot.find_available_slots(second_tuesday.replace(hour=9), 30, 5) == expected
+
+    # main returns the same list with a single round-trip per table
+    mock_data["appointments"].append({
+        "id": "to-move",
+        "type": "New Patient",
+        "status": "scheduled",
+        "patient_id": "patient-5",
+        "provider_id": EULER,
+        "appointment_time": (second_tuesday + timedelta(days=7)).replace(hour=13).isoformat(),
+        "duration_minutes": 30
+    })
+    preferred = second_tuesday.replace(hour=10)
+    expected = ProviderSnapshot.load(CountingSupabase(mock_data), EULER, "New Patient", "to-move").find_available_slots(preferred, 30, 5)
+
+    invalidate_provider_schedule()
+    invalidate_reference_data()
+    client = CountingSupabase(mock_data)
+    original_create_client = check_appointment_availability.create_client
+    check_appointment_availability.create_client = lambda url, key: client
+    try:
+        result = check_appointment_availability.main("to-move", preferred.isoformat(), max_alternatives=5)
+    finally:
+        check_appointment_availability.create_client = original_create_client
+
+    print(f"Alternatives: {[slot['formatted_datetime'] for slot in result['alternatives']]}")
+    assert result["available"] is False
+    assert result["alternatives"] == expected
+    assert result["next_available"] == expected[0]
+    assert client.query_count == 4
+
+def test_cross_provider_search_by_specialty():
+    """Every provider of the specialty is searched concurrently"""
+    print("=== CROSS-PROVIDER SEARCH TESTING ===\n")
+
+    import check_appointment_availability
+
+    mock_data = build_mock_data()
+    tuesday = next_weekday(2)
+    client = CountingSupabase(mock_data, latency=0.05)
+
+    providers = check_appointment_availability.get_providers_with_same_specialty(client, EULER)
+    assert sorted(provider["id"] for provider in providers) == sorted([EULER, LOVELACE])
+
+    # Four providers worth of searches: three copies of Dr. Lovelace plus Dr. Euler
+    providers = providers + [dict(providers[-1]) for _ in range(2)]
+    started = time.perf_counter()
+    result = find_earliest_slots_across_providers(client, providers, tuesday.replace(hour=10), 15, "Follow-Up")
+    elapsed = time.perf_counter() - started
+
+    for option in result["provider_options"]:
+        print(f"{option['provider_name']}: {option['next_available']['formatted_datetime']}")
+    print(f"Earliest: {result['earliest']['provider_name']} ({elapsed:.2f}s for {len(providers)} providers)")
+
+    # Dr. Euler is fully booked that Tuesday; Dr. Lovelace is free from 13:00
+    assert result["earliest"]["provider_id"] == LOVELACE
+    assert result["earliest"]["next_available"]["datetime"] == tuesday.replace(hour=13).isoformat()
+    by_provider = {option["provider_id"]: option for option in result["provider_options"]}
+    assert by_provider[EULER]["next_available"]["date"] == (tuesday + timedelta(days=7)).strftime("%Y-%m-%d")
+    # Sequential would take 4 providers x 3 queries x 50ms
+    assert elapsed < 0.4
+
+def test_time_window_pushed_to_server():
+    """Only appointments that can overlap the search window are downloaded"""
+    print("=== TIME WINDOW PUSHDOWN TESTING ===\n")
+
+    mock_data = build_mock_data()
+    tuesday = next_weekday(2)
+    # Years of past history and far-future bookings the search never needs
+    for day in range(1, 1500):
+        mock_data["appointments"].append({
+            "id": f"history-{day}",
+            "type": "Follow-Up",
+            "status": "scheduled",
+            "patient_id": "patient-1",
+            "provider_id": EULER,
+            "appointment_time": (tuesday - timedelta(days=day)).replace(hour=11).isoformat(),
+            "duration_minutes": 15
+        })
+    mock_data["appointments"].append({
+        "id": "far-future",
+        "type": "Follow-Up",
+        "status": "scheduled",
+        "patient_id": "patient-1",
+        "provider_id": EULER,
+        "appointment_time": (tuesday + timedelta(days=120)).isoformat(),
+        "duration_minutes": 15
+    })
+
+    unbounded_client = CountingSupabase(mock_data)
+    unbounded = ProviderSnapshot.load(unbounded_client, EULER, "Follow-Up")
+    bounded_client = CountingSupabase(mock_data)
+    start_from = tuesday.replace(hour=10)
+    bounded = ProviderSnapshot.load(bounded_client, EULER, "Follow-Up", None, search_window(start_from))
+
+    print(f"Rows transferred: unbounded={unbounded_client.rows_transferred}, bounded={bounded_client.rows_transferred}")
+    assert bounded.find_available_slots(start_from, 15, 10) == unbounded.find_available_slots(start_from, 15, 10)
+    assert bounded_client.rows_transferred < 100 < unbounded_client.rows_transferred
+
+    # Slots outside the loaded window are refused rather than silently misjudged
+    try:
+        bounded.check(tuesday + timedelta(days=90), 15)
+        assert False, "expected ValueError"
+    except ValueError as e:
+        print(f"Outside window: {e}")
+
+if __name__ == "__main__":
+    test_find_next_matches_legacy_search()
+    test_check_matches_legacy_verdicts()
+    test_appointment_index_matches_linear_scan()
+    test_alternatives_from_single_scan()
+    test_cross_provider_search_by_specialty()
+    test_time_window_pushed_to_server()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import next_weekday, EULER
+from test_free_slots import StoreSupabase, store_data
+from atomic_reschedule import reset_reschedule_rpc_detection
+from slot_holds import HOLD_TTL_SECONDS, InMemoryHoldStore, TimingWheel, get_hold_store, set_hold_store
+import slot_holds
+import check_appointment_availability
+import reschedule_appointment
+
+def test_timing_wheel_expires_on_time():
+    """Keys come out of the wheel on the tick their deadline passes, also beyond one revolution"""
+    print("=== TIMING WHEEL TESTING ===\n")
+
+    wheel = TimingWheel(tick_seconds=1.0, size=8, now=100.0)
+    deadlines = {"a": 100.5, "b": 103.2, "c": 107.9, "d": 120.0, "e": 131.0}
+    for key, deadline in deadlines.items():
+        wheel.add(key, deadline)
+    wheel.remove("c", deadlines["c"])
+
+    expired = {}
+    for step in range(1, 70):
+        now = 100.0 + step * 0.5
+        for key in wheel.advance(now):
+            expired[key] = now
+
+    assert expired == {"a": 100.5, "b": 103.5, "d": 120.0, "e": 131.0}
+
+    # A jump longer than a revolution still finds everything due
+    wheel.add("f", 140.0)
+    wheel.add("g", 500.0)
+    assert sorted(wheel.advance(1000.0)) == ["f", "g"]
+
+    print("✅ Timing wheel expiry is exact")
+
+def test_store_expires_and_redeems_once():
+    """Holds disappear after the TTL, and a token can only be redeemed once"""
+    print("=== HOLD STORE TESTING ===\n")
+
+    now = [5000.0]
+    original_monotonic = slot_holds.monotonic_clock.monotonic
+    slot_holds.monotonic_clock.monotonic = lambda: now[0]
+    try:
+        store = InMemoryHoldStore()
+        hold = {"appointment_id": "a-1", "provider_id": EULER, "appointment_type": "Follow-Up", "duration_minutes": 15, "slot_start": "2030-01-01T10:00:00"}
+        first = store.place(hold, ttl_seconds=60)
+        second = store.place(dict(hold, appointment_id="a-2"), ttl_seconds=60)
+        assert len(store.active_holds(EULER)) == 2
+
+        assert store.peek(first)["appointment_id"] == "a-1"
+        assert store.redeem(first)["appointment_id"] == "a-1"
+        assert store.peek(first) is None
+        assert store.redeem(first) is None
+
+        now[0] += 61
+        assert store.active_holds(EULER) == [] and len(store) == 0
+        assert store.peek(second) is None and store.redeem(second) is None
+    finally:
+        slot_holds.monotonic_clock.monotonic = original_monotonic
+
+    print("✅ Holds expire and redeem once")
+
+def test_offered_slot_is_held_until_booked(run_main):
+    """A slot n7 offers with hold_slots is not offered to anyone else until n8 books it"""
+    print("=== SLOT HOLD WORKFLOW TESTING ===\n")
+
+    set_hold_store(InMemoryHoldStore())
+    mock_data = store_data(with_table=False)
+    third_tuesday = next_weekday(2) + timedelta(days=14)
+    mock_data["appointments"].append({
+        "id": "np-other", "type": "New Patient", "status": "scheduled", "patient_id": "patient-5",
+        "provider_id": EULER, "appointment_time": third_tuesday.replace(hour=11).isoformat(), "duration_minutes": 30
+    })
+    client = StoreSupabase(mock_data)
+    wanted = third_tuesday.replace(hour=14).isoformat()
+
+    offer = run_main(check_appointment_availability, client, "np-long", wanted, hold_slots=True)
+    assert offer["available"] and offer["hold_token"] and offer["hold_expires_in_seconds"] == HOLD_TTL_SECONDS
+
+    # Another caller asking for the same time is turned away and offered the next free slot
+    other = run_main(check_appointment_availability, client, "np-other", wanted, hold_slots=True)
+    print(f"Other caller: {other['conflict_reason']} -> {other['next_available']['datetime']}")
+    assert other["available"] is False
+    assert other["conflict_reason"].startswith("Time slot full")
+    assert other["next_available"]["datetime"] == third_tuesday.replace(hour=14, minute=30).isoformat()
+    assert other["next_available"]["hold_token"]
+
+    # The first caller's own hold does not block the first caller
+    again = run_main(check_appointment_availability, client, "np-long", wanted, hold_slots=True)
+    assert again["available"]
+
+    # A token passed with another appointment or slot does not hold it
+    other_token = other["next_available"]["hold_token"]
+    assert not reschedule_appointment.holds_slot(other_token, "np-long", third_tuesday.replace(hour=14, minute=30))
+    assert not reschedule_appointment.holds_slot(again["hold_token"], "np-long", third_tuesday.replace(hour=15))
+    assert reschedule_appointment.holds_slot(again["hold_token"], "np-long", third_tuesday.replace(hour=14))
+
+    # A reschedule that conflicts or fails leaves the hold for a retry
+    reset_reschedule_rpc_detection()
+    rival = {
+        "id": "np-rival", "type": "New Patient", "status": "scheduled", "patient_id": "patient-6",
+        "provider_id": EULER, "appointment_time": wanted, "duration_minutes": 30
+    }
+    mock_data["appointments"].append(rival)
+    lost = run_main(reschedule_appointment, client, "np-long", wanted, True, again["hold_token"])
+    assert lost["success"] is False and lost["conflict"]
+    mock_data["appointments"].remove(rival)
+
+    original_reschedule_atomically = reschedule_appointment.reschedule_atomically
+    reschedule_appointment.reschedule_atomically = lambda *args: 1 / 0
+    try:
+        failed = run_main(reschedule_appointment, client, "np-long", wanted, True, again["hold_token"])
+    finally:
+        reschedule_appointment.reschedule_atomically = original_reschedule_atomically
+    assert failed["success"] is False and "division by zero" in failed["error"]
+    assert get_hold_store().peek(other_token) and get_hold_store().peek(again["hold_token"])
+
+    reset_reschedule_rpc_detection()
+    rpc_calls = client.rpc_count
+    booked = run_main(reschedule_appointment, client, "np-long", wanted, True, again["hold_token"])
+    assert booked["success"] and booked["hold_redeemed"] is True
+    # The held slot is still re-checked atomically (here by the fallback, the function not being installed)
+    assert client.rpc_count == rpc_calls + 1
+
+    # Spent tokens and the alternatives offered to the first caller are gone
+    assert get_hold_store().redeem(again["hold_token"]) is None
+    assert all(hold["appointment_id"] == "np-other" for hold in get_hold_store().active_holds(EULER))
+
+    print("✅ Held slots are offered once and booked with their token")
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-s"])
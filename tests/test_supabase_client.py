@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from test_slot_engine import CountingSupabase, build_mock_data
+from supabase_client import ClientPool
+import supabase_client
+import get_patient_appointments
+
+# Setup costs a cold invocation pays: resource fetch and client construction / TLS handshake
+RESOURCE_FETCH_SECONDS = 0.01
+CONNECT_SECONDS = 0.03
+
+class SlowWmill:
+    def __init__(self):
+        self.fetches = 0
+
+    def get_resource(self, path):
+        self.fetches += 1
+        time.sleep(RESOURCE_FETCH_SECONDS)
+        return {"url": "https://clinic.supabase.co", "key": f"key-{path}"}
+
+def test_warm_calls_reuse_one_client():
+    """Only the first call pays resource fetch and connection setup"""
+    print("=== CLIENT POOL TESTING ===\n")
+
+    wmill = SlowWmill()
+    built = []
+
+    def factory(url, key):
+        time.sleep(CONNECT_SECONDS)
+        built.append(CountingSupabase(build_mock_data()))
+        return built[-1]
+
+    original_wmill = supabase_client.wmill
+    supabase_client.wmill = wmill
+    try:
+        pool = ClientPool(ttl_seconds=300)
+        start = time.perf_counter()
+        first = pool.get(factory)
+        cold_ms = (time.perf_counter() - start) * 1000
+
+        calls = 1000
+        start = time.perf_counter()
+        for _ in range(calls):
+            assert pool.get(factory) is first
+        warm_ms = (time.perf_counter() - start) * 1000 / calls
+
+        print(f"Setup: cold {cold_ms:.1f} ms, warm {warm_ms:.4f} ms per call")
+        assert len(built) == 1 and wmill.fetches == 1
+        assert cold_ms >= (RESOURCE_FETCH_SECONDS + CONNECT_SECONDS) * 1000
+        assert warm_ms < 0.5
+
+        # A new client after invalidation, or when a script passes another constructor
+        pool.invalidate()
+        assert pool.get(factory) is not first
+        assert pool.get(lambda url, key: "other") == "other"
+        assert wmill.fetches == 2
+    finally:
+        supabase_client.wmill = original_wmill
+
+    print("✅ Warm invocations reuse the pooled client")
+
+def test_scripts_share_the_pooled_client():
+    """Consecutive n5 invocations in one worker get the same client"""
+    print("=== CLIENT POOL SCRIPT TESTING ===\n")
+
+    clients = []
+
+    def factory(url, key):
+        clients.append(CountingSupabase({"patients": [], "appointments": []}))
+        return clients[-1]
+
+    original_create_client = get_patient_appointments.create_client
+    get_patient_appointments.create_client = factory
+    try:
+        for _ in range(3):
+            get_patient_appointments.main("Nobody", "1970-01-01", fuzzy_match=False)
+    finally:
+        get_patient_appointments.create_client = original_create_client
+
+    assert len(clients) == 1 and clients[0].query_count == 3
+
+if __name__ == "__main__":
+    test_warm_calls_reuse_one_client()
+    test_scripts_share_the_pooled_client()